@@ -0,0 +1,181 @@
+"""
+评价吞吐量基准测试
+-------------------
+在固定的容量方案上分别测量：
+1. optimise：单个典型日OperationModel.optimise()的耗时（持久化模型，每次更新参数后求解）；
+2. subAimFunc：单个个体全部典型日的完整评价；
+3. aimFunc：MyProblem以Thread/Process两种池、不同工作进程数评价一代种群。
+输出每秒评价数、p50/p95延迟与峰值内存（RSS），结果保存为JSON，可与保存的基准结果比较：
+    python benchmark.py --engine highs --output benchmark.json
+    python benchmark.py --engine highs --baseline benchmark.json
+容量方案由operationRunable.py中的设计方案和固定随机种子生成的方案组成，保证多次运行可比。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from types import SimpleNamespace
+import numpy as np
+from operation import OperationModel
+from dataloader import load_operation_data, load_typical_days
+from gaproblem import MyProblem, subAimFunc, get_typical_day_arrays, cal_renewable_profiles, \
+    TIME_STEP, ELE_PRICE, GAS_PRICE
+
+try:
+    import resource
+except ImportError:  # Windows下没有resource模块，不统计内存
+    resource = None
+
+# operationRunable.py中的设计方案
+REFERENCE_DESIGN = [1710.86, 1648.98, 2217.91, 2.79, 5.17, 305.72, 0.04, 2351.50, 400.82]
+# 与MyProblem一致的决策变量上界
+UPPER_BOUNDS = np.array([10000, 10000, 10000, 3000, 1000, 1000, 20000, 6000, 2000], dtype=float)
+
+
+def get_designs(population, seed=0):
+    # 第一个为参考方案，其余在上界的30%范围内按固定种子随机生成
+    rng = np.random.RandomState(seed)
+    random_designs = rng.uniform(0, 1, (population - 1, len(UPPER_BOUNDS))) * UPPER_BOUNDS * 0.3
+    return np.vstack([REFERENCE_DESIGN, random_designs])
+
+
+# 峰值RSS（MB），children为已结束的子进程中的最大值
+def peak_rss_mb(children=False):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux下ru_maxrss单位为KB，macOS下为字节
+    return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def summarize(latencies, evaluations_per_call=1):
+    latencies = np.asarray(latencies, dtype=float)
+    return {
+        "calls": len(latencies),
+        "evaluations_per_sec": float(evaluations_per_call * len(latencies) / latencies.sum()),
+        "p50": float(np.percentile(latencies, 50)),
+        "p95": float(np.percentile(latencies, 95)),
+        "mean": float(latencies.mean()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_optimise(engine, repeat, operation_list, typical_days):
+    # 参考方案在第一个典型日上的单次求解
+    medoids, day_data, _ = get_typical_day_arrays(operation_list, typical_days)
+    pv_outputs, wt_outputs = cal_renewable_profiles(np.array([REFERENCE_DESIGN]), day_data)
+    ppv, pwt, pgt, php, pec, pac, pes, phs, pcs = REFERENCE_DESIGN
+    day_args = (day_data[0, :, 0], day_data[0, :, 1], day_data[0, :, 2], wt_outputs[0, 0], pv_outputs[0, 0],
+                pgt, php, pec, pac, pes, phs, pcs)
+    operation_model = OperationModel('01/01/2019', TIME_STEP, ELE_PRICE, GAS_PRICE, *day_args, engine=engine)
+    latencies = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        operation_model.update_parameters(*day_args)
+        operation_model.optimise()
+        latencies.append(time.perf_counter() - start_time)
+    return summarize(latencies)
+
+
+def bench_subaimfunc(engine, persistent, repeat, designs, operation_list, typical_days):
+    latencies = []
+    for _ in range(repeat):
+        for i in range(designs.shape[0]):
+            start_time = time.perf_counter()
+            subAimFunc((i, designs, operation_list, typical_days), persistent=persistent, engine=engine)
+            latencies.append(time.perf_counter() - start_time)
+    return summarize(latencies)
+
+
+def bench_generation(pool_type, num_workers, engine, persistent, repeat, designs):
+    # 第一代用于预热（建立持久化模型、启动工作进程），不计入结果
+    problem = MyProblem(pool_type, persistent, engine, num_workers=num_workers)
+    try:
+        problem.aimFunc(SimpleNamespace(Phen=designs))
+        latencies = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            problem.aimFunc(SimpleNamespace(Phen=designs))
+            latencies.append(time.perf_counter() - start_time)
+    finally:
+        problem.kill_pool()
+        problem.pool.join()
+    result = summarize(latencies, designs.shape[0])
+    result["children_peak_rss_mb"] = peak_rss_mb(children=True)
+    result["failures"] = problem.profile.total["failures"]
+    return result
+
+
+def get_environment():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "numpy": np.__version__, "commit": commit, "time": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    # 以每秒评价数比较，低于基准(1 - tolerance)倍视为性能退化
+    regressions = []
+    print("%-40s %14s %14s %8s" % ("case", "baseline/s", "current/s", "ratio"))
+    for name, result in results["cases"].items():
+        if name not in baseline["cases"]:
+            continue
+        base = baseline["cases"][name]["evaluations_per_sec"]
+        current = result["evaluations_per_sec"]
+        ratio = current / base
+        flag = ""
+        if ratio < 1 - tolerance:
+            regressions.append(name)
+            flag = "REGRESSION"
+        print("%-40s %14.3f %14.3f %8.3f %s" % (name, base, current, ratio, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engine", default="oemof", choices=["oemof", "highs"])
+    parser.add_argument("--non-persistent", action="store_true", help="每次评价重新建立运行模型")
+    parser.add_argument("--population", type=int, default=8, help="容量方案数（一代种群规模）")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pool-types", default="Thread,Process")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的工作进程/线程数")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None, help="用于比较的基准结果JSON")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="允许的吞吐量下降比例")
+    args = parser.parse_args(argv)
+
+    persistent = not args.non_persistent
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    designs = get_designs(args.population, args.seed)
+    results = {"environment": get_environment(), "settings": vars(args), "cases": dict()}
+    results["cases"]["optimise/%s" % args.engine] = bench_optimise(args.engine, args.repeat * 10,
+                                                                   operation_list, typical_days)
+    results["cases"]["subAimFunc/%s" % args.engine] = bench_subaimfunc(args.engine, persistent, args.repeat,
+                                                                       designs, operation_list, typical_days)
+    for pool_type in args.pool_types.split(","):
+        for num_workers in map(int, args.workers.split(",")):
+            name = "aimFunc/%s/%s/%d" % (args.engine, pool_type, num_workers)
+            results["cases"][name] = bench_generation(pool_type, num_workers, args.engine, persistent,
+                                                      args.repeat, designs)
+    for name, result in results["cases"].items():
+        print("[%s] [eval/s:%.3f] [p50:%.4fs] [p95:%.4fs] [peak rss:%s MB]"
+              % (name, result["evaluations_per_sec"], result["p50"], result["p95"], result["peak_rss_mb"]))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare_with_baseline(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+带检查点的NSGA-II算法模板
+-------------------
+在geatpy的moea_NSGA2_templet基础上，每隔checkpoint_interval代把以下状态写入一个.npz文件：
+- 种群的Chrom、Phen、ObjV、FitnV（及CV）；
+- 当前代数currentGen、评价次数evalsNum、已用时间passTime与进化日志log；
+- numpy全局随机数发生器的状态（geatpy的选择、交叉、变异算子均使用np.random）。
+若问题对象带有评价结果缓存，同时在线备份缓存数据库到<检查点>.cache.sqlite。
+文件先写临时文件再替换，中断时不会留下损坏的检查点。
+resume=True时从检查点恢复种群与随机数状态后继续进化，在评价结果确定的前提下与不中断的运行结果一致。
+问题对象启用代理模型预筛选或提前终止时，每代重插入后对使用预测值/惩罚值的存活个体进行真实评价，保证种群中都是真实目标值；
+启用多保真度评价时，保真度切换后对整个种群按新的保真度重新评价，保真度状态同样保存在检查点中。
+问题对象启用模因局部搜索（memetic_size）时，每代重插入后由problem.refine()生成沿经济目标负梯度方向改进的个体，
+评价后与种群一起再做一次环境选择；种群各个体的梯度保存在检查点中，恢复后的局部搜索与不中断时一致。
+问题对象带有外部非支配存档（problem.pareto）时，每代在terminated()中记录存档的超体积，存档判定前沿不再改进时提前结束进化；
+存档的状态同样保存在检查点中。
+"""
+import os
+import json
+import time
+import numpy as np
+import geatpy as ea
+from dataloader import atomic_save
+
+
+class moea_NSGA2_checkpoint_templet(ea.moea_NSGA2_templet):
+    def __init__(self, problem, population, checkpoint_path='Result/checkpoint.npz', checkpoint_interval=5,
+                 resume=False):
+        ea.moea_NSGA2_templet.__init__(self, problem, population)
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+
+    def cache_backup_path(self):
+        return os.path.splitext(self.checkpoint_path)[0] + '.cache.sqlite'
+
+    # 子类（如稳态进化，steadystate.py）随检查点保存的额外状态
+    def extra_state(self):
+        return dict()
+
+    def restore_extra_state(self, checkpoint):
+        pass
+
+    # 保存检查点
+    def save_checkpoint(self, population):
+        _, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+        arrays = {
+            'Encoding': np.array(population.Encoding),
+            'Field': population.Field,
+            'Chrom': population.Chrom,
+            'Phen': population.Phen,
+            'ObjV': population.ObjV,
+            'FitnV': population.FitnV,
+            'currentGen': np.array(self.currentGen),
+            'evalsNum': np.array(self.evalsNum),
+            'passTime': np.array(self.passTime),
+            'log': np.array(json.dumps(self.log)),
+            'rng_keys': keys,
+            'rng_state': np.array([pos, has_gauss]),
+            'rng_gaussian': np.array(cached_gaussian),
+        }
+        if population.CV is not None:
+            arrays['CV'] = population.CV
+        arrays.update(self.extra_state())
+        if getattr(self.problem, 'fidelity', None) is not None:
+            arrays.update(self.problem.fidelity.get_state())
+        if getattr(self.problem, 'pareto', None) is not None:
+            arrays.update(self.problem.pareto.get_state())
+        if getattr(self.problem, 'memetic_size', None) is not None:
+            # 没有梯度的个体（如命中缓存）记为nan
+            arrays['gradients'] = np.array([self.problem.gradients.get(np.asarray(row, dtype=float).tobytes(),
+                                                                       np.full(population.Phen.shape[1], np.nan))
+                                            for row in population.Phen])
+        # 先写缓存备份，保证检查点中的种群对应的评价结果都已在备份中
+        if getattr(self.problem, 'cache', None) is not None:
+            self.problem.cache.backup(self.cache_backup_path())
+        atomic_save(self.checkpoint_path, lambda path: np.savez(path, **arrays))
+
+    # 读取检查点，恢复算法状态并返回种群
+    def load_checkpoint(self, population):
+        with np.load(self.checkpoint_path) as checkpoint:
+            self.restore_extra_state(checkpoint)
+            if str(checkpoint['Encoding']) != population.Encoding or \
+                    not np.array_equal(checkpoint['Field'], population.Field):
+                raise RuntimeError('检查点与当前问题的编码方式或决策变量范围不一致：%s' % self.checkpoint_path)
+            population = ea.Population(population.Encoding, population.Field, checkpoint['Chrom'].shape[0],
+                                       checkpoint['Chrom'], checkpoint['ObjV'], checkpoint['FitnV'],
+                                       checkpoint['CV'] if 'CV' in checkpoint else None, checkpoint['Phen'])
+            self.currentGen = int(checkpoint['currentGen'])
+            self.evalsNum = int(checkpoint['evalsNum'])
+            self.passTime = float(checkpoint['passTime'])
+            self.log = json.loads(str(checkpoint['log']))
+            pos, has_gauss = checkpoint['rng_state']
+            np.random.set_state(('MT19937', checkpoint['rng_keys'], int(pos), int(has_gauss),
+                                 float(checkpoint['rng_gaussian'])))
+            if getattr(self.problem, 'fidelity', None) is not None and 'fidelity_level' in checkpoint:
+                self.problem.fidelity.set_state(checkpoint)
+            if getattr(self.problem, 'pareto', None) is not None and 'pareto_ObjV' in checkpoint:
+                self.problem.pareto.set_state(checkpoint)
+            if getattr(self.problem, 'memetic_size', None) is not None and 'gradients' in checkpoint:
+                self.problem.gradients = {np.asarray(row, dtype=float).tobytes(): gradient
+                                          for row, gradient in zip(population.Phen, checkpoint['gradients'])
+                                          if not np.isnan(gradient).any()}
+        if getattr(self.problem, 'cache', None) is not None and os.path.exists(self.cache_backup_path()):
+            self.problem.cache.merge(self.cache_backup_path())
+        self.timeSlot = time.time()
+        print('从第%d代的检查点继续进化：%s' % (self.currentGen, self.checkpoint_path))
+        return population
+
+    # 每代结束时记录外部非支配存档的超体积，除最大代数/时间外，前沿连续若干代不再改进时也结束进化
+    def terminated(self, population):
+        pareto = getattr(self.problem, 'pareto', None)
+        if pareto is not None:
+            pareto.end_generation(self.currentGen)
+        if ea.moea_NSGA2_templet.terminated(self, population):
+            return True
+        if pareto is not None and pareto.is_stagnant():
+            self.currentGen -= 1  # 父类已为下一代增加了代数
+            print('外部非支配存档的超体积连续%d代未改进，第%d代结束进化' % (pareto.patience, self.currentGen))
+            return True
+        return False
+
+    # 目标函数值改变后，按非支配层级与拥挤距离重新计算种群的适应度
+    def update_fitness(self, population):
+        [levels, criLevel] = self.ndSort(population.ObjV, population.sizes, None, population.CV,
+                                         self.problem.maxormins)
+        dis = ea.crowdis(population.ObjV, levels)  # 计算拥挤距离
+        population.FitnV[:, 0] = np.argsort(np.lexsort(np.array([dis, -levels])), kind='mergesort')
+
+    def run(self, prophetPop=None):  # prophetPop为先知种群（即包含先验知识的种群）
+        # ==========================初始化配置===========================
+        population = self.population
+        NIND = population.sizes
+        self.initialization()  # 初始化算法模板的一些动态参数
+        # ===========================准备进化============================
+        if self.resume and os.path.exists(self.checkpoint_path):
+            population = self.load_checkpoint(population)
+        else:
+            population.initChrom()  # 初始化种群染色体矩阵
+            self.call_aimFunc(population)  # 计算种群的目标函数值
+            # 插入先验知识
+            if prophetPop is not None:
+                population = (prophetPop + population)[:NIND]  # 插入先知种群
+            [levels, criLevel] = self.ndSort(population.ObjV, NIND, None, population.CV,
+                                             self.problem.maxormins)  # 对NIND个个体进行非支配分层
+            population.FitnV = (1 / levels).reshape(-1, 1)  # 直接根据levels来计算初代个体的适应度
+            if self.checkpoint_interval:
+                self.save_checkpoint(population)
+        # ===========================开始进化============================
+        while self.terminated(population) == False:
+            # 选择个体参与进化
+            offspring = population[ea.selecting(self.selFunc, population.FitnV, NIND)]
+            # 对选出的个体进行进化操作
+            offspring.Chrom = self.recOper.do(offspring.Chrom)  # 重组
+            offspring.Chrom = self.mutOper.do(offspring.Encoding, offspring.Chrom, offspring.Field)  # 变异
+            self.call_aimFunc(offspring)  # 求进化后个体的目标函数值
+            population = self.reinsertion(population, offspring, NIND)  # 重插入生成新一代种群
+            # 保真度切换后，存活个体按新的保真度重新评价
+            if getattr(self.problem, 'fidelity', None) is not None and \
+                    self.problem.update_fidelity(self.currentGen, population):
+                population.ObjV = self.problem.evaluate(population.Phen)
+                self.update_fitness(population)
+            # 模因局部搜索：第一前沿个体沿经济目标负梯度方向移动后评价，再与种群一起做环境选择（实数编码时染色体即决策变量）
+            if getattr(self.problem, 'memetic_size', None) is not None and population.Encoding == 'RI':
+                Phen = self.problem.refine(population)
+                if Phen is not None:
+                    refined = ea.Population(population.Encoding, population.Field, Phen.shape[0], Phen,
+                                            FitnV=np.ones((Phen.shape[0], 1)))  # 适应度在重插入时重新计算
+                    self.call_aimFunc(refined)
+                    population = self.reinsertion(population, refined, NIND)
+            # 使用代理模型预测值或提前终止惩罚值而进入新一代种群的个体，改用真实评价并重新计算适应度
+            if hasattr(self.problem, 'reevaluate_predicted') and self.problem.reevaluate_predicted(population):
+                self.update_fitness(population)
+            # 检查点保存在下一次terminated()之前，恢复后从同一位置继续
+            if self.checkpoint_interval and self.currentGen % self.checkpoint_interval == 0:
+                self.save_checkpoint(population)
+        # 进化结束时仍未切换到完整保真度，则按完整的典型日划分重新评价最后一代种群
+        if getattr(self.problem, 'fidelity', None) is not None and self.problem.fidelity.finish():
+            population.ObjV = self.problem.evaluate(population.Phen)
+            self.update_fitness(population)
+        return self.finishing(population)  # 调用finishing完成后续工作并返回结果
@@ -0,0 +1,166 @@
+"""
+典型日聚类
+-------------------
+代替kmeansClustering.m（MATLAB kmedoids）的Python实现，可选择任意典型日数目k：
+1. 读取mergedData.csv，构造365天 × 24小时 × 6列的日特征，各列按全年最小/最大值归一化到[0, 1]；
+2. 以日特征间的欧氏距离平方矩阵做k-medoids聚类：PAM（BUILD贪心初始化 + 向量化SWAP），
+   天数较多时可用CLARA（多次抽样运行PAM，取全体代价最小的一组中心）；
+3. 输出与typicalDayData.xlsx相同的结构：typicalDayId（中心日，从1计）、weight（代表天数）、days（逗号分隔的日期）；
+4. 报告各k下用典型日重构全年逐时数据的误差，用于在精度与每次评价的LP求解次数之间取舍。
+用法：
+    python clustering.py --k 4,6,8,10,14 --output typicalDayData_k{k}.xlsx --report clusteringReport.csv
+"""
+import argparse
+import numpy as np
+from dataloader import load_operation_data
+
+FEATURES = ["ele_load", "heat_load", "cool_load", "solar_radiation", "wind_speed", "temperature"]
+
+
+# 日特征矩阵，形状为(365, 24 * 6)
+def build_day_profiles(operation_list, time_step=24):
+    operation_array = np.asarray(operation_list, dtype=float)
+    lower = operation_array.min(0)
+    span = np.maximum(operation_array.max(0) - lower, 1e-12)
+    normalized = (operation_array - lower) / span
+    return normalized.reshape(-1, time_step * operation_array.shape[1])
+
+
+def pairwise_sq_distances(X, Y=None):
+    Y = X if Y is None else Y
+    squared = (X ** 2).sum(1)[:, None] + (Y ** 2).sum(1)[None, :] - 2 * X @ Y.T
+    return np.maximum(squared, 0)
+
+
+# BUILD：逐个加入使总代价下降最多的中心
+def pam_build(D, k):
+    medoids = [int(np.argmin(D.sum(0)))]
+    nearest = D[:, medoids[0]].copy()
+    for _ in range(1, k):
+        gain = np.maximum(nearest[:, None] - D, 0).sum(0)
+        gain[medoids] = -1
+        medoids.append(int(np.argmax(gain)))
+        nearest = np.minimum(nearest, D[:, medoids[-1]])
+    return np.array(medoids)
+
+
+# PAM：每轮对全部(中心, 非中心)交换一次性计算代价变化，执行最优交换直至不再下降
+def pam(D, k, max_iter=100):
+    n = D.shape[0]
+    medoids = pam_build(D, k)
+    for _ in range(max_iter):
+        Dm = D[:, medoids]
+        order = np.argsort(Dm, axis=1)
+        nearest = order[:, 0]
+        d1 = Dm[np.arange(n), nearest]
+        d2 = Dm[np.arange(n), order[:, 1]] if k > 1 else np.full(n, np.inf)
+        # 不属于被换出中心的点：新代价为min(到新中心的距离, d1)
+        base = (np.minimum(D, d1[:, None]) - d1[:, None]).sum(0)
+        delta = np.tile(base, (k, 1))
+        for j in range(k):
+            members = nearest == j
+            if members.any():
+                # 属于被换出中心的点：新代价为min(到新中心的距离, d2)
+                delta[j] += (np.minimum(D[members], d2[members, None]) - np.minimum(D[members], d1[members, None])).sum(0)
+        delta[:, medoids] = np.inf
+        j, h = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[j, h] >= -1e-12 * max(1.0, d1.sum()):
+            break
+        medoids[j] = h
+    labels = np.argmin(D[:, medoids], axis=1)
+    return medoids, labels, float(D[np.arange(n), medoids[labels]].sum())
+
+
+# CLARA：在多个随机样本上运行PAM，以全体数据上的代价选择中心
+def clara(X, k, n_samples=5, sample_size=None, seed=0):
+    rng = np.random.RandomState(seed)
+    n = X.shape[0]
+    sample_size = min(n, sample_size or 40 + 2 * k)
+    best = None
+    for _ in range(n_samples):
+        sample = np.sort(rng.choice(n, sample_size, replace=False))
+        sample_medoids, _, _ = pam(pairwise_sq_distances(X[sample]), k)
+        medoids = sample[sample_medoids]
+        D = pairwise_sq_distances(X, X[medoids])
+        labels = np.argmin(D, axis=1)
+        cost = float(D[np.arange(n), labels].sum())
+        if best is None or cost < best[2]:
+            best = (medoids, labels, cost)
+    return best
+
+
+# 聚类得到{典型日编号: [代表的日期]}，编号与日期均从1计，按编号排序
+def cluster_typical_days(operation_list, k, method="pam", seed=0):
+    X = build_day_profiles(operation_list)
+    if method == "pam":
+        medoids, labels, _ = pam(pairwise_sq_distances(X), k)
+    elif method == "clara":
+        medoids, labels, _ = clara(X, k, seed=seed)
+    else:
+        raise ValueError("Unknown clustering method: %s" % method)
+    typical_days = dict()
+    for j in np.argsort(medoids):
+        typical_days[int(medoids[j]) + 1] = (np.flatnonzero(labels == j) + 1).tolist()
+    return typical_days
+
+
+# 用典型日替换其代表的各天，得到重构的全年逐时数据
+def reconstruct(operation_list, typical_days, time_step=24):
+    days = np.asarray(operation_list, dtype=float).reshape(-1, time_step, np.shape(operation_list)[1])
+    reconstructed = days.copy()
+    for medoid, members in typical_days.items():
+        reconstructed[np.asarray(members) - 1] = days[medoid - 1]
+    return reconstructed.reshape(-1, days.shape[2])
+
+
+# 各列的归一化均方根误差（除以全年极差）与全年总量相对误差
+def reconstruction_error(operation_list, typical_days):
+    operation_array = np.asarray(operation_list, dtype=float)
+    reconstructed = reconstruct(operation_array, typical_days)
+    span = np.maximum(operation_array.max(0) - operation_array.min(0), 1e-12)
+    nrmse = np.sqrt(((reconstructed - operation_array) ** 2).mean(0)) / span
+    total = operation_array.sum(0)
+    total_error = np.abs(reconstructed.sum(0) - total) / np.maximum(np.abs(total), 1e-12)
+    error = {"k": len(typical_days), "nrmse_mean": float(nrmse.mean())}
+    for name, value, total_value in zip(FEATURES, nrmse, total_error):
+        error["nrmse_" + name] = float(value)
+        error["total_error_" + name] = float(total_value)
+    return error
+
+
+def save_typical_days(typical_days, path):
+    import pandas as pd
+    typical_data = pd.DataFrame({
+        "typicalDayId": list(typical_days.keys()),
+        "weight": [len(days) for days in typical_days.values()],
+        "days": [",".join(map(str, days)) for days in typical_days.values()],
+    })
+    if path.endswith(".csv"):
+        typical_data.to_csv(path, index=False)
+    else:
+        typical_data.to_excel(path, index=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="典型日k-medoids聚类")
+    parser.add_argument("--data", default="mergedData.csv")
+    parser.add_argument("--k", default="4,6,8,10,14", help="逗号分隔的典型日数目")
+    parser.add_argument("--method", default="pam", choices=["pam", "clara"])
+    parser.add_argument("--seed", type=int, default=0, help="CLARA抽样的随机种子")
+    parser.add_argument("--output", default=None, help="典型日划分的保存路径，{k}替换为典型日数目，如typicalDayData_k{k}.xlsx")
+    parser.add_argument("--report", default=None, help="各k重构误差的保存路径（csv）")
+    args = parser.parse_args()
+
+    operation_list = load_operation_data(args.data)
+    errors = []
+    for k in map(int, args.k.split(",")):
+        typical_days = cluster_typical_days(operation_list, k, args.method, args.seed)
+        error = reconstruction_error(operation_list, typical_days)
+        errors.append(error)
+        print("[k:%d] [nrmse:%f] [ele:%f] [heat:%f] [cool:%f] [solar:%f] [wind:%f] [temperature:%f]"
+              % (k, error["nrmse_mean"], *[error["nrmse_" + name] for name in FEATURES]))
+        if args.output is not None:
+            save_typical_days(typical_days, args.output.format(k=k))
+    if args.report is not None:
+        import pandas as pd
+        pd.DataFrame(errors).to_csv(args.report, index=False)
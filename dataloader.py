@@ -0,0 +1,105 @@
+"""
+输入数据加载与二进制缓存
+-------------------
+mergedData.csv（8760小时 × 6列：电/热/冷负荷、光照、风速、温度）与typicalDayData.xlsx（典型日划分）
+首次读取时转换为二进制缓存，之后直接内存映射读取，无需导入pandas解析csv/xlsx：
+- .datacache/mergedData.npy：逐时数据，float64，np.load(mmap_mode='r')读取；
+- .datacache/typicalDayData.npz：典型日编号medoids、各典型日天数的偏移offsets、按典型日排列的日期days；
+- 缓存记录格式版本及源文件的大小与修改时间，源文件变化或版本升级后自动重建。
+"""
+import os
+import json
+import numpy as np
+
+CACHE_VERSION = 1
+CACHE_DIR = ".datacache"
+
+
+# 源文件的签名，用于判断缓存是否过期
+def source_signature(path):
+    stat = os.stat(path)
+    return {"version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def cache_paths(source_path, suffix, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(source_path)), CACHE_DIR)
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(cache_dir, name + suffix), os.path.join(cache_dir, name + ".json")
+
+
+def is_cache_valid(source_path, data_path, meta_path):
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return False
+    try:
+        with open(meta_path) as f:
+            return json.load(f) == source_signature(source_path)
+    except (OSError, ValueError):
+        return False
+
+
+# 由save(临时文件路径)写出同一目录下的临时文件后再替换path，其他进程不会读到写了一半的文件；
+# 临时文件与path的扩展名相同（np.save/np.savez会自动补全扩展名）。检查点、各存档与缓存都经此保存
+def atomic_save(path, save):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    root, extension = os.path.splitext(path)
+    tmp_path = "%s.%d.tmp%s" % (root, os.getpid(), extension)
+    try:
+        save(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def atomic_save_json(path, data, **kwargs):
+    def save(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, **kwargs)
+    atomic_save(path, save)
+
+
+# 先写数据再写签名，避免多个进程同时重建时读到不完整的缓存
+def write_cache(source_path, data_path, meta_path, save):
+    atomic_save(data_path, save)
+    atomic_save_json(meta_path, source_signature(source_path))
+
+
+# 逐时运行数据，形状为(8760, 6)
+def load_operation_data(csv_path="mergedData.csv", cache_dir=None, mmap=True):
+    data_path, meta_path = cache_paths(csv_path, ".npy", cache_dir)
+    if not is_cache_valid(csv_path, data_path, meta_path):
+        import pandas as pd
+        operation_array = np.ascontiguousarray(np.array(pd.read_csv(csv_path), dtype=np.float64))
+        write_cache(csv_path, data_path, meta_path, lambda path: np.save(path, operation_array))
+    return np.load(data_path, mmap_mode="r" if mmap else None)
+
+
+# 典型日划分：{典型日编号: [其代表的日期列表]}
+def load_typical_days(xlsx_path="typicalDayData.xlsx", cache_dir=None):
+    data_path, meta_path = cache_paths(xlsx_path, ".npz", cache_dir)
+    if not is_cache_valid(xlsx_path, data_path, meta_path):
+        import pandas as pd
+        typical_data = pd.read_excel(xlsx_path)
+        medoids = np.array(typical_data["typicalDayId"], dtype=np.int32)
+        days = [np.array(list(map(int, str(days_str).split(","))), dtype=np.int32)
+                for days_str in typical_data["days"]]
+        offsets = np.concatenate([[0], np.cumsum([len(d) for d in days])]).astype(np.int32)
+        write_cache(xlsx_path, data_path, meta_path,
+                    lambda path: np.savez(path, medoids=medoids, offsets=offsets, days=np.concatenate(days)))
+    with np.load(data_path) as cache:
+        medoids, offsets, days = cache["medoids"], cache["offsets"], cache["days"]
+    typical_days = dict()
+    for k, medoid in enumerate(medoids):
+        typical_days[int(medoid)] = days[offsets[k]:offsets[k + 1]].tolist()
+    return typical_days
+
+
+# 每一天所属的典型日编号，长度为365，不属于任何典型日的为0
+def day_to_medoid(typical_days, n_days=365):
+    index = np.zeros(n_days, dtype=np.int32)
+    for medoid, days in typical_days.items():
+        index[np.asarray(days) - 1] = medoid
+    return index
@@ -0,0 +1,420 @@
+"""
+多机分布式评价
+-------------------
+PoolType = 'Distributed'时，MyProblem在主进程中启动一个基于multiprocessing.managers的任务队列服务器，
+各节点上的工作进程连接服务器、领取任务（个体的容量向量）、在本进程中求解（保留各自的持久化运行模型）并交回目标函数值：
+- 工作进程连接后先取得初始化函数与参数（即init_worker与典型日划分等），各节点需有相同的代码与mergedData.csv，
+  连接时校验数据文件的哈希；
+- 工作进程在求解期间由后台线程定时发送心跳，超过heartbeat_timeout秒没有心跳的工作进程视为断开，
+  其未完成的任务重新排队；同一任务重新排队超过max_retries次时由on_failure给出结果（目标函数值为inf）；
+- 重新排队的任务如果被原工作进程迟到完成，以先交回的结果为准；
+- 除按批提交的map外，apply_async逐个提交任务，由后台线程等待任务完成后调用回调函数（与multiprocessing的Pool相同），
+  供稳态进化（steadystate.py）在任一任务完成时立即提交新任务；
+- 任务队列也用于常驻的本机评价服务（warmservice.py）：服务的每个客户端以租约独占队列并用set_job提交自己的初始化参数，
+  工作进程领取到新任务号的任务时重新执行初始化函数。
+单机测试时可由local_workers参数在本机启动若干工作进程；其他节点用命令行启动工作进程：
+    python distributed.py --address 192.168.1.10:50000 --authkey <口令> --processes 8
+服务器默认只监听127.0.0.1，多机运行时监听地址设为0.0.0.0并务必设置authkey（任务以pickle传输）。
+"""
+import os
+import time
+import socket
+import argparse
+import threading
+import traceback
+import multiprocessing as mp
+from collections import deque
+from multiprocessing.managers import BaseManager
+from evalcache import data_fingerprint
+
+
+class BrokerManager(BaseManager):
+    pass
+
+
+def parse_address(address):
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+def get_data_hash():
+    return data_fingerprint(['mergedData.csv'], [], [])
+
+
+class TaskBroker:
+    # 任务队列，运行于主进程，服务器线程与主线程并发访问，全部方法在锁内执行
+    def __init__(self, initializer, initargs, heartbeat_timeout=60.0, max_retries=3, lease_timeout=600.0):
+        self.initializer = initializer
+        self.initargs = initargs
+        self.job = 0  # 初始化参数的版本号，set_job时加一
+        self.data_hash = get_data_hash()
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self.condition = threading.Condition()
+        self.pending = deque()  # 待领取的任务号
+        self.items = dict()  # 任务号 -> (函数, 输入)，先后提交的任务可以使用不同的函数
+        self.running = dict()  # 任务号 -> 工作进程名
+        self.results = dict()  # 任务号 -> (是否成功, 结果或失败原因)
+        self.retries = dict()
+        self.workers = dict()  # 工作进程名 -> 最后一次心跳时间
+        self.startup = dict()  # 工作进程名 -> 启动阶段耗时（导入、预热），见profiling.py
+        self.lease = None  # (客户端名, 最后一次活动时间)，常驻服务同一时间只供一个客户端使用
+        self.lease_timeout = lease_timeout
+        self.next_task = 0
+        self.closed = False
+        self.stats = self.new_stats()
+
+    @staticmethod
+    def new_stats():
+        return {"tasks": 0, "errors": 0, "requeued": 0, "lost_workers": 0, "workers": 0}
+
+    # ---------- 工作进程调用 ----------
+    def get_job(self, worker, data_hash, startup=None):
+        # 返回(初始化参数版本号, 初始化函数, 参数)；startup为工作进程的启动耗时
+        with self.condition:
+            if data_hash != self.data_hash:
+                raise ValueError("mergedData.csv on worker %s differs from the server" % worker)
+            self.workers[worker] = time.time()
+            if startup:
+                self.startup[worker] = startup
+            return self.job, self.initializer, self.initargs
+
+    def get_task(self, worker, timeout=1.0):
+        # 返回(初始化参数版本号, 任务号, 函数, 输入)；没有任务时等待至多timeout秒后返回None，服务器已关闭时返回False
+        with self.condition:
+            self.workers[worker] = time.time()
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+            if self.closed:
+                return False
+            if not self.pending:
+                return None
+            task_id = self.pending.popleft()
+            self.running[task_id] = worker
+            return (self.job, task_id) + self.items[task_id]
+
+    def put_result(self, worker, task_id, success, value):
+        with self.condition:
+            self.workers[worker] = time.time()
+            if self.running.get(task_id) == worker:
+                del self.running[task_id]
+            if task_id in self.items and task_id not in self.results:
+                self.results[task_id] = (success, value)
+                if task_id in self.pending:
+                    self.pending.remove(task_id)  # 已重新排队但原工作进程先交回了结果
+                if not success:
+                    self.stats["errors"] += 1
+                self.condition.notify_all()
+
+    def heartbeat(self, worker):
+        # 返回服务器是否已关闭，工作进程据此退出
+        with self.condition:
+            self.workers[worker] = time.time()
+            return self.closed
+
+    # ---------- 主进程（常驻服务时为持有租约的客户端）调用 ----------
+    def acquire(self, client, timeout=None):
+        # 取得租约，其他客户端持有租约时等待至多timeout秒（None为一直等待），返回是否取得；
+        # 超过lease_timeout秒没有活动的租约视为客户端已退出，其未完成的任务全部丢弃
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.lease is not None and self.lease[0] != client and \
+                    time.time() - self.lease[1] <= self.lease_timeout:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(1.0 if remaining is None else min(1.0, remaining))
+            if self.lease is not None and self.lease[0] != client:
+                print("[distributed] lease of %s expired" % self.lease[0])
+                for tasks in (self.pending, self.items, self.running, self.results, self.retries):
+                    tasks.clear()
+            self.lease = (client, time.time())
+            return True
+
+    def release(self, client):
+        with self.condition:
+            if self.lease is not None and self.lease[0] == client:
+                self.lease = None
+                self.condition.notify_all()
+
+    def check_lease(self, client):
+        # 刷新租约的活动时间；租约已被其他客户端取得时抛出异常
+        if client is None:
+            return
+        if self.lease is None or self.lease[0] != client:
+            raise RuntimeError("client %s does not hold the lease of the task server" % client)
+        self.lease = (client, time.time())
+
+    def set_job(self, client, initializer, initargs):
+        with self.condition:
+            self.check_lease(client)
+            self.initializer = initializer
+            self.initargs = initargs
+            self.job += 1
+            return self.job
+
+    def get_startup(self):
+        # 在线的工作进程（及常驻服务进程）的启动耗时
+        with self.condition:
+            return dict(self.startup)
+
+    def get_worker_count(self):
+        # 在线（心跳未超时）的工作进程数
+        with self.condition:
+            now = time.time()
+            return sum(now - seen <= self.heartbeat_timeout for seen in self.workers.values())
+
+    def get_data_hash(self):
+        return self.data_hash
+
+    def submit(self, func, items, client=None):
+        with self.condition:
+            self.check_lease(client)
+            task_ids = list(range(self.next_task, self.next_task + len(items)))
+            self.next_task += len(items)
+            for task_id, item in zip(task_ids, items):
+                self.items[task_id] = (func, item)
+                self.retries[task_id] = 0
+            self.pending.extend(task_ids)
+            self.stats["tasks"] += len(items)
+            self.condition.notify_all()
+            return task_ids
+
+    def requeue_lost(self):
+        # 心跳超时的工作进程视为断开，其任务重新排队；超过重试次数的任务记为失败
+        with self.condition:
+            now = time.time()
+            lost = [w for w, seen in self.workers.items() if now - seen > self.heartbeat_timeout]
+            for worker in lost:
+                del self.workers[worker]
+                self.startup.pop(worker, None)
+                self.stats["lost_workers"] += 1
+                print("[distributed] worker %s lost" % worker)
+            for task_id, worker in list(self.running.items()):
+                if worker in lost:
+                    del self.running[task_id]
+                    self.retries[task_id] += 1
+                    if self.retries[task_id] > self.max_retries:
+                        self.results[task_id] = (False, "lost %d workers" % self.retries[task_id])
+                    else:
+                        self.pending.appendleft(task_id)
+                        self.stats["requeued"] += 1
+            self.stats["workers"] = len(self.workers)
+            self.condition.notify_all()
+
+    def wait_results(self, task_ids, timeout, client=None):
+        # 等待至多timeout秒，返回已完成的任务号集合
+        with self.condition:
+            self.check_lease(client)
+            if not all(task_id in self.results for task_id in task_ids):
+                self.condition.wait(timeout)
+            return {task_id for task_id in task_ids if task_id in self.results}
+
+    def pop_results(self, task_ids):
+        with self.condition:
+            results = [self.results.pop(task_id) for task_id in task_ids]
+            for task_id in task_ids:
+                del self.items[task_id]
+                del self.retries[task_id]
+            return results
+
+    def cancel(self, task_ids):
+        # 丢弃不再需要的任务，正在求解的任务交回的结果被忽略
+        with self.condition:
+            for task_id in task_ids:
+                if task_id in self.pending:
+                    self.pending.remove(task_id)
+                for tasks in (self.items, self.running, self.results, self.retries):
+                    tasks.pop(task_id, None)
+
+    # 取出并清零自上次调用以来的统计
+    def pop_stats(self):
+        with self.condition:
+            stats = self.stats
+            self.stats = self.new_stats()
+            self.stats["workers"] = stats["workers"]
+            return stats
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+def map_tasks(broker, func, iterable, on_failure=None, poll_interval=1.0, client=None):
+    # 提交一组任务并等待全部完成，期间把心跳超时的工作进程的任务重新排队；broker可以是代理对象
+    items = list(iterable)
+    task_ids = broker.submit(func, items, client)
+    while len(broker.wait_results(task_ids, poll_interval, client)) < len(task_ids):
+        broker.requeue_lost()
+    results = []
+    for item, (success, value) in zip(items, broker.pop_results(task_ids)):
+        if success:
+            results.append(value)
+        elif on_failure is None:
+            raise RuntimeError("distributed task failed: %s" % value)
+        else:
+            results.append(on_failure(item, value))
+    return results
+
+
+class AsyncSubmitter:
+    # 逐个提交的任务，后台线程等待完成后在该线程中调用callback(结果)或error_callback(异常)
+    def __init__(self, broker, poll_interval=1.0, client=None):
+        self.broker = broker
+        self.poll_interval = poll_interval
+        self.client = client
+        self.callbacks = dict()  # 任务号 -> (callback, error_callback)
+        self.lock = threading.Lock()
+        self.submitted = threading.Event()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def submit(self, func, item, callback=None, error_callback=None):
+        with self.lock:
+            task_id, = self.broker.submit(func, [item], self.client)
+            self.callbacks[task_id] = (callback, error_callback)
+        self.submitted.set()
+
+    def loop(self):
+        while not self.stop.is_set():
+            with self.lock:
+                task_ids = list(self.callbacks)
+            if not task_ids:
+                self.submitted.wait(self.poll_interval)
+                self.submitted.clear()
+                continue
+            done = sorted(self.broker.wait_results(task_ids, self.poll_interval, self.client))
+            self.broker.requeue_lost()
+            if not done:
+                continue
+            with self.lock:
+                callbacks = [self.callbacks.pop(task_id) for task_id in done]
+            for (success, value), (callback, error_callback) in zip(self.broker.pop_results(done), callbacks):
+                if success and callback is not None:
+                    callback(value)
+                elif not success and error_callback is not None:
+                    error_callback(RuntimeError(value))
+
+    def close(self):
+        # 停止后台线程并丢弃尚未完成的任务
+        self.stop.set()
+        self.submitted.set()
+        self.thread.join()
+        with self.lock:
+            self.broker.cancel(list(self.callbacks))
+            self.callbacks.clear()
+
+
+class DistributedPool:
+    # 与Pool.map接口相同的分布式任务池
+    def __init__(self, initializer, initargs, address="127.0.0.1:50000", authkey=b"ies_optimization",
+                 local_workers=0, heartbeat_timeout=60.0, max_retries=3, poll_interval=1.0):
+        self.authkey = authkey.encode() if isinstance(authkey, str) else authkey
+        self.broker = TaskBroker(initializer, initargs, heartbeat_timeout, max_retries)
+        self.poll_interval = poll_interval
+        self.submitter = None
+        broker = self.broker
+        BrokerManager.register("broker", callable=lambda: broker)
+        self.manager = BrokerManager(address=parse_address(address), authkey=self.authkey)
+        self.server = self.manager.get_server()
+        self.address = "%s:%d" % self.server.address
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print("[distributed] task server listening on %s" % self.address)
+        # 本机工作进程（单机测试或与远程节点一起使用）
+        local_address = "127.0.0.1:%d" % self.server.address[1]
+        # 心跳间隔取超时时间的1/3（至多10秒），较短的heartbeat_timeout下正常的工作进程不会被判为断开
+        heartbeat_interval = min(10.0, heartbeat_timeout / 3)
+        self.local_workers = [mp.Process(target=worker_main, args=(local_address, self.authkey, heartbeat_interval),
+                                         daemon=True) for _ in range(local_workers)]
+        for process in self.local_workers:
+            process.start()
+
+    def map(self, func, iterable, on_failure=None):
+        return map_tasks(self.broker, func, iterable, on_failure, self.poll_interval)
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        # 与Pool.apply_async相同，但任务只能有一个参数
+        if self.submitter is None:
+            self.submitter = AsyncSubmitter(self.broker, self.poll_interval)
+        self.submitter.submit(func, *args, callback=callback, error_callback=error_callback)
+
+    def worker_count(self):
+        # 本机工作进程启动后尚未连接时也计入
+        return max(len(self.local_workers), self.broker.get_worker_count())
+
+    def pop_stats(self):
+        return self.broker.pop_stats()
+
+    def close(self):
+        # 通知工作进程退出，等待本机工作进程结束后停止服务器
+        if self.submitter is not None:
+            self.submitter.close()
+        self.broker.close()
+        for process in self.local_workers:
+            process.join(self.poll_interval * 5)
+            if process.is_alive():
+                process.terminate()
+        self.server.stop_event.set()
+
+
+def heartbeat_loop(broker, worker, interval, stop):
+    while not stop.is_set():
+        try:
+            if broker.heartbeat(worker):
+                stop.set()
+        except (EOFError, OSError):
+            stop.set()
+        stop.wait(interval)
+
+
+def worker_main(address, authkey, heartbeat_interval=10.0, startup=None):
+    # 单个工作进程：连接服务器、初始化后循环领取并求解任务，初始化参数变化时重新初始化，服务器关闭或断开时退出
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+    worker = "%s/%d" % (socket.gethostname(), os.getpid())
+    BrokerManager.register("broker")
+    manager = BrokerManager(address=parse_address(address), authkey=authkey)
+    manager.connect()
+    broker = manager.broker()
+    data_hash = get_data_hash()
+    job, initializer, initargs = broker.get_job(worker, data_hash, startup)
+    if initializer is not None:
+        initializer(*initargs)
+    # 代理对象在每个线程中使用独立的连接，心跳线程不受长时间求解的影响
+    stop = threading.Event()
+    threading.Thread(target=heartbeat_loop, args=(broker, worker, heartbeat_interval, stop), daemon=True).start()
+    try:
+        while not stop.is_set():
+            task = broker.get_task(worker)
+            if task is False:
+                break
+            if task is None:
+                continue
+            task_job, task_id, func, item = task
+            if task_job != job:
+                job, initializer, initargs = broker.get_job(worker, data_hash)
+                if initializer is not None:
+                    initializer(*initargs)
+            try:
+                result = (True, func(item))
+            except Exception as e:
+                result = (False, "%s: %s" % (type(e).__name__, e))
+                traceback.print_exc()
+            broker.put_result(worker, task_id, *result)
+    except (EOFError, OSError):
+        pass
+    stop.set()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="分布式评价的工作进程")
+    parser.add_argument("--address", required=True, help="任务服务器地址，如192.168.1.10:50000")
+    parser.add_argument("--authkey", required=True)
+    parser.add_argument("--processes", type=int, default=mp.cpu_count())
+    args = parser.parse_args()
+    processes = [mp.Process(target=worker_main, args=(args.address, args.authkey)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
@@ -0,0 +1,157 @@
+"""
+评价结果缓存
+-------------------
+NSGA-II会反复评价精英个体和相近的子代，每次评价需要求解全部典型日。
+这里以量化后的9维容量向量为键，把[经济目标, 源荷匹配目标]存入SQLite数据库：
+- 键中包含输入数据文件与电价/气价的哈希，数据变化后旧结果自动失效；
+- 按最近访问时间淘汰，条目数不超过max_entries；超出时一次淘汰到max_entries的90%，条目数只在估计值超出上限时才重新统计；
+- 每个进程/线程使用独立连接，数据库为WAL模式，可在进程池中安全共享，并在多次运行间保留。
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from dataloader import atomic_save
+
+
+# 计算输入数据与价格向量的指纹
+def data_fingerprint(data_files, ele_price, gas_price, extra=""):
+    digest = hashlib.sha256()
+    for path in data_files:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    digest.update(np.asarray(ele_price, dtype=float).tobytes())
+    digest.update(np.asarray(gas_price, dtype=float).tobytes())
+    digest.update(str(extra).encode())
+    return digest.hexdigest()
+
+
+class EvaluationCache:
+    def __init__(self, path, data_hash, resolution=1.0, max_entries=200000):
+        self.path = path
+        self.data_hash = data_hash
+        self.resolution = resolution  # 容量量化分辨率（kW）
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.count = None  # 条目数的估计值（写入的条数累加，不扣除替换的旧条目），None表示尚未统计
+        self._local = threading.local()
+        conn = self.connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS evaluations ("
+                     "data_hash TEXT NOT NULL, design TEXT NOT NULL, "
+                     "economic REAL NOT NULL, complementary REAL NOT NULL, last_access REAL NOT NULL, "
+                     "PRIMARY KEY (data_hash, design))")
+        conn.execute("CREATE INDEX IF NOT EXISTS evaluations_last_access ON evaluations (last_access)")
+        conn.commit()
+
+    # 连接不能跨进程/线程使用，按进程号和线程分别建立
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    # 量化后的容量向量作为键
+    def design_key(self, capacities):
+        quantized = np.rint(np.asarray(capacities, dtype=float) / self.resolution).astype(np.int64)
+        return ",".join(map(str, quantized))
+
+    # 批量查询，未命中的位置为None
+    def get_many(self, designs):
+        keys = [self.design_key(d) for d in designs]
+        conn = self.connection()
+        found = dict()
+        unique_keys = list(set(keys))
+        for k in range(0, len(unique_keys), 500):
+            chunk = unique_keys[k:k + 500]
+            rows = conn.execute("SELECT design, economic, complementary FROM evaluations "
+                                "WHERE data_hash = ? AND design IN (%s)" % ",".join("?" * len(chunk)),
+                                [self.data_hash] + chunk).fetchall()
+            for design, economic, complementary in rows:
+                found[design] = [economic, complementary]
+        if found:
+            conn.executemany("UPDATE evaluations SET last_access = ? WHERE data_hash = ? AND design = ?",
+                             [(time.time(), self.data_hash, key) for key in found])
+            conn.commit()
+        ret = [found.get(key) for key in keys]
+        self.hits += sum(r is not None for r in ret)
+        self.misses += sum(r is None for r in ret)
+        return ret
+
+    # 批量写入，只缓存求解成功（有限值）的结果
+    def put_many(self, designs, objvs):
+        now = time.time()
+        rows = [(self.data_hash, self.design_key(d), float(o[0]), float(o[1]), now)
+                for d, o in zip(designs, objvs) if np.all(np.isfinite(o))]
+        if not rows:
+            return
+        conn = self.connection()
+        conn.executemany("INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        if self.count is not None:
+            self.count += len(rows)
+        self.evict()
+
+    def get(self, capacities):
+        return self.get_many([capacities])[0]
+
+    def put(self, capacities, objv):
+        self.put_many([capacities], [objv])
+
+    # 条目数超出上限时按最近访问时间淘汰到上限的90%；估计值未超出上限时不查询数据库
+    def evict(self):
+        if self.count is not None and self.count <= self.max_entries:
+            return
+        conn = self.connection()
+        self.count = conn.execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+        if self.count > self.max_entries:
+            target = self.max_entries - self.max_entries // 10
+            conn.execute("DELETE FROM evaluations WHERE rowid IN "
+                         "(SELECT rowid FROM evaluations ORDER BY last_access LIMIT ?)",
+                         (self.count - target,))
+            conn.commit()
+            self.count = target
+
+    # 在线备份整个数据库（先写临时文件再替换），用于检查点
+    def backup(self, path):
+        def save(tmp_path):
+            target = sqlite3.connect(tmp_path)
+            try:
+                self.connection().backup(target)
+            finally:
+                target.close()
+        atomic_save(path, save)
+
+    # 将备份中的结果并入当前数据库，已有的条目保持不变
+    def merge(self, path):
+        conn = self.connection()
+        conn.execute("ATTACH DATABASE ? AS backup", (path,))
+        try:
+            conn.execute("INSERT OR IGNORE INTO evaluations SELECT * FROM backup.evaluations")
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE backup")
+        self.count = None
+        self.evict()
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+            self._local.conn = None
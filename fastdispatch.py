@@ -0,0 +1,137 @@
+"""
+无储能设计的快速调度
+-------------------
+电、热、冷储能的额定功率都接近0时，调度问题中各时段之间没有耦合，24小时的LP分解为每个时段一个独立的小LP。
+每个时段只有4个自由变量z = (燃气轮机耗气量, 电热泵制热量, 电制冷制冷量, 吸收式制冷制冷量)，
+其余各流由母线平衡唯一确定：
+- 电：净需求 = 电负荷 - 风电 - 光伏 + 各设备耗电 - 燃气轮机发电，正部分由电网购入，负部分进入电多余出口；
+- 热、冷同理，缺额由热源/冷源（单价SOURCE_COST）补足，多余进入热/冷多余出口。
+运行成本是z的分段线性凸函数，其最小值必在4个设备容量边界与3个母线净需求为0的超平面中任取4个相交的顶点上取得。
+对全部典型日的全部时段一次性用NumPy枚举这些顶点，取成本最小者，与LP的最优值一致；LP最优解唯一时各流也与LP一致。
+成本最小的顶点不唯一且外部能源/多余出口出力不同（退化）时，LP取哪个最优解取决于求解器，枚举无法复现，
+源荷匹配目标可能与LP相差数个百分点，因此含退化时段的典型日同样视为无效，交给LP求解；
+return_flows为True时另外给出全部流的逐时出力（储能各流为0）；
+外部能源、多余出口超出容量或电价非正时该典型日的结果无效，需要LP求解。
+储能功率很小（不超过阈值）的设计由clamp_storage把储能功率置为0后再评价，调度与投资成本都按无储能计算。
+"""
+import itertools
+import numpy as np
+from sparselp import (GT_ELE_EFFICIENCY, GT_HEAT_EFFICIENCY, AC_COOL_FACTOR, AC_HEAT_FACTOR, AC_ELE_FACTOR,
+                      EHP_COP, EC_COP, GRID_CAPACITY, SOURCE_CAPACITY, SOURCE_COST, OVERFLOW_CAPACITY, FLOWS)
+
+# 各母线净需求对z的系数：净需求 = 负荷项 + NET_COEFFICIENTS @ z
+NET_COEFFICIENTS = np.array([
+    [-GT_ELE_EFFICIENCY, 1 / EHP_COP, 1 / EC_COP, AC_ELE_FACTOR / AC_COOL_FACTOR],  # 电
+    [-GT_HEAT_EFFICIENCY, -1.0, 0.0, AC_HEAT_FACTOR / AC_COOL_FACTOR],  # 热
+    [0.0, 0.0, -1.0, -1.0],  # 冷
+])
+# 超平面：前8个为z各分量的下界、上界，后3个为各母线净需求为0
+PLANES = np.vstack([np.repeat(np.eye(4), 2, axis=0), NET_COEFFICIENTS])
+
+
+def build_vertex_solver():
+    # 任取4个线性无关的超平面，预先求逆并展开到全部11个超平面的右端项上，
+    # 全部顶点 = 右端项 @ VERTEX_SOLVER，形状为(顶点数 * 4,)，一次矩阵乘法得到
+    blocks = []
+    for combination in itertools.combinations(range(len(PLANES)), 4):
+        A = PLANES[list(combination)]
+        if abs(np.linalg.det(A)) > 1e-12:
+            block = np.zeros((4, len(PLANES)))
+            block[:, list(combination)] = np.linalg.inv(A)
+            blocks.append(block)
+    return np.vstack(blocks).T
+
+
+VERTEX_SOLVER = build_vertex_solver()
+
+
+def is_storage_free(pes, phs, pcs, threshold):
+    return max(pes, phs, pcs) <= threshold
+
+
+def clamp_storage(Vars, threshold):
+    # 储能功率均不超过threshold的设计（Vars为容量向量或(个体, 9)矩阵）的电、热、冷储能功率置为0，返回副本
+    Vars = np.array(Vars, dtype=float)
+    free = np.all(Vars[..., 6:9] <= threshold, axis=-1)
+    Vars[..., 6:9] = np.where(free[..., None], 0.0, Vars[..., 6:9])
+    return Vars
+
+
+def dispatch_storage_free(ele_price, gas_price, ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                          gt_capacity, ehp_capacity, ec_capacity, ac_capacity, tol=1e-7, return_flows=False):
+    """
+    各输入的逐时数组形状为(典型日, 时段)，电价、气价为(时段,)。
+    返回各典型日的运行成本、get_complementary_results结构的各符号逐时出力（形状为(典型日, 时段)），
+    各典型日的结果是否有效（未超出外部能源与多余出口的容量且不含退化时段，即与LP的结果一致），
+    以及各典型日是否含最优解不唯一（退化）的时段；
+    return_flows为True时再返回以(起点, 终点)为键的全部流的逐时出力（与sparselp.FLOWS一致）。
+    """
+    ele_price = np.broadcast_to(np.asarray(ele_price, dtype=float), np.shape(ele_load))
+    gas_price = np.broadcast_to(np.asarray(gas_price, dtype=float), np.shape(ele_load))
+    # 负荷项：z = 0时各母线的净需求
+    base = np.stack([np.asarray(ele_load, dtype=float) - np.asarray(wt_output, dtype=float)
+                     - np.asarray(pv_output, dtype=float),
+                     np.broadcast_to(np.asarray(heat_demand, dtype=float), np.shape(ele_load)),
+                     np.broadcast_to(np.asarray(cool_demand, dtype=float), np.shape(ele_load))], axis=-1)
+    # 燃气轮机的发电量与产热量上限共同限制耗气量
+    upper = np.array([min(gt_capacity / GT_ELE_EFFICIENCY, gt_capacity * 1.5 / GT_HEAT_EFFICIENCY),
+                      ehp_capacity, ec_capacity, ac_capacity], dtype=float)
+    bounds = np.column_stack([np.zeros(4), upper]).ravel()
+    rhs = np.concatenate([np.broadcast_to(bounds, base.shape[:-1] + (8,)), -base], axis=-1)
+    # 全部顶点，形状为(典型日, 时段, 顶点, 4)
+    z = (rhs @ VERTEX_SOLVER).reshape(base.shape[:-1] + (-1, 4))
+    scale = np.maximum(upper, 1.0)
+    feasible = np.all((z >= -tol * scale) & (z <= upper + tol * scale), axis=-1)
+    z = np.clip(z, 0, upper)
+    net = base[..., None, :] + z @ NET_COEFFICIENTS.T
+    supply = np.maximum(net, 0)
+    overflow = np.maximum(-net, 0)
+    cost = (ele_price[..., None] * supply[..., 0] + gas_price[..., None] * z[..., 0]
+            + SOURCE_COST * (supply[..., 1] + supply[..., 2]))
+    cost = np.where(feasible, cost, np.inf)
+    best_cost = cost.min(axis=-1)
+    # 最优顶点不唯一（如电力过剩时电制冷与吸收式制冷的组合均为零成本）时LP的最优解本身就不唯一，
+    # 这里在成本最小的顶点中取外部能源与多余出口出力之和最小者，这些典型日的结果不作为有效结果
+    flows = np.concatenate([supply, overflow], axis=-1)
+    tied = cost <= best_cost[..., None] + 1e-12 * np.abs(best_cost[..., None]) + 1e-9
+    best = np.argmin(np.where(tied, flows.sum(-1), np.inf), axis=-1)
+    best_flows = np.take_along_axis(flows, best[..., None, None], axis=-2)[..., 0, :]
+    spread = np.where(tied[..., None], np.abs(flows - best_flows[..., None, :]), 0).max(axis=-2)
+    degenerate = np.any(~np.all(spread <= tol * np.maximum(np.abs(best_flows), 1.0) * 10, axis=-1), axis=-1)
+    within_capacity = ((best_flows[..., 0] <= GRID_CAPACITY) & (best_flows[..., 1] <= SOURCE_CAPACITY)
+                       & (best_flows[..., 2] <= SOURCE_CAPACITY) & np.all(best_flows[..., 3:] <= OVERFLOW_CAPACITY, -1))
+    valid = np.all(np.isfinite(best_cost) & within_capacity & (ele_price > 0), axis=-1) & ~degenerate
+    complementary_results = {
+        "grid": best_flows[..., 0],
+        "electricity overflow": best_flows[..., 3],
+        "heat source": best_flows[..., 1],
+        "heat overflow": best_flows[..., 4],
+        "cool source": best_flows[..., 2],
+        "cool overflow": best_flows[..., 5],
+    }
+    if not return_flows:
+        return best_cost.sum(axis=-1), complementary_results, valid, degenerate
+    # 由最优顶点的4个自由变量得到各设备的输入输出
+    best_z = np.take_along_axis(z, best[..., None, None], axis=-2)[..., 0, :]
+    gas, ehp_heat, ec_cool, ac_cool = np.moveaxis(best_z, -1, 0)
+    flows = dict.fromkeys(FLOWS, np.zeros_like(gas))
+    flows.update({
+        ("grid", "electricity bus"): best_flows[..., 0],
+        ("gas", "gas bus"): gas,
+        ("heat source", "heat bus"): best_flows[..., 1],
+        ("cool source", "cool bus"): best_flows[..., 2],
+        ("gas bus", "gas turbine"): gas,
+        ("gas turbine", "electricity bus"): GT_ELE_EFFICIENCY * gas,
+        ("gas turbine", "heat bus"): GT_HEAT_EFFICIENCY * gas,
+        ("heat bus", "absorption chiller"): ac_cool * AC_HEAT_FACTOR / AC_COOL_FACTOR,
+        ("electricity bus", "absorption chiller"): ac_cool * AC_ELE_FACTOR / AC_COOL_FACTOR,
+        ("absorption chiller", "cool bus"): ac_cool,
+        ("electricity bus", "electricity heat pump"): ehp_heat / EHP_COP,
+        ("electricity heat pump", "heat bus"): ehp_heat,
+        ("electricity bus", "electricity chiller"): ec_cool / EC_COP,
+        ("electricity chiller", "cool bus"): ec_cool,
+        ("electricity bus", "electricity overflow"): best_flows[..., 3],
+        ("heat bus", "heat overflow"): best_flows[..., 4],
+        ("cool bus", "cool overflow"): best_flows[..., 5],
+    })
+    return best_cost.sum(axis=-1), complementary_results, valid, degenerate, flows
@@ -0,0 +1,112 @@
+"""
+多保真度评价
+-------------------
+进化初期种群接近随机，用全部典型日评价并无必要。这里把典型日划分{典型日编号: [代表的日期]}进一步合并为更少的代表日：
+- 以各典型日的逐时数据（各列按全年最大值归一化）为特征，代表天数为权重，求加权k-medoids的最优解
+  （典型日数目很少，直接枚举全部组合）；
+- 被合并的典型日的日期并入其代表日，代表天数随之累加，合并后的划分仍是typical_days的同样结构。
+FidelitySchedule按代数计划或帕累托前沿趋于稳定时逐级切换到更高保真度，最后一级为完整的典型日划分。
+"""
+import math
+import itertools
+import numpy as np
+
+
+# 各典型日的归一化日特征向量与代表天数
+def get_day_features(typical_days, operation_list, time_step=24):
+    operation_array = np.asarray(operation_list, dtype=float)
+    scale = np.maximum(np.abs(operation_array).max(0), 1e-12)
+    medoids = list(typical_days.keys())
+    starts = (np.array(medoids, dtype=int) - 1) * 24
+    features = (operation_array[starts[:, None] + np.arange(time_step)] / scale).reshape(len(medoids), -1)
+    weights = np.array([len(typical_days[m]) for m in medoids], dtype=float)
+    return medoids, features, weights
+
+
+# 将典型日合并为n_days个代表日
+def coarsen_typical_days(typical_days, operation_list, n_days, max_combinations=200000):
+    medoids, features, weights = get_day_features(typical_days, operation_list)
+    if n_days >= len(medoids):
+        return dict(typical_days)
+    distance = ((features[:, None, :] - features[None, :, :]) ** 2).sum(-1)
+    n = len(medoids)
+    if math.factorial(n) // (math.factorial(n_days) * math.factorial(n - n_days)) <= max_combinations:
+        candidates = itertools.combinations(range(n), n_days)
+        best = min(candidates, key=lambda c: weights @ distance[:, list(c)].min(1))
+    else:
+        # 组合数过多时逐个贪心加入使加权距离和最小的代表日
+        best = []
+        for _ in range(n_days):
+            rest = [j for j in range(n) if j not in best]
+            best.append(min(rest, key=lambda j: weights @ distance[:, best + [j]].min(1)))
+    best = sorted(best)
+    assignment = np.array(best)[distance[:, best].argmin(1)]
+    coarse_days = dict()
+    for k, medoid in enumerate(medoids):
+        coarse_days.setdefault(medoids[assignment[k]], []).extend(typical_days[medoid])
+    return {medoid: sorted(days) for medoid, days in coarse_days.items()}
+
+
+# 由粗到细的各级典型日划分，最后一级为完整划分
+def build_fidelity_levels(typical_days, operation_list, sizes):
+    levels = [coarsen_typical_days(typical_days, operation_list, n) for n in sorted(sizes) if n < len(typical_days)]
+    levels.append(typical_days)
+    return levels
+
+
+class FidelitySchedule:
+    def __init__(self, levels, switch_generations=None, patience=3, tolerance=0.1):
+        self.levels = levels
+        self.switch_generations = switch_generations  # 各级切换的代数，None表示只按前沿稳定切换
+        if switch_generations is not None and len(switch_generations) < len(levels) - 1:
+            raise ValueError("switch_generations needs %d entries for %d fidelity levels, got %d"
+                             % (len(levels) - 1, len(levels), len(switch_generations)))
+        self.patience = patience  # 前沿连续稳定多少代后切换
+        self.tolerance = tolerance  # 前沿中新个体的比例低于该值视为稳定
+        self.level = 0
+        self.stable_count = 0
+        self.front = np.zeros((0, 0))
+
+    @property
+    def typical_days(self):
+        return self.levels[self.level]
+
+    def is_full(self):
+        return self.level == len(self.levels) - 1
+
+    # 根据当前代数与帕累托前沿决定是否切换到下一级，返回是否切换
+    def update(self, generation, front_phen):
+        if self.is_full():
+            return False
+        front_keys = set(np.asarray(row, dtype=float).tobytes() for row in front_phen)
+        previous_keys = set(np.asarray(row, dtype=float).tobytes() for row in self.front)
+        changed = 1 - len(front_keys & previous_keys) / max(len(front_keys), 1)
+        self.stable_count = self.stable_count + 1 if changed < self.tolerance else 0
+        self.front = np.array(front_phen, dtype=float)
+        scheduled = (self.switch_generations is not None and self.level < len(self.switch_generations)
+                     and generation >= self.switch_generations[self.level])
+        if scheduled or self.stable_count >= self.patience:
+            self.level += 1
+            self.stable_count = 0
+            self.front = np.zeros((0, 0))
+            print('切换到第%d级保真度（%d个代表日）' % (self.level, len(self.typical_days)))
+            return True
+        return False
+
+    # 直接切换到完整的典型日划分，返回是否切换
+    def finish(self):
+        if self.is_full():
+            return False
+        self.level = len(self.levels) - 1
+        self.stable_count = 0
+        self.front = np.zeros((0, 0))
+        return True
+
+    def get_state(self):
+        return {'fidelity_level': np.array(self.level), 'fidelity_stable': np.array(self.stable_count),
+                'fidelity_front': self.front}
+
+    def set_state(self, state):
+        self.level = int(state['fidelity_level'])
+        self.stable_count = int(state['fidelity_stable'])
+        self.front = np.array(state['fidelity_front'], dtype=float)
@@ -4,27 +4,52 @@ Created on Thu Apr 15 15:27:15 2021
 
 @author: Frank
 """
+import time
 import geatpy as ea
-import pandas as pd
 import numpy as np
+import profiling
 from operation import OperationModel
+from sparselp import get_dispatch_template
+from evalcache import EvaluationCache, data_fingerprint
+from surrogate import SurrogateScreen
+from fidelity import FidelitySchedule, build_fidelity_levels
+from fastdispatch import dispatch_storage_free, is_storage_free, clamp_storage
+from dataloader import load_operation_data, load_typical_days
+from resultarchive import get_writer, day_record
+from paretoarchive import ParetoArchive
+import threading
+from functools import partial
 import multiprocessing as mp
 from multiprocessing import Pool as ProcessPool
 from multiprocessing.dummy import Pool as ThreadPool
+from scheduler import TaskScheduler
+from distributed import DistributedPool
+from warmservice import ServicePool
 
+# 每个工作进程/线程缓存的持久化运行模型，键为典型日编号
+_model_cache = threading.local()
+# 典型日时段数及电价、气价
+TIME_STEP = 24
+ELE_PRICE = [0.1598 for _ in range(TIME_STEP)]
+GAS_PRICE = [0.0286 for _ in range(TIME_STEP)]
+# 工作进程内的只读输入数据，由进程池初始化函数设置一次，任务只需传递容量向量
+_worker_data = dict()
 
 
 class MyProblem(ea.Problem):  # 继承Problem父类
-    def __init__(self, PoolType):
-        operation_data = pd.read_csv('mergedData.csv')
-        self.operation_list = np.array(operation_data).tolist()
-        self.typical_days = dict()
-        typical_data = pd.read_excel('typicalDayData.xlsx')
-        typical_day_id = typical_data["typicalDayId"]
-        days_str = typical_data["days"]
-        for i in range(len(typical_day_id)):
-            days_list = list(map(int, days_str[i].split(",")))
-            self.typical_days[typical_day_id[i]] = days_list
+    def __init__(self, PoolType, persistent=False, engine='oemof', batch_size=None,
+                 cache_path=None, cache_resolution=1.0, cache_max_entries=200000, num_workers=None,
+                 surrogate_fraction=None, surrogate_retrain=5,
+                 fidelity_sizes=None, fidelity_switch=None, fidelity_patience=3,
+                 typical_days_path='typicalDayData.xlsx', early_stop=False, storage_threshold=None,
+                 chunk_size=None, task_timeout=None, max_worker_rss=None, max_worker_tasks=None,
+                 server_address='127.0.0.1:50000', authkey='ies_optimization',
+                 memetic_size=None, memetic_step=0.05, result_archive=None,
+                 pareto_path=None, pareto_reference=None, pareto_patience=None, pareto_tolerance=1e-4):
+        init_start = time.perf_counter()
+        # 逐时数据（内存映射的二进制缓存）与典型日划分，见dataloader.py；其他k的典型日划分可由clustering.py生成
+        self.operation_list = load_operation_data('mergedData.csv')
+        self.typical_days = load_typical_days(typical_days_path)
         name = 'MyProblem'  # 初始化name（函数名称，可以随意设置）
         M = 2  # 初始化M（目标维数）
         Dim = 9  # 初始化Dim（决策变量维数）
@@ -36,57 +61,482 @@ class MyProblem(ea.Problem):  # 继承Problem父类
         ubin = [1] * Dim  # 决策变量上边界（0表示不包含该变量的上边界，1表示包含）
         # 调用父类构造方法完成实例化
         ea.Problem.__init__(self, name, M, maxormins, Dim, varTypes, lb, ub, lbin, ubin)
-        # 设置用多线程还是多进程
+        # 是否在各工作进程中复用已建好的运行模型（只更新参数后重新求解）
+        self.persistent = persistent
+        # 运行模型求解引擎：'oemof' 或 'highs'
+        self.engine = engine
+        # 每个任务合并求解的个体数（块对角批量求解，仅限highs引擎），None表示逐个个体求解
+        self.batch_size = batch_size
+        if self.batch_size is not None and self.engine != 'highs':
+            raise ValueError("batch_size requires the 'highs' engine")
+        # 逐时调度结果存档目录（见resultarchive.py），None表示不保存
+        self.result_archive = result_archive
+        if self.batch_size is not None and self.result_archive is not None:
+            raise ValueError("result_archive is not supported with batch_size")
+        # 评价结果缓存（SQLite），cache_path为None时不使用
+        self.cache = None
+        if cache_path is not None:
+            fingerprint_extra = engine if storage_threshold is None else (engine, storage_threshold)
+            if batch_size is not None:
+                # 块对角批量求解在退化LP上可能取到与逐日求解不同的最优解，源荷匹配目标随之不同，两种模式分开缓存
+                fingerprint_extra = (fingerprint_extra, "batch")
+            data_hash = data_fingerprint(['mergedData.csv', typical_days_path], ELE_PRICE, GAS_PRICE, fingerprint_extra)
+            self.cache = EvaluationCache(cache_path, data_hash, cache_resolution, cache_max_entries)
+        # 代理模型预筛选，surrogate_fraction为每代交给真实评价的比例，None表示不使用
+        self.surrogate = None
+        self.predicted = dict()  # 当前使用代理模型预测值的个体，键为容量向量的字节串
+        if surrogate_fraction is not None:
+            self.surrogate = SurrogateScreen(lb, ub, maxormins, surrogate_fraction, surrogate_retrain)
+        # 多保真度评价：fidelity_sizes为各粗化级别的代表日数目（如[4]），None表示始终使用全部典型日
+        self.fidelity = None
+        if fidelity_sizes is not None:
+            levels = build_fidelity_levels(self.typical_days, self.operation_list, fidelity_sizes)
+            self.fidelity = FidelitySchedule(levels, fidelity_switch, fidelity_patience)
+        fidelity_levels = self.fidelity.levels if self.fidelity is not None else None
+        # 全部真实评价结果的外部非支配存档（见paretoarchive.py），每代记录超体积，前沿不再改进时可提前结束进化
+        self.pareto = ParetoArchive(pareto_path, pareto_reference, pareto_patience, pareto_tolerance)
+        # 提前终止：按代表天数从多到少求解典型日，目标下界已被外部非支配存档支配时停止求解
+        self.early_stop = early_stop
+        self.dominated = np.zeros(0, dtype=bool)  # 最近一次求解中被提前终止的个体
+        # 电、热、冷储能功率均不超过storage_threshold的设计按无储能处理（见repair），由fastdispatch.py逐时段枚举求解，
+        # 含退化时段的典型日仍建LP；None表示不使用
+        self.storage_threshold = storage_threshold
+        # 模因局部搜索：每代对第一前沿中至多memetic_size个个体沿经济目标的负梯度方向（由LP对偶值得到）
+        # 移动memetic_step倍的变量范围，生成的子代与种群一起参与环境选择；None表示不使用。对偶值只由highs引擎给出
+        self.memetic_size = memetic_size
+        if self.memetic_size is not None and self.engine != 'highs':
+            raise ValueError("memetic_size requires the 'highs' engine")
+        self.memetic_step = memetic_step
+        self.gradients = dict()  # 经济目标对容量的梯度，键为容量向量的字节串
+        # 各阶段计时与求解失败统计，按代、按工作进程汇总，见profiling.py
+        self.profile = profiling.ProfileRecorder()
+        self.worker_stats = []
+        # 设置用多线程、多进程还是带超时与回收的进程调度器（scheduler.py），输入数据在池初始化时一次性传给各工作进程；
+        # 逐时数据由各工作进程自行内存映射二进制缓存，不经进程间传输（线程池共享本进程的数据）
+        worker_args = (None, self.typical_days, self.persistent, self.engine, fidelity_levels, storage_threshold,
+                       result_archive)
         self.PoolType = PoolType
         if self.PoolType == 'Thread':
-            self.pool = ThreadPool(4)  # 设置池的大小
+            init_worker(self.operation_list, *worker_args[1:])  # 线程共享本进程已读入的逐时数据
+            self.pool_size = num_workers or 4
+            self.pool = ThreadPool(self.pool_size)  # 设置池的大小
         elif self.PoolType == 'Process':
-            num_cores = int(mp.cpu_count())  # 获得计算机的核心数
+            num_cores = num_workers or int(mp.cpu_count())  # 默认使用计算机的全部核心
             print("num_cores:" + str(num_cores))
-            self.pool = ProcessPool(num_cores)  # 设置池的大小
+            self.pool_size = num_cores
+            self.pool = ProcessPool(num_cores, initializer=init_worker, initargs=worker_args)  # 设置池的大小
+        elif self.PoolType == 'Scheduler':
+            # chunk_size：每次分给工作进程的个体数；task_timeout：单个任务的超时秒数；
+            # max_worker_rss / max_worker_tasks：工作进程内存（MB）/完成任务数超过该值后替换为新进程
+            self.pool_size = num_workers or int(mp.cpu_count())
+            self.pool = TaskScheduler(self.pool_size, init_worker, worker_args, chunk_size,
+                                      task_timeout, max_worker_rss, max_worker_tasks)
+        elif self.PoolType == 'Distributed':
+            # 多机分布式评价（distributed.py）：num_workers为在本机启动的工作进程数，其他节点用命令行启动工作进程
+            self.pool = DistributedPool(init_worker, worker_args, server_address, authkey, num_workers or 0)
+        elif self.PoolType == 'Service':
+            # 连接常驻的本机评价服务（warmservice.py，地址为server_address），工作进程已预先导入并预热
+            self.pool = ServicePool(init_worker, worker_args, server_address, authkey)
+            for worker, startup in self.pool.startup.items():
+                self.profile.add_startup(worker, startup)
+        else:
+            raise ValueError("Unknown PoolType: %s" % PoolType)
+        # 主进程的启动耗时：入口脚本记录的模块导入（如gasolution.py中的gaproblem）与问题对象的创建（含进程池的启动）
+        self.profile.add_startup("main", profiling.pop_startup())
+        self.profile.add_startup("main", {"problem_init": time.perf_counter() - init_start})
 
     def aimFunc(self, pop):  # 目标函数
         # 获取决策变量值
-        Vars = pop.Phen  # 得到决策变量矩阵
-        args = list(
-            zip(
-                list(range(pop.sizes)),
-                [Vars] * pop.sizes,
-                [self.operation_list] * pop.sizes,
-                [self.typical_days] * pop.sizes
-            )
-        )
+        Vars = self.repair(pop.Phen)  # 得到决策变量矩阵
+        if Vars is not pop.Phen:
+            # 修正后的设计写回种群（实数编码的染色体即决策变量），种群中的个体与其目标函数值一致
+            pop.Phen = Vars
+            if pop.Encoding == 'RI':
+                pop.Chrom = Vars.copy()
+        pop.ObjV = self.evaluate_designs(Vars, self.surrogate is not None)
+
+    def repair(self, Vars):
+        # 启用快速调度时，储能功率均不超过storage_threshold的设计按无储能处理（储能功率置为0），
+        # 评价、评价结果缓存与外部非支配存档使用的都是修正后的设计；未启用时原样返回
+        if self.storage_threshold is None:
+            return Vars
+        return clamp_storage(Vars, self.storage_threshold)
+
+    def evaluate_designs(self, Vars, screen=False):
+        # 一次种群评价并记录其各阶段耗时；灵敏度分析（sensitivity.py）等脚本也由此批量评价设计方案
+        Vars = self.repair(Vars)
+        start_time = time.perf_counter()
+        cache_hits = self.cache.hits if self.cache is not None else 0
+        ObjV = self.evaluate(Vars, screen)
+        cache_hits = self.cache.hits - cache_hits if self.cache is not None else 0
+        self.record_generation(time.perf_counter() - start_time, Vars.shape[0], cache_hits)
+        return ObjV
+
+    def record_generation(self, wall_time, population_size, cache_hits):
+        # 记录本代的各阶段耗时（稳态进化时每NIND个评价结果为一代）
+        scheduler_stats = self.pool.pop_stats() if self.PoolType in ('Scheduler', 'Distributed', 'Service') else None
+        self.profile.add_generation(self.worker_stats, wall_time, population_size, cache_hits, scheduler_stats)
+        self.worker_stats = []
+
+    def submit_async(self, ticket, capacities, done):
+        # 稳态进化（steadystate.py）：异步评价单个个体，完成后由进程池的回调线程把(ticket, 容量向量, 目标函数值, 统计)
+        # 放入队列done；命中缓存时立即放入。结果由主线程经finish_async登记
+        if self.PoolType == 'Scheduler' or self.batch_size is not None:
+            raise ValueError("asynchronous evaluation requires PoolType 'Thread', 'Process', 'Distributed' "
+                             "or 'Service' without batch_size")
+        row = np.array(self.repair(capacities), dtype=float)
+        if self.cache is not None:
+            cached = self.cache.get_many(row.reshape(1, -1))[0]
+            if cached is not None:
+                done.put((ticket, row, np.asarray(cached, dtype=float), None))
+                return
+        self.pool.apply_async(partial(workerAimFunc, fidelity=self.fidelity_level()), (row,),
+                              callback=lambda result: done.put((ticket, row) + tuple(result)),
+                              error_callback=lambda e: done.put(
+                                  (ticket, row) + failedAimFunc(row, "%s: %s" % (type(e).__name__, e))))
+
+    def finish_async(self, row, objv, stats):
+        # 主线程中登记一个异步评价结果：计时统计、评价结果缓存与外部非支配存档
+        objv = np.asarray(objv, dtype=float)
+        if stats is not None:  # stats为None表示命中缓存
+            self.worker_stats.append(stats)
+            if self.cache is not None:
+                self.cache.put_many(row.reshape(1, -1), objv.reshape(1, -1))
+        self.pareto.insert(row, objv)
+        return objv
+
+    def evaluate(self, Vars, screen=False, bound=True):
+        # 完整保真度下的真实评价结果（不含代理模型预测值与提前终止的惩罚值）插入外部非支配存档
+        ObjV = self.evaluate_objectives(Vars, screen, bound)
+        if self.is_full_fidelity():
+            valid = ~self.is_predicted(Vars)
+            self.pareto.insert_many(Vars[valid], ObjV[valid])
+        return ObjV
+
+    def evaluate_objectives(self, Vars, screen=False, bound=True):
+        # 先查缓存，只对未命中的个体求解；screen为True时未命中的个体再经代理模型预筛选
+        # bound为True且启用提前终止时，被非支配解集支配的个体得到惩罚值，与代理模型预测值一样记入predicted
+        # 低保真度的评价结果既不缓存也不用于训练代理模型
+        if not self.is_full_fidelity() or (self.cache is None and self.surrogate is None and not self.early_stop):
+            return self.evaluate_uncached(Vars)
+        ObjV = np.zeros((Vars.shape[0], self.M))
+        missing = np.arange(Vars.shape[0])
+        if self.cache is not None:
+            cached = self.cache.get_many(Vars)
+            missing = np.array([i for i, objv in enumerate(cached) if objv is None], dtype=int)
+            for i, objv in enumerate(cached):
+                if objv is not None:
+                    ObjV[i] = objv
+            if self.surrogate is not None:
+                self.surrogate.add(np.delete(Vars, missing, axis=0), np.delete(ObjV, missing, axis=0))
+        if screen and len(missing):
+            selected, predicted = self.surrogate.screen(Vars[missing])
+            predicted_index = np.setdiff1d(missing, missing[selected])
+            ObjV[predicted_index] = predicted
+            for row in Vars[predicted_index]:
+                self.predicted[np.asarray(row, dtype=float).tobytes()] = True
+            missing = missing[selected]
+        if len(missing):
+            archive = self.pareto.ObjV if bound and self.early_stop and len(self.pareto) else None
+            ObjV[missing] = self.evaluate_uncached(Vars[missing], archive)
+            for row in Vars[missing[self.dominated]]:
+                self.predicted[np.asarray(row, dtype=float).tobytes()] = True
+            missing = missing[~self.dominated]
+            for row in Vars[missing]:
+                self.predicted.pop(np.asarray(row, dtype=float).tobytes(), None)
+            if self.cache is not None:
+                self.cache.put_many(Vars[missing], ObjV[missing])
+            if self.surrogate is not None:
+                self.surrogate.add(Vars[missing], ObjV[missing])
+        return ObjV
+
+    def is_predicted(self, Vars):
+        # 各个体的目标函数值是否为代理模型预测值或提前终止的惩罚值
+        return np.array([np.asarray(row, dtype=float).tobytes() in self.predicted for row in Vars], dtype=bool)
+
+    def reevaluate_predicted(self, pop):
+        # 对种群中使用预测值/惩罚值的个体进行完整的真实评价，返回是否有个体被重新评价
+        mask = self.is_predicted(pop.Phen)
+        if not mask.any():
+            return False
+        pop.ObjV[mask] = self.evaluate(pop.Phen[mask], bound=False)
+        for row in pop.Phen[mask]:
+            self.predicted.pop(np.asarray(row, dtype=float).tobytes(), None)
+        return True
+
+    def evaluate_uncached(self, Vars, archive=None):
+        self.dominated = np.zeros(Vars.shape[0], dtype=bool)
+        if self.batch_size is not None:
+            return self.batch_aimFunc(Vars)
+        # 每个任务只携带该个体的容量向量、保真度级别及提前终止所用的非支配解集
+        args = [np.array(row, dtype=float) for row in Vars]
+        gradient = self.memetic_size is not None and self.is_full_fidelity()
+        task = partial(workerAimFunc, fidelity=self.fidelity_level(), archive=archive, gradient=gradient)
         if self.PoolType == 'Thread':
-            pop.ObjV = np.array(list(self.pool.map(subAimFunc, args)))
+            results = self.collect_results(self.pool.map(task, args))
         elif self.PoolType == 'Process':
-            result = self.pool.map_async(subAimFunc, args)
+            result = self.pool.map_async(task, args)
             result.wait()
-            pop.ObjV = np.array(result.get())
+            results = self.collect_results(result.get())
+        elif self.PoolType in ('Scheduler', 'Distributed', 'Service'):
+            results = self.collect_results(self.pool.map(task, args, on_failure=failedAimFunc))
+        self.dominated = np.array([isinstance(objv, DominatedObjective) for objv in results], dtype=bool)
+        for row, objv in zip(args, results):
+            if isinstance(objv, GradientObjective):
+                self.gradients[row.tobytes()] = objv.gradient
+        return np.array(results, dtype=float)
+
+    def refine(self, pop):
+        # 模因局部搜索：第一前沿中有梯度的个体沿经济目标的负梯度方向移动一步，返回新个体的决策变量矩阵，没有可移动的个体时返回None
+        # 梯度按变量范围缩放后归一化到最大分量为1，步长为memetic_step倍的变量范围；互补性目标由NSGA-II的选择兼顾
+        keys = [np.asarray(row, dtype=float).tobytes() for row in pop.Phen]
+        self.gradients = {key: self.gradients[key] for key in keys if key in self.gradients}
+        [levels, _] = ea.ndsortESS(pop.ObjV, pop.sizes, 1, pop.CV, self.maxormins)
+        front = [i for i in np.where(levels == 1)[0] if keys[i] in self.gradients]
+        if not front:
+            return None
+        # 经济目标从小到大取，使前沿中各段都有个体被改进
+        front = sorted(front, key=lambda i: pop.ObjV[i, 0])
+        if len(front) > self.memetic_size:
+            front = [front[k] for k in np.linspace(0, len(front) - 1, self.memetic_size).round().astype(int)]
+        lb, ub = self.ranges[0], self.ranges[1]
+        Phen = []
+        for i in front:
+            direction = -self.gradients[keys[i]] * (ub - lb)
+            if np.max(np.abs(direction)) > 0:
+                direction = direction / np.max(np.abs(direction))
+                Phen.append(np.clip(pop.Phen[i] + self.memetic_step * (ub - lb) * direction, lb, ub))
+        return np.array(Phen) if Phen else None
+
+    def batch_aimFunc(self, Vars):
+        # 将种群按batch_size分块，每块的全部典型日在一个块对角LP中求解
+        args = [np.array(Vars[k:k + self.batch_size], dtype=float) for k in range(0, Vars.shape[0], self.batch_size)]
+        task = partial(workerAimFuncBatch, fidelity=self.fidelity_level())
+        if self.PoolType == 'Thread':
+            results = self.pool.map(task, args)
+        elif self.PoolType in ('Scheduler', 'Distributed', 'Service'):
+            results = self.pool.map(task, args, on_failure=failedAimFunc)
+        else:
+            result = self.pool.map_async(task, args)
+            result.wait()
+            results = result.get()
+        return np.array([objv for chunk_result in self.collect_results(results) for objv in chunk_result])
+
+    def fidelity_level(self):
+        # 当前保真度级别在各级典型日划分中的下标，-1为完整划分
+        return self.fidelity.level if self.fidelity is not None else -1
+
+    def is_full_fidelity(self):
+        return self.fidelity is None or self.fidelity.is_full()
+
+    def update_fidelity(self, generation, pop):
+        # 按代数计划或帕累托前沿的稳定程度切换保真度，返回是否切换
+        if self.is_full_fidelity():
+            return False
+        [levels, _] = ea.ndsortESS(pop.ObjV, pop.sizes, 1, pop.CV, self.maxormins)
+        return self.fidelity.update(generation, pop.Phen[levels == 1])
+
+    def collect_results(self, results):
+        # 任务结果为(目标函数值, 工作进程统计)，统计留待本代评价结束后汇总
+        self.worker_stats.extend(stats for _, stats in results)
+        return [objv for objv, _ in results]
+
+    def worker_count(self):
+        # 并行评价的工作进程（线程）数；分布式与常驻服务为当前在线的工作进程数
+        if self.PoolType in ('Distributed', 'Service'):
+            return self.pool.worker_count()
+        return self.pool_size
 
     def kill_pool(self):
         self.pool.close()
+        if self.cache is not None:
+            self.cache.close()
 
 
 def cal_solar_output(solar_radiation_list, temperature_list, ppv):
-    return [ppv * 0.9 * r / 1000 * (1 - 0.0035 * (t - 25)) for r, t in zip(solar_radiation_list, temperature_list)]
+    # 支持数组广播，例如ppv为(种群, 1, 1)、气象数据为(典型日, 时段)时得到(种群, 典型日, 时段)
+    solar_radiation = np.asarray(solar_radiation_list, dtype=float)
+    temperature = np.asarray(temperature_list, dtype=float)
+    return ppv * 0.9 * solar_radiation / 1000 * (1 - 0.0035 * (temperature - 25))
 
 
 def cal_wind_output(wind_speed_list, pwt):
-    ret = [0 for _ in range(len(wind_speed_list))]
-    for i in range(len(wind_speed_list)):
-        w = wind_speed_list[i]
-        if 2.5 <= w < 9:
-            ret[i] = (w ** 3 - 2.5 ** 3) / (9 ** 3 - 2.5 ** 3) * pwt
-        elif 9 <= w < 25:
-            ret[i] = pwt
-    return ret
+    # 切入风速2.5m/s，额定风速9m/s，切出风速25m/s；同样支持数组广播
+    w = np.asarray(wind_speed_list, dtype=float)
+    # float_power与Python的w ** 3逐位一致，避免出力的末位差异改变退化LP所取的最优解
+    ratio = np.where((2.5 <= w) & (w < 9), (np.float_power(w, 3) - 2.5 ** 3) / (9 ** 3 - 2.5 ** 3),
+                     np.where((9 <= w) & (w < 25), 1.0, 0.0))
+    return ratio * pwt
 
 
-def subAimFunc(args):
-    i = args[0]
-    Vars = args[1]
-    operation_list = args[2]
-    typical_days = args[3]
+def cal_renewable_profiles(Vars, day_data):
+    # 整个种群在全部典型日的光伏、风电出力，形状为(种群, 典型日, 时段)
+    Vars = np.atleast_2d(Vars)
+    pv_output = cal_solar_output(day_data[..., 3], day_data[..., 5], Vars[:, 0, None, None])
+    wt_output = cal_wind_output(day_data[..., 4], Vars[:, 1, None, None])
+    return pv_output, wt_output
+
+
+def init_worker(operation_array, typical_days, persistent, engine, fidelity_levels=None, storage_threshold=None,
+                result_archive=None):
+    # 进程池初始化函数：每个工作进程只接收一次典型日划分，逐时数据为None时从二进制缓存内存映射
+    start = time.perf_counter()
+    if operation_array is None:
+        operation_array = load_operation_data('mergedData.csv')
+    _worker_data["operation_list"] = operation_array
+    _worker_data["typical_days"] = typical_days
+    _worker_data["fidelity_levels"] = fidelity_levels if fidelity_levels is not None else [typical_days]
+    _worker_data["persistent"] = persistent
+    _worker_data["engine"] = engine
+    _worker_data["storage_threshold"] = storage_threshold
+    _worker_data["result_archive"] = result_archive
+    profiling.record_startup("init", time.perf_counter() - start)
+
+
+def workerAimFunc(capacities, fidelity=-1, archive=None, gradient=False):
+    # 进程池任务：只传入单个个体的容量向量与保真度级别，其余输入取自工作进程内的数据；同时返回本任务的计时统计
+    objv = subAimFunc((0, capacities.reshape(1, -1), _worker_data["operation_list"],
+                       _worker_data["fidelity_levels"][fidelity]),
+                      persistent=_worker_data["persistent"], engine=_worker_data["engine"], archive=archive,
+                      storage_threshold=_worker_data["storage_threshold"], with_gradient=gradient,
+                      result_archive=_worker_data["result_archive"])
+    return objv, profiling.collect()
+
+
+def failedAimFunc(capacities, reason):
+    # 调度器/分布式任务中超时、抛出异常或工作进程退出的任务（单个个体或一块个体）：目标函数值记为inf，失败信息计入统计
+    n = np.atleast_2d(capacities).shape[0]
+    stats = profiling.new_stats()
+    stats["evaluations"] = stats["failures"] = n
+    stats["errors"]["scheduler: " + reason] = n
+    stats["worker"] = "scheduler"
+    print("[evaluation failed] " + reason)
+    objv = [float('inf'), float('inf')]
+    return (objv if np.ndim(capacities) == 1 else [objv] * n), stats
+
+
+def workerAimFuncBatch(Vars, fidelity=-1):
+    # 进程池任务：一块个体的容量矩阵，块对角批量求解
+    objvs = subAimFuncBatch((range(Vars.shape[0]), Vars, _worker_data["operation_list"],
+                             _worker_data["fidelity_levels"][fidelity]))
+    return objvs, profiling.collect()
+
+
+def get_persistent_model(cluster_medoid, time_step, ele_price, gas_price,
+                         ele_load, heat_load, cool_load, wt_output, pv_output,
+                         pgt, php, pec, pac, pes, phs, pcs, engine='oemof'):
+    # 每个典型日的模型在每个工作进程/线程中只建立一次，之后只更新参数
+    if not hasattr(_model_cache, "models"):
+        _model_cache.models = dict()
+    operation_model = _model_cache.models.get((engine, cluster_medoid))
+    if operation_model is None:
+        operation_model = OperationModel('01/01/2019', time_step, ele_price, gas_price,
+                                         ele_load, heat_load, cool_load, wt_output, pv_output,
+                                         pgt, php, pec, pac, pes, phs, pcs, engine)
+        _model_cache.models[(engine, cluster_medoid)] = operation_model
+    else:
+        operation_model.update_parameters(ele_load, heat_load, cool_load, wt_output, pv_output,
+                                          pgt, php, pec, pac, pes, phs, pcs)
+    return operation_model
+
+
+def get_typical_day_arrays(operation_list, typical_days, time_step=TIME_STEP):
+    # 全部典型日的逐时数据，形状为(典型日, 时段, 6)，以及各典型日代表的天数
+    operation_array = np.asarray(operation_list, dtype=float)
+    medoids = list(typical_days.keys())
+    starts = (np.array(medoids, dtype=int) - 1) * 24
+    day_data = operation_array[starts[:, None] + np.arange(time_step)]
+    weights = np.array([len(typical_days[m]) for m in medoids], dtype=float)
+    return medoids, day_data, weights
+
+
+def cal_net_load(source, overflow):
+    # 净负荷：外部补充大于多余量时取外部补充，否则取多余量的相反数
+    source = np.asarray(source, dtype=float)
+    overflow = np.asarray(overflow, dtype=float)
+    return np.where(source >= overflow, source, 0 - overflow)
+
+
+def weighted_std(values, weights, total_hours=8760):
+    # values形状为(..., 典型日, 时段)，每个典型日的逐时值在其代表的各天中重复，未被代表的小时取0；
+    # 直接由加权一、二阶矩得到全年逐时序列的标准差，与np.std(全年序列)一致
+    w = weights[:, None]
+    mean = (values * w).sum(axis=(-2, -1)) / total_hours
+    deviation = values - mean[..., None, None]
+    uncovered_hours = total_hours - weights.sum() * values.shape[-1]
+    variance = ((deviation ** 2) * w).sum(axis=(-2, -1)) + uncovered_hours * mean ** 2
+    return np.sqrt(variance / total_hours)
+
+
+def cal_complementary_obj(complementary_results, weights):
+    # complementary_results中各符号的逐时出力形状为(..., 典型日, 时段)
+    net_ele_load = cal_net_load(complementary_results["grid"], complementary_results["electricity overflow"])
+    net_heat_load = cal_net_load(complementary_results["heat source"], complementary_results["heat overflow"])
+    net_cool_load = cal_net_load(complementary_results["cool source"], complementary_results["cool overflow"])
+    return weighted_std(net_ele_load, weights) + weighted_std(net_heat_load, weights) \
+        + weighted_std(net_cool_load, weights)
+
+
+# 各设备单位容量的年化投资成本，经济目标与其梯度共用
+INVESTMENT_COEFFICIENTS = [76.44188371, 110.4233218, 50.32074101, 21.21527903, 22.85563566, 21.81674313,
+                           35.11456751, 1.689590459, 1.689590459]
+
+
+def cal_economic_obj(capacities, oc):
+    # 经济目标：设备年化投资成本 + 年运行成本，capacities可为(种群, 9)矩阵
+    capacities = np.asarray(capacities, dtype=float)
+    phs, pcs = capacities[..., 7], capacities[..., 8]
+    return capacities @ np.array(INVESTMENT_COEFFICIENTS) + 520 * (phs > 0.1) + 520 * (pcs > 0.1) + oc
+
+
+def print_objectives(economic_obj_i, complementary_obj_i, capacities):
+    print("[economic:%f] [complementary:%f] \n "
+          "[ppv:%f] [pwt:%f] [pgt:%f] [php:%f] [pec:%f] [pac:%f] [pes:%f] [phs:%f] [pcs:%f]"
+          % (economic_obj_i, complementary_obj_i, *capacities))
+
+
+class GradientObjective(list):
+    # 附带经济目标对9个容量的梯度（由LP对偶值得到）的目标函数值，用于MyProblem的模因局部搜索
+    def __init__(self, objv, gradient):
+        list.__init__(self, objv)
+        self.gradient = gradient
+
+
+class DominatedObjective(list):
+    # 提前终止的个体的惩罚目标值：[存档最差值 + 经济目标下界, 存档最差值 + 源荷匹配目标下界]，不是真实目标值
+    pass
+
+
+def cal_complementary_lower_bound(day_results, day_weights, total_days, time_step=TIME_STEP, total_hours=8760):
+    # 只知道部分典型日时，全年净负荷标准差的下界：未求解的日期可取任意值，取为加权均值时对方差无贡献；
+    # 未被任何典型日代表的小时按0计入，与weighted_std一致
+    uncovered_hours = total_hours - total_days * time_step
+    w = np.asarray(day_weights, dtype=float)[:, None]
+    bound = 0
+    for source, overflow in [("grid", "electricity overflow"), ("heat source", "heat overflow"),
+                             ("cool source", "cool overflow")]:
+        net_load = cal_net_load([r[source] for r in day_results], [r[overflow] for r in day_results])
+        mean = (net_load * w).sum() / (w.sum() * time_step + uncovered_hours)
+        variance = (((net_load - mean) ** 2) * w).sum() + uncovered_hours * mean ** 2
+        bound += np.sqrt(variance / total_hours)
+    return float(bound)
+
+
+def is_dominated_by(archive, economic, complementary):
+    # archive中是否存在在两个目标上都不差且至少一个更好的解（两个目标均为最小化）
+    archive = np.asarray(archive, dtype=float)
+    target = np.array([economic, complementary])
+    return bool(np.any(np.all(archive <= target, axis=1) & np.any(archive < target, axis=1)))
+
+
+def subAimFunc(args, *, persistent=False, engine='oemof', archive=None, storage_threshold=None, with_gradient=False,
+               result_archive=None):
+    # args为(个体下标, 容量矩阵, 逐时数据, 典型日划分)，其余选项只能按关键字传入：
+    # persistent：是否复用已建好的运行模型；engine：'oemof'或'highs'；
+    # archive：当前非支配解集的目标值，给定时启用提前终止；
+    # storage_threshold：储能功率均不超过该值时不建LP，见fastdispatch.py；
+    # with_gradient：是否由LP对偶值计算经济目标对容量的梯度；result_archive：逐时调度结果存档目录，见resultarchive.py
+    i, Vars, operation_list, typical_days = args
     ppv = Vars[i, 0]  # 光伏额定功率
     pwt = Vars[i, 1]  # 风电额定功率
     pgt = Vars[i, 2]  # 燃气轮机额定功率
@@ -96,72 +546,175 @@ def subAimFunc(args):
     pes = Vars[i, 6]  # 电储能额定功率
     phs = Vars[i, 7]  # 热储能额定功率
     pcs = Vars[i, 8]  # 冷储能额定功率
+    if storage_threshold is not None and is_storage_free(pes, phs, pcs, storage_threshold):
+        # 储能功率很小的设计按无储能处理，调度与投资成本都按储能功率为0计算（与MyProblem.repair一致）
+        pes = phs = pcs = 0.0
+    capacities = [ppv, pwt, pgt, php, pec, pac, pes, phs, pcs]
     oc = 0
-    net_ele_load = [0 for _ in range(8760)]  # 电净负荷
-    net_heat_load = [0 for _ in range(8760)]  # 热净负荷
-    net_cool_load = [0 for _ in range(8760)]  # 冷净负荷
-    time_step = 24
-    ele_price = [0.1598 for _ in range(time_step)]
-    gas_price = [0.0286 for _ in range(time_step)]
-    ele_load = [0 for _ in range(time_step)]
-    heat_load = [0 for _ in range(time_step)]
-    cool_load = [0 for _ in range(time_step)]
-    solar_radiation_list = [0 for _ in range(time_step)]
-    wind_speed_list = [0 for _ in range(time_step)]
-    temperature_list = [0 for _ in range(time_step)]
+    time_step = TIME_STEP
+    ele_price = ELE_PRICE
+    gas_price = GAS_PRICE
+    medoids, day_data, weights = get_typical_day_arrays(operation_list, typical_days, time_step)
+    pv_outputs, wt_outputs = cal_renewable_profiles(np.array([capacities]), day_data)
+    complementary_results = dict()  # 各典型日的外部能源与多余能量出口出力
     is_success = True
-    for cluster_medoid in typical_days.keys():
-        time_start = (cluster_medoid - 1) * 24
-        # 下层模型参数设置
-        for t in range(time_start, time_start + time_step):
-            ele_load[t % 24] = operation_list[t][0]
-            heat_load[t % 24] = operation_list[t][1]
-            cool_load[t % 24] = operation_list[t][2]
-            solar_radiation_list[t % 24] = operation_list[t][3]
-            wind_speed_list[t % 24] = operation_list[t][4]
-            temperature_list[t % 24] = operation_list[t][5]
-        pv_output = cal_solar_output(solar_radiation_list, temperature_list, ppv)
-        wt_output = cal_wind_output(wind_speed_list, pwt)
-        # 底层模型初始化及优化
-        operation_model = OperationModel('01/01/2019', time_step, ele_price, gas_price,
-                                         ele_load, heat_load, cool_load, wt_output, pv_output,
-                                         pgt, php, pec, pac, pes, phs, pcs)
-        try:
-            # 优化并获取结果
-            operation_model.optimise()
-            oc += operation_model.get_objective_value() * len(typical_days[cluster_medoid])
-            complementary_results = operation_model.get_complementary_results()
-        except Exception:
-            is_success = False
-            break
-        for d in typical_days[cluster_medoid]:
-            start_index = (d - 1) * 24
-            for i in range(24):
-                if complementary_results["grid"][i] >= complementary_results["electricity overflow"][i]:
-                    net_ele_load[start_index + i] = complementary_results["grid"][i]
-                else:
-                    net_ele_load[start_index + i] = 0 - complementary_results["electricity overflow"][i]
-                if complementary_results["heat source"][i] >= complementary_results["heat overflow"][i]:
-                    net_heat_load[start_index + i] = complementary_results["heat source"][i]
-                else:
-                    net_heat_load[start_index + i] = 0 - complementary_results["heat overflow"][i]
-                if complementary_results["cool source"][i] >= complementary_results["cool overflow"][i]:
-                    net_cool_load[start_index + i] = complementary_results["cool source"][i]
-                else:
-                    net_cool_load[start_index + i] = 0 - complementary_results["cool overflow"][i]
+    # 提前终止模式下按代表天数从多到少求解，每求解一天更新目标函数下界
+    order = np.argsort(-weights, kind='stable') if archive is not None else range(len(medoids))
+    investment = float(cal_economic_obj(capacities, 0)) if archive is not None else 0
+    day_oc = dict()
+    day_results = dict()
+    day_sensitivity = dict()
+    day_records = dict()  # 各典型日的全部逐时结果，仅在保存存档时记录
+    # 无储能设计的各时段相互独立，全部典型日一次性由fastdispatch求解，结果无效（含退化时段等）的典型日仍用LP求解
+    fast_days = dict()
+    if storage_threshold is not None and is_storage_free(pes, phs, pcs, storage_threshold):
+        with profiling.phase("dispatch"):
+            fast_oc, fast_results, valid, degenerate, fast_flows = dispatch_storage_free(
+                ele_price, gas_price, day_data[:, :, 0], day_data[:, :, 1], day_data[:, :, 2],
+                wt_outputs[0], pv_outputs[0], pgt, php, pec, pac, return_flows=True)
+            for k in np.flatnonzero(valid):
+                fast_days[k] = (float(fast_oc[k]), {symbol: flow[k].tolist() for symbol, flow in fast_results.items()})
+                if result_archive is not None:
+                    flows = {flow: values[k] for flow, values in fast_flows.items()}
+                    flows.update({("wind turbine", "electricity bus"): wt_outputs[0, k],
+                                  ("photovoltaic", "electricity bus"): pv_outputs[0, k],
+                                  ("electricity bus", "electricity demand"): day_data[k, :, 0],
+                                  ("heat bus", "heat demand"): day_data[k, :, 1],
+                                  ("cool bus", "cool demand"): day_data[k, :, 2]})
+                    day_records[k] = day_record(flows, np.zeros((3, time_step)), time_step)
+        profiling.record_count("fast_dispatch_days", len(fast_days))
+        profiling.record_count("fast_dispatch_degenerate_days", int(degenerate.sum()))  # 因退化交给LP的典型日
+    for k in order:
+        cluster_medoid = medoids[k]
+        if k in fast_days:
+            day_oc[k], day_results[k] = fast_days[k]
+        else:
+            # 下层模型参数设置
+            ele_load = day_data[k, :, 0]
+            heat_load = day_data[k, :, 1]
+            cool_load = day_data[k, :, 2]
+            pv_output = pv_outputs[0, k]
+            wt_output = wt_outputs[0, k]
+            # 底层模型初始化及优化
+            if persistent:
+                operation_model = get_persistent_model(cluster_medoid, time_step, ele_price, gas_price,
+                                                       ele_load, heat_load, cool_load, wt_output, pv_output,
+                                                       pgt, php, pec, pac, pes, phs, pcs, engine)
+            else:
+                operation_model = OperationModel('01/01/2019', time_step, ele_price, gas_price,
+                                                 ele_load, heat_load, cool_load, wt_output, pv_output,
+                                                 pgt, php, pec, pac, pes, phs, pcs, engine)
+            try:
+                # 优化并获取结果
+                operation_model.optimise()
+                day_oc[k] = operation_model.get_objective_value()
+                day_results[k] = operation_model.get_complementary_results()
+                if with_gradient:
+                    day_sensitivity[k] = operation_model.get_capacity_sensitivity()
+                if result_archive is not None:
+                    with profiling.phase("archive"):
+                        day_records[k] = day_record(operation_model.get_flow_sequences(),
+                                                    operation_model.get_storage_content(), time_step)
+            except Exception as e:
+                if persistent:
+                    # 求解失败后模型状态不可信，丢弃缓存以便下次重建
+                    _model_cache.models.pop((engine, cluster_medoid), None)
+                message = "%s engine, typical day %d: %s: %s" % (engine, cluster_medoid, type(e).__name__, e)
+                profiling.record_failure(message)
+                print("[solve failed] " + message)
+                is_success = False
+                break
+        if archive is not None and len(day_oc) < len(medoids):
+            solved = list(day_oc.keys())
+            economic_lb = investment + sum(day_oc[j] * weights[j] for j in solved)
+            complementary_lb = cal_complementary_lower_bound([day_results[j] for j in solved], weights[solved],
+                                                             weights.sum())
+            if is_dominated_by(archive, economic_lb, complementary_lb):
+                # 已被非支配解集严格支配，剩余典型日不再求解，返回排在全部存档解之后的惩罚值
+                profiling.record_count("early_stop")
+                profiling.record_count("early_stop_saved_days", len(medoids) - len(solved))
+                profiling.record_evaluation()
+                nadir = archive.max(0)
+                return DominatedObjective([float(nadir[0] + economic_lb), float(nadir[1] + complementary_lb)])
+    if is_success:
+        for k in range(len(medoids)):
+            oc += day_oc[k] * len(typical_days[medoids[k]])
+            for symbol, flow_list in day_results[k].items():
+                complementary_results.setdefault(symbol, []).append(flow_list)
+        if result_archive is not None:
+            with profiling.phase("archive"):
+                records = [(medoids[k], len(typical_days[medoids[k]]), day_records[k]) for k in range(len(medoids))]
+                get_writer(result_archive, time_step).append(capacities, records)
 
     # 计算上层模型目标函数值
+    profiling.record_evaluation()
     if is_success:
-        # 经济目标
-        economic_obj_i = 76.44188371 * ppv + 110.4233218 * pwt + 50.32074101 * pgt + 21.21527903 * php \
-                         + 22.85563566 * pec + 21.81674313 * pac + 35.11456751 * pes + 1.689590459 * (phs + pcs) \
-                         + 520 * (phs > 0.1) + 520 * (pcs > 0.1) + oc
-        # 源荷匹配目标                 
-        complementary_obj_i = np.std(net_ele_load) + np.std(net_heat_load) + np.std(net_cool_load)
+        with profiling.phase("objective"):
+            economic_obj_i = float(cal_economic_obj(capacities, oc))
+            complementary_obj_i = float(cal_complementary_obj(complementary_results, weights))
     else:
         economic_obj_i = float('inf')
         complementary_obj_i = float('inf')
-    print("[economic:%f] [complementary:%f] \n "
-          "[ppv:%f] [pwt:%f] [pgt:%f] [php:%f] [pec:%f] [pac:%f] [pes:%f] [phs:%f] [pcs:%f]"
-          % (economic_obj_i, complementary_obj_i, ppv, pwt, pgt, php, pec, pac, pes, phs, pcs))
-    return [economic_obj_i, complementary_obj_i]
\ No newline at end of file
+    print_objectives(economic_obj_i, complementary_obj_i, capacities)
+    # 快速调度求解的典型日没有对偶值，此时不给出梯度
+    if is_success and with_gradient and len(day_sensitivity) == len(medoids):
+        return GradientObjective([economic_obj_i, complementary_obj_i],
+                                 cal_economic_gradient(capacities, day_sensitivity, day_data, weights))
+    return [economic_obj_i, complementary_obj_i]
+
+
+def cal_economic_gradient(capacities, day_sensitivity, day_data, weights):
+    # 经济目标对9个容量的梯度：投资成本系数 + 各典型日运行成本对容量的偏导数按代表天数加权求和；
+    # 风电、光伏容量经单位容量出力曲线链式求导，热/冷储能固定投资（520）的阶跃不计入
+    pv_unit, wt_unit = cal_renewable_profiles(np.ones((1, 9)), day_data)
+    gradient = np.array(INVESTMENT_COEFFICIENTS, dtype=float)
+    for k, sensitivity in day_sensitivity.items():
+        gradient += weights[k] * np.array([
+            sensitivity["pv_output"] @ pv_unit[0, k], sensitivity["wt_output"] @ wt_unit[0, k],
+            sensitivity["gt_capacity"], sensitivity["ehp_capacity"], sensitivity["ec_capacity"],
+            sensitivity["ac_capacity"], sensitivity["ele_storage_io"], sensitivity["heat_storage_io"],
+            sensitivity["cool_storage_io"]])
+    return gradient
+
+
+def subAimFuncBatch(args):
+    # 将多个个体的全部典型日子问题拼成一个块对角LP一次求解（仅限highs引擎）
+    indices = list(args[0])
+    Vars = np.asarray(args[1], dtype=float)[indices, :9]
+    operation_list = args[2]
+    typical_days = args[3]
+    time_step = TIME_STEP
+    ele_price = ELE_PRICE
+    gas_price = GAS_PRICE
+    template = get_dispatch_template(time_step)
+    medoids, day_data, weights = get_typical_day_arrays(operation_list, typical_days, time_step)
+    pv_outputs, wt_outputs = cal_renewable_profiles(Vars, day_data)
+    problems = []
+    for n in range(Vars.shape[0]):
+        ppv, pwt, pgt, php, pec, pac, pes, phs, pcs = Vars[n]
+        for k in range(len(medoids)):
+            problems.append((ele_price, gas_price, day_data[k, :, 0], day_data[k, :, 1], day_data[k, :, 2],
+                             wt_outputs[n, k], pv_outputs[n, k], pgt, php, pec, pac, pes, phs, pcs))
+    try:
+        with profiling.phase("solve"):
+            lp_results = template.solve_batch(problems)
+    except RuntimeError:
+        # 任一子问题不可行都会使整体不可行，此时逐个个体求解以定位失败的个体
+        return [subAimFunc((i, args[1], operation_list, typical_days), persistent=True, engine='highs')
+                for i in indices]
+    # 日运行成本与各流出力整理为(个体, 典型日[, 时段])数组，整块向量化计算目标
+    with profiling.phase("views"):
+        day_oc = np.array([r.objective for r in lp_results]).reshape(Vars.shape[0], len(medoids))
+        complementary_results = dict()
+        for symbol in lp_results[0].complementary_results():
+            complementary_results[symbol] = np.array(
+                [r.complementary_results()[symbol] for r in lp_results]).reshape(Vars.shape[0], len(medoids), -1)
+    profiling.record_evaluation(Vars.shape[0])
+    with profiling.phase("objective"):
+        economic_obj = cal_economic_obj(Vars, day_oc @ weights)
+        complementary_obj = cal_complementary_obj(complementary_results, weights)
+    ret = []
+    for n in range(Vars.shape[0]):
+        print_objectives(economic_obj[n], complementary_obj[n], Vars[n])
+        ret.append([float(economic_obj[n]), float(complementary_obj[n])])
+    return ret
@@ -5,23 +5,95 @@ Created on Thu Apr 15 15:47:38 2021
 @author: Frank
 """
 
+import os
+import argparse
+import numpy as np
 import geatpy as ea
-from gaproblem import MyProblem
+import profiling
+from checkpoint import moea_NSGA2_checkpoint_templet
+from steadystate import moea_NSGA2_steady_templet
 
 
 # 我是 项目总指挥 。我规定了我们要尝试设计 50 个方案（种群规模），进化 200 代（迭代次数），最后找出最好的设计方案。
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resume', action='store_true', help='从上次保存的检查点继续进化')
+    parser.add_argument('--checkpoint-interval', type=int, default=None, help='每隔多少代保存一次检查点')
+    parser.add_argument('--profile-dir', default=None, help='各阶段计时统计的保存文件夹')
+    cmd_args = parser.parse_args()
     """================================实例化问题对象==========================="""
-    PoolType = 'Process'  # 'Thread'用多线程，'Process'用多进程
-    problem = MyProblem(PoolType)  # 生成问题对象
+    PoolType = 'Process'  # 'Thread'用多线程，'Process'用多进程，'Scheduler'用带超时与工作进程回收的进程调度器，
+    # 'Distributed'用多机任务队列（其他节点运行python distributed.py --address <ServerAddress> --authkey <AuthKey>），
+    # 'Service'连接常驻的本机评价服务（先运行python warmservice.py --address <ServerAddress> --authkey <AuthKey>）
+    ChunkSize = None  # Scheduler：每次分给工作进程的个体数，None为自动
+    TaskTimeout = None  # Scheduler：单个个体评价的超时时间（秒），如600，超时的个体记为求解失败；None表示不限
+    MaxWorkerRss = None  # Scheduler：工作进程常驻内存超过该值（MB）后替换为新进程，如2000；None表示不限
+    MaxWorkerTasks = None  # Scheduler：工作进程完成该数目的评价后替换为新进程；None表示不限
+    NumWorkers = None  # 工作进程/线程数，None为默认；Distributed时为在本机启动的工作进程数
+    ServerAddress = '127.0.0.1:50000'  # Distributed：任务服务器监听地址，多机运行时改为'0.0.0.0:50000'；Service：评价服务地址
+    AuthKey = 'ies_optimization'  # Distributed/Service：连接口令，多机运行时务必修改
+    Persistent = False  # 是否在工作进程中复用已建好的运行模型，如True
+    TypicalDayPath = 'typicalDayData.xlsx'  # 典型日划分，可用clustering.py生成其他典型日数目的划分
+    Engine = 'oemof'  # 运行模型求解引擎：'oemof'用oemof+GLPK，'highs'用稀疏矩阵+HiGHS
+    BatchSize = None  # 每个任务在一个块对角LP中合并求解的个体数（需Engine = 'highs'），None为逐个求解
+    CachePath = None  # 评价结果缓存文件，多次运行间共享，如'evaluationCache.sqlite'；None表示不使用缓存
+    CacheResolution = 1.0  # 缓存键的容量量化分辨率（kW）
+    CheckpointPath = 'Result/checkpoint.npz'  # 检查点文件（种群、代数、随机数状态），评价缓存备份在同名.cache.sqlite中
+    CheckpointInterval = 0  # 每隔多少代保存一次检查点，如5；0表示不保存（--resume时未设置则每5代保存）
+    SurrogateFraction = None  # 代理模型预筛选：每代交给真实评价的子代比例（如0.3），None表示不使用
+    SurrogateRetrain = 5  # 代理模型每隔多少代重新拟合
+    FidelitySizes = None  # 多保真度评价：进化初期使用的代表日数目（如[4]），None表示始终使用全部典型日
+    FidelitySwitch = None  # 各级保真度切换的代数（如[30]），None表示在帕累托前沿稳定后切换
+    EarlyStop = False  # 提前终止：目标下界已被当前非支配解集支配的个体不再求解剩余典型日
+    StorageFreeThreshold = None  # 储能功率均不超过该值（kW）的设计按无储能评价，用无LP的快速调度求解，如0.1；None表示不使用
+    MemeticSize = None  # 模因局部搜索：每代沿LP对偶梯度改进的第一前沿个体数（需Engine = 'highs'），如5；None表示不使用
+    MemeticStep = 0.05  # 模因局部搜索的步长（变量范围的比例）
+    ResultArchive = None  # 逐时调度结果存档目录（见resultarchive.py），如'Result/dispatch'；None表示不保存
+    ParetoPath = None  # 外部非支配存档与每代超体积的保存文件（见paretoarchive.py），如'Result/pareto.npz'；None表示不保存
+    ParetoPatience = None  # 存档超体积连续该代数的相对增长不超过ParetoTolerance时提前结束进化；None表示不提前结束
+    ParetoTolerance = 1e-4
+    SensitivityMethod = None  # 进化结束后在前沿拐点附近做灵敏度分析（sensitivity.py）：'oat'/'morris'/'sobol'；None为不做
+    SensitivitySize = None  # oat每个变量的取值数/morris轨迹数/sobol基本样本数，None为默认
+    SensitivitySpan = 0.1  # 抽样范围：拐点±该比例的变量范围
+    SensitivityPath = 'Result/sensitivity.csv'  # 各变量灵敏度指标的保存文件
+    ProfileDir = None  # 各阶段计时统计（profile.json / profile.csv）的保存文件夹，如'Result'；None表示不保存
+    # 评价模块（gaproblem及operation、sparselp等依赖）的导入耗时，随问题对象的启动耗时一起记录
+    profiling.import_modules(["gaproblem"])
+    from gaproblem import MyProblem
+    problem = MyProblem(PoolType, Persistent, Engine, BatchSize, CachePath, CacheResolution,
+                        surrogate_fraction=SurrogateFraction, surrogate_retrain=SurrogateRetrain,
+                        fidelity_sizes=FidelitySizes, fidelity_switch=FidelitySwitch,
+                        typical_days_path=TypicalDayPath, early_stop=EarlyStop,
+                        storage_threshold=StorageFreeThreshold, chunk_size=ChunkSize, task_timeout=TaskTimeout,
+                        max_worker_rss=MaxWorkerRss, max_worker_tasks=MaxWorkerTasks, num_workers=NumWorkers,
+                        server_address=ServerAddress, authkey=AuthKey,
+                        memetic_size=MemeticSize, memetic_step=MemeticStep, result_archive=ResultArchive,
+                        pareto_path=ParetoPath, pareto_patience=ParetoPatience, pareto_tolerance=ParetoTolerance)  # 生成问题对象
     """==================================种群设置=============================="""
     Encoding = 'RI'  # 编码方式
     NIND = 50  # 种群规模
     Field = ea.crtfld(Encoding, problem.varTypes, problem.ranges, problem.borders)  # 创建区域描述器
     population = ea.Population(Encoding, Field, NIND)  # 实例化种群对象（此时种群还没被初始化，仅仅是完成种群对象的实例化）
     """================================算法参数设置============================="""
-    myAlgorithm = ea.moea_NSGA2_templet(problem, population)  # 实例化一个算法模板对象
+    SteadyState = False  # 异步稳态进化（见steadystate.py）：任一个体评价完成即并入种群并提交新子代，没有代间等待
+    SteadyInFlight = 16  # 稳态进化时同时在评价的子代数，宜取工作进程数的2倍左右；改变它会改变固定Seed时的进化结果
+    SteadyOrdered = True  # 稳态进化时按提交顺序并入评价结果，固定Seed时可复现；False时按完成顺序并入
+    if cmd_args.checkpoint_interval is not None:
+        CheckpointInterval = cmd_args.checkpoint_interval
+    elif cmd_args.resume and not CheckpointInterval:
+        CheckpointInterval = 5  # 继续进化时仍需保存检查点，以便再次中断后恢复
+    if cmd_args.profile_dir is not None:
+        ProfileDir = cmd_args.profile_dir
+    Seed = None  # numpy全局随机数种子（geatpy的初始化、选择、交叉、变异均使用），None表示不固定
+    if Seed is not None:
+        np.random.seed(Seed)
+    if SteadyState:
+        myAlgorithm = moea_NSGA2_steady_templet(problem, population, CheckpointPath, CheckpointInterval,
+                                                cmd_args.resume, SteadyInFlight, SteadyOrdered)
+    else:
+        myAlgorithm = moea_NSGA2_checkpoint_templet(problem, population, CheckpointPath, CheckpointInterval,
+                                                    cmd_args.resume)  # 实例化一个带检查点的算法模板对象
     myAlgorithm.MAXGEN = 200  # 最大进化代数
     myAlgorithm.mutOper.Pm = 0.1  # 变异概率
     myAlgorithm.recOper.XOVR = 0.9  # 交叉概率
@@ -41,5 +113,23 @@ if __name__ == '__main__':
                 print(BestIndi.Phen[0, i])
         else:
             print('没找到可行解。')
+        if SensitivityMethod is not None and len(problem.pareto):
+            # 与进化共用进程池与评价缓存
+            from sensitivity import analyze, select_pareto_point, format_indices, save_indices
+            sensitivity = analyze(problem, select_pareto_point(problem.pareto), SensitivityMethod, SensitivitySize,
+                                  SensitivitySpan)
+            print(format_indices(sensitivity))
+            if SensitivityPath is not None:
+                os.makedirs(os.path.dirname(SensitivityPath) or '.', exist_ok=True)
+                save_indices(sensitivity, SensitivityPath)
     finally:
         problem.kill_pool()
+        print(problem.profile.summary())
+        print('外部非支配存档：%d个设计方案，超体积%g' % (len(problem.pareto), problem.pareto.hypervolume()))
+        if problem.surrogate is not None:
+            print('真实评价：%d次，代理模型预测：%d次' % (problem.surrogate.true_evaluations,
+                                               problem.surrogate.predicted_evaluations))
+        if ProfileDir is not None:
+            os.makedirs(ProfileDir, exist_ok=True)
+            problem.profile.dump_json(os.path.join(ProfileDir, 'profile.json'))
+            problem.profile.dump_csv(os.path.join(ProfileDir, 'profile.csv'))
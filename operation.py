@@ -59,11 +59,8 @@ cs - cool storage
 """
 import logging
 import numpy as np
-import pandas as pd
-import pprint as pp
-import pyomo.environ as po
-import oemof.solph as solph
-import matplotlib.pyplot as plt
+from sparselp import get_dispatch_template
+from profiling import phase, timed
 
 
 class OperationModel:
@@ -71,10 +68,46 @@ class OperationModel:
     def __init__(self, local_time, time_step, ele_price, gas_price,
                  ele_load, heat_demand, cool_demand, wt_output, pv_output,
                  gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
-                 ele_storage_io, heat_storage_io, cool_storage_io):
+                 ele_storage_io, heat_storage_io, cool_storage_io, engine="oemof", initial_storage=None):
+        # 求解引擎：'oemof'（oemof + Pyomo + GLPK）或 'highs'（稀疏矩阵 + HiGHS，见sparselp.py）
+        self.engine = engine
+        # 电/热/冷储能的初始电量，None表示周期平衡（末时段电量等于初始电量），给定时末时段电量不受约束
+        self.initial_storage = initial_storage
+        self.local_time = local_time
+        self.time_step = time_step
+        self.ele_price = ele_price
+        self.gas_price = gas_price
+        self.parameters = (ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                           gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                           ele_storage_io, heat_storage_io, cool_storage_io)
+        if engine == "highs":
+            self.template = get_dispatch_template(time_step)
+            self.lp_result = None
+            self.update_parameters(ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                                   gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                                   ele_storage_io, heat_storage_io, cool_storage_io)
+        elif engine == "oemof":
+            self.build_energy_system(ele_price, gas_price, ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                                     gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                                     ele_storage_io, heat_storage_io, cool_storage_io)
+        else:
+            raise ValueError("Unknown operation engine: %s" % engine)
+
+    # oemof、Pyomo、pandas与matplotlib只在oemof引擎与结果展示中使用，均在用到时才导入，
+    # highs引擎的工作进程不必为它们付出导入时间
+    @property
+    def date_time_index(self):
+        import pandas as pd
+        return pd.date_range(self.local_time, periods=self.time_step, freq="H")
+
+    # 建立oemof能源系统及Pyomo模型
+    @timed("build")
+    def build_energy_system(self, ele_price, gas_price, ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                            gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                            ele_storage_io, heat_storage_io, cool_storage_io):
+        import oemof.solph as solph
         # 初始化能源系统模型
         logging.info("Initialize the energy system")
-        self.date_time_index = pd.date_range(local_time, periods=time_step, freq="H")
         self.energy_system = solph.EnergySystem(timeindex=self.date_time_index)
         ##########################################################################
         # 创建能源系统设备对象
@@ -90,6 +123,14 @@ class OperationModel:
         gas_bus = solph.Bus(label="gas bus")
         # 将母线添加到模型中
         self.energy_system.add(ele_bus, heat_bus, cool_bus, gas_bus)
+        # 储能初始荷电状态（占容量的比例），None时由周期平衡决定
+        storage_capacities = [ele_storage_io*2, heat_storage_io*4/3, cool_storage_io*4/3]
+        if self.initial_storage is None:
+            initial_levels = [None, None, None]
+        else:
+            initial_levels = [min(content / capacity, 1) if capacity > 0 else 0
+                              for content, capacity in zip(self.initial_storage, storage_capacities)]
+        balanced = self.initial_storage is None
         # 添加电负荷
         self.energy_system.add(
             solph.Sink(
@@ -192,7 +233,8 @@ class OperationModel:
             inputs={ele_bus: solph.Flow(nominal_value=ele_storage_io)},
             outputs={ele_bus: solph.Flow(nominal_value=ele_storage_io)},
             loss_rate=0.000125,
-            initial_storage_level=None,
+            initial_storage_level=initial_levels[0],
+            balanced=balanced,
             inflow_conversion_factor=0.95,
             outflow_conversion_factor=0.90
         )
@@ -203,7 +245,8 @@ class OperationModel:
             inputs={heat_bus: solph.Flow(nominal_value=heat_storage_io)},
             outputs={heat_bus: solph.Flow(nominal_value=heat_storage_io)},
             loss_rate=0.001,
-            initial_storage_level=None,
+            initial_storage_level=initial_levels[1],
+            balanced=balanced,
             inflow_conversion_factor=0.9,
             outflow_conversion_factor=0.9,
         )
@@ -214,7 +257,8 @@ class OperationModel:
             inputs={cool_bus: solph.Flow(nominal_value=cool_storage_io)},
             outputs={cool_bus: solph.Flow(nominal_value=cool_storage_io)},
             loss_rate=0.001,
-            initial_storage_level=None,
+            initial_storage_level=initial_levels[2],
+            balanced=balanced,
             inflow_conversion_factor=0.9,
             outflow_conversion_factor=0.9,
         )
@@ -223,7 +267,8 @@ class OperationModel:
                           ele_overflow, heat_overflow, cool_overflow,
                           ele_storage, heat_storage, cool_storage)
         # 初始化模型
-        model = solph.Model(self.energy_system)
+        with phase("model"):
+            model = solph.Model(self.energy_system)
         # # 创建求解计算电网电功率最大值的子模型
         # max_ele_load_block = po.Block()
         # # 将子模型添加到主模型中
@@ -262,20 +307,121 @@ class OperationModel:
         # model.objective = po.Objective(expr=objective_expr)
         self.model = model
 
+    # 更新模型参数（拓扑不变，只修改容量上界与固定出力/负荷），用于持久化复用模型
+    @timed("update")
+    def update_parameters(self, ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                          gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                          ele_storage_io, heat_storage_io, cool_storage_io):
+        self.parameters = (ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                           gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                           ele_storage_io, heat_storage_io, cool_storage_io)
+        if self.engine == "highs":
+            return
+        model = self.model
+        node = self.energy_system.groups
+        ele_bus = node["electricity bus"]
+        heat_bus = node["heat bus"]
+        cool_bus = node["cool bus"]
+        # 固定出力/负荷的流
+        fixed_flows = {
+            (ele_bus, node["electricity demand"]): ele_load,
+            (heat_bus, node["heat demand"]): heat_demand,
+            (cool_bus, node["cool demand"]): cool_demand,
+            (node["wind turbine"], ele_bus): wt_output,
+            (node["photovoltaic"], ele_bus): pv_output,
+        }
+        # 受设备容量约束的流
+        bounded_flows = {
+            (node["gas turbine"], ele_bus): gt_capacity,
+            (node["gas turbine"], heat_bus): gt_capacity * 1.5,
+            (node["absorption chiller"], cool_bus): ac_capacity,
+            (node["electricity heat pump"], heat_bus): ehp_capacity,
+            (node["electricity chiller"], cool_bus): ec_capacity,
+        }
+        # 储能设备：(母线, 储能, 充放功率, 储能容量)
+        storages = [
+            (ele_bus, node["electricity storage"], ele_storage_io, ele_storage_io * 2),
+            (heat_bus, node["heat storage"], heat_storage_io, heat_storage_io * 4 / 3),
+            (cool_bus, node["cool storage"], cool_storage_io, cool_storage_io * 4 / 3),
+        ]
+        for bus, storage, storage_io, storage_capacity in storages:
+            bounded_flows[(bus, storage)] = storage_io
+            bounded_flows[(storage, bus)] = storage_io
+            storage.nominal_storage_capacity = storage_capacity
+        for t in model.TIMESTEPS:
+            for (o, i), values in fixed_flows.items():
+                model.flow[o, i, t].fix(values[t])
+            for (o, i), capacity in bounded_flows.items():
+                model.flow[o, i, t].setub(capacity)
+            for _, storage, _, storage_capacity in storages:
+                model.GenericStorageBlock.storage_content[storage, t].setub(storage_capacity)
+        for _, storage, _, storage_capacity in storages:
+            model.GenericStorageBlock.init_content[storage].setub(storage_capacity)
+
+    # 更新电价、气价（只修改目标函数系数），用于同一设计方案在多个价格情景下的重复求解
+    @timed("update")
+    def update_prices(self, ele_price, gas_price):
+        self.ele_price = ele_price
+        self.gas_price = gas_price
+        if self.engine == "highs":
+            return
+        import pyomo.environ as po
+        model = self.model
+        node = self.energy_system.groups
+        grid_flow = (node["grid"], node["electricity bus"])
+        gas_flow = (node["gas"], node["gas bus"])
+        if not hasattr(model, "ele_price"):
+            # 第一次调用时把电网与天然气流的单价改为可变参数，并据此重建目标函数，之后只需修改参数值
+            model.ele_price = po.Param(model.TIMESTEPS, mutable=True, initialize=0)
+            model.gas_price = po.Param(model.TIMESTEPS, mutable=True, initialize=0)
+            objective_expr = 0
+            for (o, i) in model.FLOWS:
+                for t in model.TIMESTEPS:
+                    if (o, i) == grid_flow:
+                        cost = model.ele_price[t]
+                    elif (o, i) == gas_flow:
+                        cost = model.gas_price[t]
+                    elif model.flows[o, i].variable_costs[0] is not None and model.flows[o, i].variable_costs[t]:
+                        cost = model.flows[o, i].variable_costs[t]
+                    else:
+                        continue
+                    objective_expr += model.flow[o, i, t] * model.objective_weighting[t] * cost
+            model.del_component('objective')
+            model.objective = po.Objective(expr=objective_expr)
+        ele_price = np.broadcast_to(np.asarray(ele_price, dtype=float), (self.time_step,))
+        gas_price = np.broadcast_to(np.asarray(gas_price, dtype=float), (self.time_step,))
+        for t in model.TIMESTEPS:
+            model.ele_price[t] = ele_price[t]
+            model.gas_price[t] = gas_price[t]
+
     # 模型优化与储存
     def optimise(self):
+        if self.engine == "highs":
+            with phase("solve"):
+                self.lp_result = self.template.solve(self.ele_price, self.gas_price, *self.parameters,
+                                                     initial_storage=self.initial_storage)
+            return
+        import oemof.solph as solph
         solver = "glpk"  # 选择求解器
         solver_verbose = False  # 是否输出求解器信息
-        self.model.solve(solver=solver, solve_kwargs={"tee": solver_verbose})
-        self.energy_system.results["main"] = solph.processing.results(self.model)
-        self.energy_system.results["meta"] = solph.processing.meta_results(self.model)
+        with phase("solve"):
+            self.model.solve(solver=solver, solve_kwargs={"tee": solver_verbose})
+        with phase("results"):
+            self.energy_system.results["main"] = solph.processing.results(self.model)
+            self.energy_system.results["meta"] = solph.processing.meta_results(self.model)
 
     # 返回优化结果
     def get_objective_value(self):
+        if self.engine == "highs":
+            return self.lp_result.objective
         return self.energy_system.results["meta"]["objective"]
 
     # 返回设备出力数据
+    @timed("views")
     def get_complementary_results(self):
+        if self.engine == "highs":
+            return self.lp_result.complementary_results()
+        import oemof.solph as solph
         complementary_results = dict()
         results = self.energy_system.results["main"]
         symbols = ["grid", "electricity overflow", "heat source",
@@ -289,6 +435,34 @@ class OperationModel:
             complementary_results[symbol] = flow_list
         return complementary_results
 
+    # 返回运行成本对各参数的偏导数（影子价格）：
+    # {"gt_capacity", "ehp_capacity", "ec_capacity", "ac_capacity", "ele_storage_io", "heat_storage_io",
+    #  "cool_storage_io": 标量, "wt_output", "pv_output": 逐时数组}
+    # 只有highs引擎给出：oemof 0.4经Pyomo调用GLPK时不回传变量上界的对偶值，用HiGHS重新求解整天又会使求解耗时加倍
+    def get_capacity_sensitivity(self):
+        if self.engine != "highs":
+            raise ValueError("capacity sensitivities require the 'highs' engine")
+        return self.lp_result.sensitivity
+
+    # 返回全部流的逐时出力，键为(起点标签, 终点标签)
+    def get_flow_sequences(self):
+        if self.engine == "highs":
+            return {flow: np.asarray(values) for flow, values in self.lp_result.flows.items()}
+        flows = dict()
+        for (o, i), result in self.energy_system.results["main"].items():
+            if i is not None:
+                flows[(o.label, i.label)] = np.array(result["sequences"]["flow"])
+        return flows
+
+    # 返回电/热/冷储能的逐时电量
+    def get_storage_content(self):
+        labels = ["electricity storage", "heat storage", "cool storage"]
+        if self.engine == "highs":
+            return [np.asarray(self.lp_result.storage_content[label]) for label in labels]
+        results = self.energy_system.results["main"]
+        node = self.energy_system.groups
+        return [np.array(results[(node[label], None)]["sequences"]["storage_content"]) for label in labels]
+
     # 备份结果
     def dump_result(self):
         # 保存结果
@@ -297,9 +471,16 @@ class OperationModel:
 
     # 结果展示
     def result_process(self, bus_name):
-        results = self.energy_system.results["main"]
+        import pprint as pp
+        import oemof.solph as solph
+        import matplotlib.pyplot as plt
         # 获取需要展示的节点
-        show_bus = solph.views.node(results, bus_name)
+        if self.engine == "highs":
+            show_bus = {"sequences": self.lp_result.bus_sequences(bus_name, self.date_time_index)}
+            meta_results = {"objective": self.lp_result.objective}
+        else:
+            show_bus = solph.views.node(self.energy_system.results["main"], bus_name)
+            meta_results = self.energy_system.results["meta"]
         # 绘制母线输入输出图像
         ele_flows = show_bus["sequences"].columns
         bottom1 = [0] * len(self.date_time_index)
@@ -326,7 +507,7 @@ class OperationModel:
         plt.show()
         # 输出求解结果
         print("********* Meta results *********")
-        pp.pprint(self.energy_system.results["meta"])
+        pp.pprint(meta_results)
         print("")
         # 输出各个母线的输入输出总量
         print("********* Main results *********")
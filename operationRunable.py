@@ -1,6 +1,7 @@
-import pandas as pd
+import argparse
 import numpy as np
 from operation import OperationModel
+from dataloader import load_operation_data, load_typical_days
 
 
 def cal_solar_output(solar_radiation_list, temperature_list, ppv):
@@ -18,15 +19,11 @@ def cal_wind_output(wind_speed_list, pwt):
     return ret
 
 
-operation_data = pd.read_csv('mergedData.csv')
-operation_list = np.array(operation_data).tolist()
-typical_days = dict()
-typical_data = pd.read_excel('typicalDayData.xlsx')
-typical_day_id = typical_data["typicalDayId"]
-days_str = typical_data["days"]
-for i in range(len(typical_day_id)):
-    days_list = list(map(int, days_str[i].split(",")))
-    typical_days[typical_day_id[i]] = days_list
+parser = argparse.ArgumentParser(description="单个设计方案的典型日运行优化")
+parser.add_argument("--service", default=None, help="常驻评价服务（warmservice.py）的地址，给定时只由服务计算目标函数值")
+parser.add_argument("--authkey", default="ies_optimization")
+parser.add_argument("--engine", default="highs", help="服务使用的运行优化引擎：highs或oemof")
+args = parser.parse_args()
 
 ppv = 1710.86   # 光伏额定功率
 pwt = 1648.98   # 风电额定功率
@@ -37,6 +34,14 @@ pac = 305.72    # 吸收式制冷额定功率
 pes = 0.04      # 电储能额定功率
 phs = 2351.50   # 热储能额定功率
 pcs = 400.82    # 冷储能额定功率
+if args.service is not None:
+    from warmservice import evaluate_remote
+    economic_obj, complementary_obj = evaluate_remote([ppv, pwt, pgt, php, pec, pac, pes, phs, pcs],
+                                                      args.service, args.authkey, args.engine)
+    print("[economic:%f] [complementary:%f]" % (economic_obj, complementary_obj))
+    raise SystemExit
+operation_list = load_operation_data('mergedData.csv')
+typical_days = load_typical_days('typicalDayData.xlsx')
 net_ele_load = [0 for _ in range(8760)]  # 电净负荷
 net_heat_load = [0 for _ in range(8760)]  # 热净负荷
 net_cool_load = [0 for _ in range(8760)]  # 冷净负荷
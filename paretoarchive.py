@@ -0,0 +1,128 @@
+"""
+全部已评价设计方案的外部非支配存档
+-------------------
+NSGA-II每代只保留NIND个个体，早期找到、后来因拥挤距离被淘汰的非支配设计会丢失。MyProblem把每次真实评价的
+(容量向量, 目标函数值)插入本存档：
+- 两个目标均为最小化，非支配前沿按经济目标升序保存，此时源荷匹配目标严格降序；插入时二分查找位置，
+  只需与前一个点比较是否被支配，并删除其后被新点支配的连续若干点，不需要对全部点重新非支配排序；
+- 每代结束时计算前沿的超体积（二维按经济目标顺序一次扫描），参考点未给定时取第一代全部评价结果的最差值
+  再向外放大10%，此后固定不变，各代的超体积可以直接比较；
+- patience不为None时，连续patience代超体积的相对增长不超过tolerance即认为前沿已不再改进，进化提前结束；
+- path不为None时每代把前沿与超体积历史写入.npz文件（先写临时文件再替换）。
+"""
+import bisect
+import numpy as np
+from dataloader import atomic_save
+
+
+class ParetoArchive:
+    def __init__(self, path=None, reference=None, patience=None, tolerance=1e-4):
+        self.path = path
+        self.reference = None if reference is None else np.asarray(reference, dtype=float)
+        self.patience = patience
+        self.tolerance = tolerance
+        self.economic = []  # 升序
+        self.complementary = []  # 严格降序
+        self.designs = []
+        self.worst = None  # 尚未确定参考点时，已插入的全部评价结果的各目标最大值
+        self.best = None
+        self.history = []  # [(代数, 前沿点数, 超体积)]
+        self.insertions = 0  # 进入过前沿的次数
+
+    def __len__(self):
+        return len(self.economic)
+
+    @property
+    def ObjV(self):
+        return np.column_stack([self.economic, self.complementary]) if self.economic else np.zeros((0, 2))
+
+    @property
+    def Phen(self):
+        return np.array(self.designs) if self.designs else np.zeros((0, 9))
+
+    def insert(self, x, objv):
+        # 插入一个评价结果，返回其是否进入前沿；与前沿中某点目标值相同时视为被支配
+        f1, f2 = float(objv[0]), float(objv[1])
+        if not (np.isfinite(f1) and np.isfinite(f2)):
+            return False
+        if self.reference is None:
+            self.worst = np.maximum(self.worst, (f1, f2)) if self.worst is not None else np.array([f1, f2])
+            self.best = np.minimum(self.best, (f1, f2)) if self.best is not None else np.array([f1, f2])
+        # 经济目标不大于f1的点中最后一个的源荷匹配目标最小，只需检查它是否支配新点
+        k = bisect.bisect_right(self.economic, f1)
+        if k > 0 and self.complementary[k - 1] <= f2:
+            return False
+        # 经济目标不小于f1且源荷匹配目标不小于f2的点被新点支配，它们在前沿中连续排列
+        start = end = bisect.bisect_left(self.economic, f1)
+        while end < len(self.economic) and self.complementary[end] >= f2:
+            end += 1
+        self.economic[start:end] = [f1]
+        self.complementary[start:end] = [f2]
+        self.designs[start:end] = [np.array(x, dtype=float)]
+        self.insertions += 1
+        return True
+
+    def insert_many(self, Vars, ObjV):
+        return sum(self.insert(x, objv) for x, objv in zip(Vars, ObjV))
+
+    def hypervolume(self, reference=None):
+        reference = self.reference if reference is None else np.asarray(reference, dtype=float)
+        if reference is None or not self.economic:
+            return 0.0
+        f1 = np.array(self.economic)
+        f2 = np.array(self.complementary)
+        inside = (f1 < reference[0]) & (f2 < reference[1])
+        f1, f2 = f1[inside], f2[inside]
+        if len(f1) == 0:
+            return 0.0
+        # 每个点与下一个点（或参考点）之间的矩形条
+        widths = np.append(f1[1:], reference[0]) - f1
+        return float(np.sum(widths * (reference[1] - f2)))
+
+    def end_generation(self, generation):
+        # 记录本代结束时的前沿规模与超体积，并写入文件
+        if self.reference is None and self.worst is not None:
+            self.reference = self.worst + 0.1 * np.maximum(self.worst - self.best, np.abs(self.worst) * 1e-6)
+        self.history.append((generation, len(self), self.hypervolume()))
+        if self.path is not None:
+            self.save(self.path)
+        return self.history[-1][2]
+
+    def is_stagnant(self):
+        # 最近patience代超体积的相对增长不超过tolerance
+        if self.patience is None or len(self.history) <= self.patience:
+            return False
+        previous = self.history[-1 - self.patience][2]
+        return self.history[-1][2] - previous <= self.tolerance * abs(previous)
+
+    def get_state(self):
+        return {'pareto_Phen': self.Phen, 'pareto_ObjV': self.ObjV,
+                'pareto_history': np.array(self.history, dtype=float).reshape(-1, 3),
+                'pareto_reference': self.reference if self.reference is not None else np.full(2, np.nan),
+                'pareto_bounds': np.array([self.worst if self.worst is not None else np.full(2, np.nan),
+                                           self.best if self.best is not None else np.full(2, np.nan)]),
+                'pareto_insertions': np.array(self.insertions)}
+
+    def set_state(self, state):
+        ObjV = np.asarray(state['pareto_ObjV'], dtype=float)
+        self.economic = ObjV[:, 0].tolist()
+        self.complementary = ObjV[:, 1].tolist()
+        self.designs = [np.array(x, dtype=float) for x in state['pareto_Phen']]
+        self.history = [(int(g), int(n), float(hv)) for g, n, hv in state['pareto_history']]
+        reference = np.asarray(state['pareto_reference'], dtype=float)
+        self.reference = None if np.isnan(reference).any() else reference
+        worst, best = np.asarray(state['pareto_bounds'], dtype=float)
+        self.worst = None if np.isnan(worst).any() else worst
+        self.best = None if np.isnan(best).any() else best
+        self.insertions = int(state['pareto_insertions'])
+
+    def save(self, path):
+        state = self.get_state()
+        atomic_save(path, lambda tmp_path: np.savez(tmp_path, **state))
+
+    @classmethod
+    def load(cls, path):
+        archive = cls(path)
+        with np.load(path) as state:
+            archive.set_state(state)
+        return archive
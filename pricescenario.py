@@ -0,0 +1,209 @@
+"""
+电价、气价情景批量评价
+-------------------
+对给定的设计方案，在一组电价、气价情景（分时电价、实时电价序列、气价冲击等）下求解全部典型日的调度，给出运行成本、
+经济目标与源荷匹配目标的分布：
+- 价格只出现在目标函数中，每个工作进程为每个典型日只建立一次运行模型，各情景之间只修改目标函数系数
+  （OperationModel.update_prices），不重建oemof能源系统与Pyomo模型；
+- 情景按chunk_size分块并行求解；无储能设计（储能功率均不超过storage_threshold，按储能功率为0评价）
+  由fastdispatch.py对一块情景一次性向量化求解；
+- 价格的形状：标量（所有情景相同）、(情景,)（每个情景一个不随时间变化的价格）、(情景, 24)（每天相同的逐时价格）
+  或(情景, 8760)（全年逐时价格，各典型日取其中心日当天的价格）。
+用法：
+    python pricescenario.py --scenarios prices.npz --engine highs --workers 8 --output Result/priceScenarios.csv
+其中prices.npz包含ele_price与gas_price两个数组。
+"""
+import csv
+import argparse
+import numpy as np
+from multiprocessing import Pool as ProcessPool
+from operation import OperationModel
+from sparselp import COMPLEMENTARY_FLOWS
+from fastdispatch import dispatch_storage_free, is_storage_free, clamp_storage
+from dataloader import load_operation_data, load_typical_days
+from gaproblem import (cal_renewable_profiles, cal_economic_obj, cal_complementary_obj, get_typical_day_arrays,
+                       TIME_STEP)
+
+# 工作进程内的设计方案、典型日数据与各典型日的运行模型，由初始化函数设置一次
+_scenario_data = dict()
+
+
+def time_of_use_profile(peak, flat, valley, peak_hours=(8, 9, 10, 18, 19, 20), valley_hours=(23, 0, 1, 2, 3, 4, 5, 6)):
+    # 24小时分时电价，峰、谷时段以外为平段
+    profile = np.full(TIME_STEP, float(flat))
+    profile[list(peak_hours)] = peak
+    profile[list(valley_hours)] = valley
+    return profile
+
+
+def count_scenarios(*prices):
+    # 情景数由第一维确定，各价格数组的情景数须一致；全部为标量时只有一个情景
+    sizes = {np.shape(p)[0] for p in prices if np.ndim(p) > 0}
+    if len(sizes) > 1:
+        raise ValueError("price arrays have different numbers of scenarios: %s" % sorted(sizes))
+    return sizes.pop() if sizes else 1
+
+
+def get_day_prices(prices, n_scenarios, medoids, time_step=TIME_STEP):
+    # 各情景在各典型日的逐时价格，形状为(情景, 典型日, 时段)
+    prices = np.asarray(prices, dtype=float)
+    shape = (n_scenarios, len(medoids), time_step)
+    if prices.ndim == 0:
+        return np.broadcast_to(prices, shape)
+    if prices.ndim == 1:
+        return np.broadcast_to(prices[:, None, None], shape)
+    if prices.ndim == 2 and prices.shape[1] == time_step:
+        return np.broadcast_to(prices[:, None, :], shape)
+    if prices.ndim == 2 and prices.shape[1] >= max(medoids) * 24:
+        starts = (np.array(medoids, dtype=int) - 1) * 24
+        return prices[:, starts[:, None] + np.arange(time_step)]
+    raise ValueError("price array of shape %s must be a scalar, (scenarios,), (scenarios, %d) or (scenarios, 8760)"
+                     % (prices.shape, time_step))
+
+
+def init_scenario_worker(capacities, operation_array, typical_days, engine, storage_threshold=None):
+    # 进程池初始化函数，逐时数据为None时从二进制缓存内存映射
+    if operation_array is None:
+        operation_array = load_operation_data('mergedData.csv')
+    medoids, day_data, weights = get_typical_day_arrays(operation_array, typical_days)
+    pv_outputs, wt_outputs = cal_renewable_profiles(np.array([capacities]), day_data)
+    _scenario_data.update(capacities=list(capacities), day_data=day_data, weights=weights,
+                          pv_outputs=pv_outputs[0], wt_outputs=wt_outputs[0], engine=engine,
+                          storage_threshold=storage_threshold, models=dict())
+
+
+def get_scenario_model(k, ele_price, gas_price):
+    # 每个典型日的模型在本进程中只建立一次，之后只更新价格
+    data = _scenario_data
+    operation_model = data["models"].get(k)
+    if operation_model is None:
+        ppv, pwt, pgt, php, pec, pac, pes, phs, pcs = data["capacities"]
+        day_data = data["day_data"]
+        operation_model = OperationModel('01/01/2019', TIME_STEP, ele_price.tolist(), gas_price.tolist(),
+                                         day_data[k, :, 0], day_data[k, :, 1], day_data[k, :, 2],
+                                         data["wt_outputs"][k], data["pv_outputs"][k],
+                                         pgt, php, pec, pac, pes, phs, pcs, data["engine"])
+        data["models"][k] = operation_model
+    else:
+        operation_model.update_prices(ele_price.tolist(), gas_price.tolist())
+    return operation_model
+
+
+def solve_scenarios(task):
+    # 求解一块情景，task为该块的逐时电价、气价，形状为(情景, 典型日, 时段)；返回各情景各典型日的运行成本与外部能源/多余出口出力
+    ele_prices, gas_prices = task
+    data = _scenario_data
+    day_data = data["day_data"]
+    n_scenarios, n_days, time_step = ele_prices.shape
+    day_cost = np.full((n_scenarios, n_days), np.nan)
+    # 求解失败的典型日各符号的出力为nan，全部求解失败的块也有完整的键，可与其他块拼接
+    results = {symbol: np.full((n_scenarios, n_days, time_step), np.nan) for symbol in COMPLEMENTARY_FLOWS}
+    solved = np.zeros((n_scenarios, n_days), dtype=bool)
+    ppv, pwt, pgt, php, pec, pac, pes, phs, pcs = data["capacities"]
+    if data["storage_threshold"] is not None and is_storage_free(pes, phs, pcs, data["storage_threshold"]):
+        shape = (n_scenarios, n_days, time_step)
+        fast_cost, fast_results, valid, _ = dispatch_storage_free(
+            ele_prices, gas_prices, np.broadcast_to(day_data[:, :, 0], shape), day_data[:, :, 1], day_data[:, :, 2],
+            np.broadcast_to(data["wt_outputs"], shape), np.broadcast_to(data["pv_outputs"], shape), pgt, php, pec, pac)
+        day_cost[valid] = fast_cost[valid]
+        for symbol, flow in fast_results.items():
+            results[symbol] = np.where(valid[..., None], flow, np.nan)
+        solved = valid
+    for s in range(n_scenarios):
+        for k in range(n_days):
+            if solved[s, k]:
+                continue
+            try:
+                operation_model = get_scenario_model(k, ele_prices[s, k], gas_prices[s, k])
+                operation_model.optimise()
+                day_cost[s, k] = operation_model.get_objective_value()
+                for symbol, flow in operation_model.get_complementary_results().items():
+                    results[symbol][s, k] = flow
+            except Exception as e:
+                # 求解失败后模型状态不可信，丢弃以便下次重建；该情景的成本记为nan
+                data["models"].pop(k, None)
+                print("[solve failed] scenario %d, typical day %d: %s: %s" % (s, k, type(e).__name__, e))
+    return day_cost, results
+
+
+def evaluate_price_scenarios(capacities, ele_prices, gas_prices, engine='highs', num_workers=None,
+                             typical_days_path='typicalDayData.xlsx', storage_threshold=None, chunk_size=None):
+    """
+    返回各情景的年运行成本operating_cost、经济目标economic、源荷匹配目标complementary（形状为(情景,)）
+    及各典型日的运行成本day_cost（形状为(情景, 典型日)）；有典型日求解失败的情景各项为nan。
+    """
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days(typical_days_path)
+    medoids, _, weights = get_typical_day_arrays(operation_list, typical_days)
+    capacities = [float(c) for c in capacities]
+    if storage_threshold is not None:
+        # 储能功率均不超过阈值的设计按无储能处理，调度与投资成本都按储能功率为0计算
+        capacities = clamp_storage(capacities, storage_threshold).tolist()
+    n_scenarios = count_scenarios(ele_prices, gas_prices)
+    ele_day_prices = get_day_prices(ele_prices, n_scenarios, medoids)
+    gas_day_prices = get_day_prices(gas_prices, n_scenarios, medoids)
+    processes = num_workers if num_workers is not None and num_workers > 1 else 1
+    chunk_size = chunk_size or max(1, min(32, -(-n_scenarios // (4 * processes))))
+    tasks = [(np.array(ele_day_prices[s:s + chunk_size]), np.array(gas_day_prices[s:s + chunk_size]))
+             for s in range(0, n_scenarios, chunk_size)]
+    if processes == 1:
+        init_scenario_worker(capacities, operation_list, typical_days, engine, storage_threshold)
+        chunks = [solve_scenarios(task) for task in tasks]
+    else:
+        # 逐时数据由各工作进程自行内存映射，不经进程间传输
+        with ProcessPool(processes, initializer=init_scenario_worker,
+                         initargs=(capacities, None, typical_days, engine, storage_threshold)) as pool:
+            chunks = pool.map(solve_scenarios, tasks)
+    day_cost = np.concatenate([c for c, _ in chunks])
+    complementary_results = {symbol: np.concatenate([r[symbol] for _, r in chunks]) for symbol in chunks[0][1]}
+    operating_cost = day_cost @ weights
+    return {
+        "operating_cost": operating_cost,
+        "economic": cal_economic_obj(capacities, operating_cost),
+        "complementary": cal_complementary_obj(complementary_results, weights),
+        "day_cost": day_cost,
+    }
+
+
+# 经济目标分布的统计量：均值、标准差、分位数及最差5%情景的平均值（CVaR）
+def summarize_distribution(values, alpha=0.95):
+    values = np.sort(np.asarray(values, dtype=float)[np.isfinite(values)])
+    if len(values) == 0:
+        return dict()
+    tail = values[int(np.floor(alpha * len(values))):]
+    return {
+        "scenarios": len(values),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values[0]),
+        "p5": float(np.percentile(values, 5)),
+        "p50": float(np.percentile(values, 50)),
+        "p95": float(np.percentile(values, 95)),
+        "max": float(values[-1]),
+        "cvar": float(tail.mean()) if len(tail) else float(values[-1]),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="设计方案在多个电价、气价情景下的运行成本分布")
+    parser.add_argument("--capacities", default="1710.86,1648.98,2217.91,2.79,5.17,305.72,0.04,2351.50,400.82",
+                        help="逗号分隔的9个设备容量：ppv,pwt,pgt,php,pec,pac,pes,phs,pcs")
+    parser.add_argument("--scenarios", required=True, help="包含ele_price与gas_price数组的.npz文件")
+    parser.add_argument("--engine", default="highs", choices=["oemof", "highs"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--storage-threshold", type=float, default=None)
+    parser.add_argument("--output", default=None, help="逐情景结果的csv文件")
+    args = parser.parse_args()
+    with np.load(args.scenarios) as scenarios:
+        ele_prices, gas_prices = scenarios["ele_price"], scenarios["gas_price"]
+    result = evaluate_price_scenarios([float(c) for c in args.capacities.split(",")], ele_prices, gas_prices,
+                                      args.engine, args.workers, storage_threshold=args.storage_threshold,
+                                      chunk_size=args.chunk_size)
+    print(" ".join("[%s:%g]" % item for item in summarize_distribution(result["economic"]).items()))
+    if args.output is not None:
+        with open(args.output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["scenario", "operating_cost", "economic", "complementary"])
+            for s in range(len(result["economic"])):
+                writer.writerow([s, result["operating_cost"][s], result["economic"][s], result["complementary"][s]])
@@ -0,0 +1,227 @@
+"""
+评价流程计时与统计
+-------------------
+一次评价的时间分布在以下各阶段：
+- build：oemof能源系统（节点与流）的建立；
+- model：solph.Model创建Pyomo模型；
+- update：持久化模型的参数更新；
+- solve：求解（oemof引擎中包括Pyomo写LP文件、调用GLPK及读回解）；
+- results：solph.processing.results / meta_results 结果整理；
+- views：get_complementary_results中的solph.views.node（highs引擎为从解向量中取出各流）；
+- dispatch：无储能设计的快速调度（fastdispatch.py），不经过上面的LP各阶段；
+- archive：逐时调度结果的整理与写入存档（resultarchive.py）；
+- objective：上层目标函数计算。
+各阶段在每个工作线程内独立计时，嵌套阶段只计入最内层（例如build中不含model的时间）。
+任务结束时用collect()取出并清零本线程的统计随结果一起返回，由主进程中的ProfileRecorder按代、按工作进程汇总。
+求解失败的次数与异常信息同样记录在统计中；PoolType = 'Scheduler'/'Distributed'/'Service'时每代另外记录调度器的超时、慢任务、工作进程回收与任务重新排队统计。
+进程启动阶段的耗时（模块导入、常驻服务工作进程的预热、工作进程初始化、主进程中问题对象的创建）由record_startup按进程记录，
+随该进程的第一个任务结果交回，在summary()与profile.json中单独列出。
+"""
+import os
+import csv
+import json
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+PHASES = ["build", "model", "update", "solve", "results", "views", "dispatch", "archive", "objective"]
+# 每代调度器统计在csv中的列
+SCHEDULER_COLUMNS = ["timeouts", "errors", "crashed", "recycled", "stragglers", "median_task_time", "max_task_time",
+                     "tail_idle_time", "requeued", "lost_workers", "workers"]
+
+# 每个线程独立的统计与阶段栈
+_local = threading.local()
+# 进程启动阶段的耗时[(进程号, 名称, 秒)]，fork出的子进程按进程号过滤，不会把父进程的记录当作自己的
+_startup = []
+_startup_lock = threading.Lock()
+
+
+def new_stats():
+    return {"time": dict(), "count": dict(), "evaluations": 0, "failures": 0, "errors": dict()}
+
+
+def get_stats():
+    stats = getattr(_local, "stats", None)
+    if stats is None:
+        stats = _local.stats = new_stats()
+        _local.stack = []
+    return stats
+
+
+@contextmanager
+def phase(name):
+    # 计时一个阶段，嵌套的子阶段时间从父阶段中扣除
+    stats = get_stats()
+    frame = [0.0]  # 子阶段累计时间
+    _local.stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _local.stack.pop()
+        if _local.stack:
+            _local.stack[-1][0] += elapsed
+        stats["time"][name] = stats["time"].get(name, 0.0) + elapsed - frame[0]
+        stats["count"][name] = stats["count"].get(name, 0) + 1
+
+
+def timed(name):
+    # 装饰器形式的phase
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_evaluation(n=1):
+    get_stats()["evaluations"] += n
+
+
+# 计数器，如提前终止的个体数
+def record_count(name, n=1):
+    stats = get_stats()
+    stats["count"][name] = stats["count"].get(name, 0) + n
+
+
+def record_failure(message):
+    stats = get_stats()
+    stats["failures"] += 1
+    stats["errors"][message] = stats["errors"].get(message, 0) + 1
+
+
+def record_startup(name, seconds):
+    with _startup_lock:
+        _startup.append((os.getpid(), name, seconds))
+
+
+def pop_startup():
+    # 取出并清零本进程的启动耗时，同名的累加
+    pid = os.getpid()
+    with _startup_lock:
+        records = [(name, seconds) for p, name, seconds in _startup if p == pid]
+        del _startup[:]
+    startup = dict()
+    for name, seconds in records:
+        startup[name] = startup.get(name, 0.0) + seconds
+    return startup
+
+
+def import_modules(names):
+    # 依次导入并记录各模块的导入耗时；前面的模块已导入的依赖不重复计入，已导入的模块耗时近似为0
+    for name in names:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        record_startup("import " + name, time.perf_counter() - start)
+
+
+def collect():
+    # 取出并清零本线程的统计，附上工作进程/线程标识；本进程有尚未交回的启动耗时时一并附上
+    stats = get_stats()
+    _local.stats = new_stats()
+    stats["worker"] = "%d/%s" % (os.getpid(), threading.current_thread().name)
+    startup = pop_startup()
+    if startup:
+        stats["startup"] = startup
+    return stats
+
+
+def merge_stats(target, stats):
+    for key in ["time", "count", "errors"]:
+        for name, value in stats[key].items():
+            target[key][name] = target[key].get(name, 0) + value
+    target["evaluations"] += stats["evaluations"]
+    target["failures"] += stats["failures"]
+    return target
+
+
+class ProfileRecorder:
+    # 主进程中的汇总：每次种群评价（一代）一条记录，以及各工作进程的累计值
+    def __init__(self):
+        self.generations = []
+        self.workers = dict()
+        self.total = new_stats()
+        self.startup = {"main": dict(), "service": dict(), "workers": dict()}  # 主进程、常驻服务进程与各工作进程的启动耗时
+
+    def add_startup(self, worker, startup):
+        if worker in ("main", "service"):
+            target = self.startup[worker]
+        else:
+            target = self.startup["workers"].setdefault(worker, dict())
+        for name, seconds in startup.items():
+            target[name] = target.get(name, 0.0) + seconds
+
+    def add_generation(self, worker_stats, wall_time, population_size, cache_hits=0, scheduler=None):
+        generation = new_stats()
+        for stats in worker_stats:
+            if "startup" in stats:
+                self.add_startup(stats["worker"], stats["startup"])
+            merge_stats(generation, stats)
+            merge_stats(self.workers.setdefault(stats["worker"], new_stats()), stats)
+        merge_stats(self.total, generation)
+        generation["generation"] = len(self.generations)
+        generation["wall_time"] = wall_time
+        generation["population"] = population_size
+        generation["cache_hits"] = cache_hits
+        # 调度器（scheduler.py / distributed.py）的超时、慢任务、工作进程回收与重新排队统计
+        if scheduler is not None:
+            generation["scheduler"] = scheduler
+            total = self.total.setdefault("scheduler", dict())
+            for name, value in scheduler.items():
+                if name == "max_task_time":
+                    total[name] = max(total.get(name, 0), value)
+                elif name == "workers":
+                    total[name] = value
+                elif name != "median_task_time":
+                    total[name] = total.get(name, 0) + value
+        self.generations.append(generation)
+        return generation
+
+    def summary(self):
+        lines = ["[evaluations:%d] [failures:%d]" % (self.total["evaluations"], self.total["failures"])]
+        busy = sum(self.total["time"].values())
+        for name in PHASES:
+            if name in self.total["time"]:
+                lines.append("  %-10s %10.3fs %6.1f%% %8d calls" % (name, self.total["time"][name],
+                                                                     100 * self.total["time"][name] / max(busy, 1e-12),
+                                                                     self.total["count"][name]))
+        for name, count in self.total["count"].items():
+            if name not in PHASES:
+                lines.append("  %-10s %8d" % (name, count))
+        if "scheduler" in self.total:
+            lines.append("  scheduler  " + " ".join("[%s:%g]" % item for item in self.total["scheduler"].items()))
+        for message, count in self.total["errors"].items():
+            lines.append("  [failed x%d] %s" % (count, message))
+        for name in ("main", "service"):
+            if self.startup[name]:
+                lines.append("  startup    %s " % name
+                             + " ".join("[%s:%.3fs]" % item for item in self.startup[name].items()))
+        # 各工作进程的同名启动阶段给出均值与最大值
+        workers = self.startup["workers"].values()
+        for name in sorted({name for startup in workers for name in startup}):
+            values = [startup[name] for startup in workers if name in startup]
+            lines.append("  startup    workers [%s] mean %.3fs max %.3fs (%d workers)"
+                         % (name, sum(values) / len(values), max(values), len(values)))
+        return "\n".join(lines)
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"total": self.total, "generations": self.generations, "workers": self.workers,
+                       "startup": self.startup}, f, indent=2, ensure_ascii=False)
+
+    def dump_csv(self, path):
+        # 每代一行，各阶段耗时为列
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["generation", "population", "cache_hits", "evaluations", "failures", "wall_time"]
+                            + ["%s_time" % name for name in PHASES] + SCHEDULER_COLUMNS)
+            for g in self.generations:
+                scheduler = g.get("scheduler", dict())
+                writer.writerow([g["generation"], g["population"], g["cache_hits"], g["evaluations"],
+                                 g["failures"], g["wall_time"]] + [g["time"].get(name, 0.0) for name in PHASES]
+                                + [scheduler.get(name, "") for name in SCHEDULER_COLUMNS])
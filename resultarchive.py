@@ -0,0 +1,181 @@
+"""
+逐时调度结果存档
+-------------------
+评价时可选地把每个设计方案在各典型日的全部逐时结果追加写入一个目录，事后分析时内存映射读取，不必重新求解：
+- 每条记录为一个（设计方案, 典型日）的全部流（sparselp.FLOWS + FIXED_FLOWS，标签为"起点|终点"）与
+  电/热/冷储能电量（"储能|storage_content"），形状为(序列数, 时段)；
+- 每个工作进程只追加写自己的一对文件：data_<主机>_<进程号>.bin（记录按行连续存放）与
+  index_<主机>_<进程号>.bin（每条记录的容量向量、典型日中心日、代表天数与行号），不需要进程间加锁；
+  每次评价写完数据后再写索引，读取时只使用索引完整的记录，进程中断不会留下不一致的记录；
+- meta.json记录序列标签、时段数与数据类型；
+- 命中评价结果缓存的个体不会重新求解，其记录只在第一次求解时写入；提前终止的个体与求解失败的个体不写入。
+分布式评价时各节点的工作进程写入本节点上的同名目录，分析前需把各节点的文件复制到同一目录。
+用法：
+    python resultarchive.py Result/dispatch                       # 汇总
+    python resultarchive.py Result/dispatch --design 0 --output design0.csv   # 导出第0个设计方案的逐时结果
+"""
+import os
+import csv
+import json
+import glob
+import socket
+import argparse
+import threading
+import numpy as np
+from sparselp import FLOWS, FIXED_FLOWS, STORAGES
+from dataloader import atomic_save_json
+
+LABELS = ["%s|%s" % flow for flow in FLOWS + FIXED_FLOWS] + ["%s|storage_content" % s[0] for s in STORAGES]
+INDEX_DTYPE = np.dtype([("capacities", "f8", (9,)), ("medoid", "i4"), ("weight", "f8"), ("row", "i8")])
+
+# 每个工作进程对每个存档目录只打开一个写入对象；按进程号区分，fork出的子进程不会沿用父进程的文件
+_writers = dict()
+_writers_lock = threading.Lock()
+
+
+def write_meta(directory, time_step, dtype):
+    path = os.path.join(directory, "meta.json")
+    meta = {"labels": LABELS, "time_step": time_step, "dtype": np.dtype(dtype).str}
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f)
+        if existing != meta:
+            raise ValueError("result archive %s was written with a different layout" % directory)
+        return
+    atomic_save_json(path, meta, indent=2, ensure_ascii=False)
+
+
+def day_record(flows, storage_content, time_step):
+    # 一个典型日的全部逐时结果按LABELS顺序排成(序列数, 时段)矩阵
+    series = [np.asarray(flows[flow], dtype=float) for flow in FLOWS + FIXED_FLOWS]
+    series += [np.asarray(content, dtype=float) for content in storage_content]
+    return np.stack([np.broadcast_to(values, (time_step,)) for values in series])
+
+
+class ResultArchiveWriter:
+    def __init__(self, directory, time_step=24, dtype="float32"):
+        os.makedirs(directory, exist_ok=True)
+        write_meta(directory, time_step, dtype)
+        self.time_step = time_step
+        self.dtype = np.dtype(dtype)
+        name = "%s_%d" % (socket.gethostname(), os.getpid())
+        data_path = os.path.join(directory, "data_%s.bin" % name)
+        index_path = os.path.join(directory, "index_%s.bin" % name)
+        record_size = len(LABELS) * time_step * self.dtype.itemsize
+        # 同名文件（进程号重用）末尾可能有中断时写了一半的记录，截去后再追加，之后的记录仍按行对齐
+        for path, size in [(data_path, record_size), (index_path, INDEX_DTYPE.itemsize)]:
+            if os.path.exists(path) and os.path.getsize(path) % size:
+                os.truncate(path, os.path.getsize(path) // size * size)
+        self.data_file = open(data_path, "ab")
+        self.index_file = open(index_path, "ab")
+        self.rows = os.path.getsize(data_path) // record_size
+        self.lock = threading.Lock()  # 多线程评价时各线程共用本进程的文件
+
+    def append(self, capacities, records):
+        # records为[(中心日, 代表天数, (序列数, 时段)矩阵)]，一个设计方案的全部典型日一次写入
+        data = np.stack([record for _, _, record in records]).astype(self.dtype)
+        index = np.zeros(len(records), dtype=INDEX_DTYPE)
+        index["capacities"] = np.asarray(capacities, dtype=float)
+        index["medoid"] = [medoid for medoid, _, _ in records]
+        index["weight"] = [weight for _, weight, _ in records]
+        with self.lock:
+            index["row"] = self.rows + np.arange(len(records))
+            self.data_file.write(data.tobytes())
+            self.data_file.flush()
+            self.index_file.write(index.tobytes())
+            self.index_file.flush()
+            self.rows += len(records)
+
+    def close(self):
+        self.data_file.close()
+        self.index_file.close()
+
+
+def get_writer(directory, time_step=24):
+    with _writers_lock:
+        writer = _writers.get((directory, os.getpid()))
+        if writer is None:
+            writer = _writers[(directory, os.getpid())] = ResultArchiveWriter(directory, time_step)
+        return writer
+
+
+class ResultArchive:
+    # 只读访问：索引读入内存，数据内存映射，按需取出某个设计方案/典型日/序列
+    def __init__(self, directory):
+        with open(os.path.join(directory, "meta.json")) as f:
+            meta = json.load(f)
+        self.labels = meta["labels"]
+        self.time_step = meta["time_step"]
+        self.dtype = np.dtype(meta["dtype"])
+        record_size = len(self.labels) * self.time_step * self.dtype.itemsize
+        self.data = []
+        indexes = []
+        for index_path in sorted(glob.glob(os.path.join(directory, "index_*.bin"))):
+            data_path = os.path.join(directory, "data_" + os.path.basename(index_path)[len("index_"):])
+            rows = os.path.getsize(data_path) // record_size if os.path.exists(data_path) else 0
+            count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+            index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=count)
+            index = index[index["row"] < rows]  # 只使用数据已完整写入的记录
+            if rows == 0 or len(index) == 0:
+                continue
+            self.data.append(np.memmap(data_path, dtype=self.dtype, mode="r",
+                                       shape=(rows, len(self.labels), self.time_step)))
+            file_index = np.zeros(len(index), dtype=INDEX_DTYPE.descr + [("file", "i4")])
+            for name in INDEX_DTYPE.names:
+                file_index[name] = index[name]
+            file_index["file"] = len(self.data) - 1
+            indexes.append(file_index)
+        self.index = np.concatenate(indexes) if indexes else np.zeros(0, dtype=INDEX_DTYPE.descr + [("file", "i4")])
+
+    def __len__(self):
+        return len(self.index)
+
+    def designs(self):
+        # 存档中的全部设计方案（去重后的容量向量），形状为(方案数, 9)
+        return np.unique(self.index["capacities"], axis=0)
+
+    def find(self, capacities, atol=1e-6):
+        # 某个设计方案的全部记录在索引中的位置，按中心日排序；同一方案被多次求解时只取最先写入的一组
+        capacities = np.asarray(capacities, dtype=float)
+        matches = np.flatnonzero(np.all(np.abs(self.index["capacities"] - capacities) <= atol, axis=1))
+        _, first = np.unique(self.index["medoid"][matches], return_index=True)
+        return matches[first]
+
+    def record(self, i):
+        # 第i条记录的逐时结果（内存映射视图），形状为(序列数, 时段)
+        entry = self.index[i]
+        return self.data[entry["file"]][entry["row"]]
+
+    def get(self, capacities, labels=None, atol=1e-6):
+        """
+        返回某个设计方案的(中心日, 代表天数, {标签: (典型日, 时段)数组})；labels为None时取全部序列。
+        只读取所需的记录与序列，不把整个存档读入内存。
+        """
+        records = self.find(capacities, atol)
+        if len(records) == 0:
+            raise KeyError("design %s is not in the archive" % np.asarray(capacities).tolist())
+        labels = self.labels if labels is None else labels
+        columns = [self.labels.index(label) for label in labels]
+        values = np.stack([np.asarray(self.record(i)[columns], dtype=float) for i in records], axis=1)
+        return self.index["medoid"][records], self.index["weight"][records], dict(zip(labels, values))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="读取逐时调度结果存档")
+    parser.add_argument("directory")
+    parser.add_argument("--design", type=int, default=None, help="导出第几个设计方案（designs()中的顺序）")
+    parser.add_argument("--output", default=None, help="导出的csv文件")
+    args = parser.parse_args()
+    archive = ResultArchive(args.directory)
+    designs = archive.designs()
+    print("[records:%d] [designs:%d] [series:%d]" % (len(archive), len(designs), len(archive.labels)))
+    if args.design is not None:
+        medoids, weights, series = archive.get(designs[args.design])
+        print("[capacities] " + " ".join("%.2f" % c for c in designs[args.design]))
+        if args.output is not None:
+            with open(args.output, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["medoid", "weight", "hour"] + archive.labels)
+                for k, (medoid, weight) in enumerate(zip(medoids, weights)):
+                    for t in range(archive.time_step):
+                        writer.writerow([medoid, weight, t] + [series[label][k, t] for label in archive.labels])
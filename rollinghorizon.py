@@ -0,0 +1,172 @@
+"""
+全年8760小时滚动优化
+-------------------
+典型日模型中每天的储能都是周期平衡的，无法反映跨日的储能转移。这里对给定的设计方案在mergedData.csv的全年逐时数据上做滚动优化，用于校验最终方案：
+- 每个窗口长window小时，相邻窗口重叠overlap小时，只保留每个窗口前window - overlap小时的结果（最后一个窗口全部保留），
+  保留部分末时段的储能电量作为下一个窗口的初始电量；
+- 每个窗口保留部分的全部流与储能电量写入output_dir/window_XXXX.npz，主进程只累计运行成本与净负荷的一、二阶矩，
+  内存占用与窗口长度有关而与总时长无关；
+- mode='sequential'：依次求解，储能状态严格传递；
+  mode='two-pass'：第一遍各窗口按周期平衡独立并行求解，以其结果估计各窗口起点的储能电量，
+  第二遍以估计值为初始电量再次并行求解，并报告相邻窗口之间的储能电量不连续量。
+用法：
+    python rollinghorizon.py --window 168 --overlap 24 --engine highs --mode two-pass
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool as ProcessPool
+from operation import OperationModel
+from dataloader import load_operation_data
+from sparselp import FLOWS, FIXED_FLOWS, SOURCE_COST
+from gaproblem import cal_solar_output, cal_wind_output, cal_economic_obj, ELE_PRICE, GAS_PRICE
+
+# 各能源的净负荷：(外部补充, 多余出口)
+NET_LOAD_FLOWS = [
+    (("grid", "electricity bus"), ("electricity bus", "electricity overflow")),
+    (("heat source", "heat bus"), ("heat bus", "heat overflow")),
+    (("cool source", "cool bus"), ("cool bus", "cool overflow")),
+]
+FLOW_LABELS = FLOWS + FIXED_FLOWS
+
+
+# 划分窗口：[(起点, 保留部分终点, 窗口终点)]
+def get_windows(n_hours, window, overlap):
+    if not 0 <= overlap < window:
+        raise ValueError("overlap must be in [0, window)")
+    windows = []
+    start = 0
+    while start < n_hours:
+        end = min(start + window, n_hours)
+        commit_end = end if end == n_hours else end - overlap
+        windows.append((start, commit_end, end))
+        start = commit_end
+    return windows
+
+
+# 逐时电价、气价（按24小时周期重复）
+def get_prices(start, end):
+    hours = np.arange(start, end) % len(ELE_PRICE)
+    return np.asarray(ELE_PRICE, dtype=float)[hours], np.asarray(GAS_PRICE, dtype=float)[hours]
+
+
+def solve_window(args):
+    # 求解一个窗口，保留部分写入文件，返回保留部分末时段的储能电量、运行成本与净负荷的矩
+    index, (start, commit_end, end), capacities, initial_storage, engine, output_dir, operation_list = args
+    if operation_list is None:
+        operation_list = load_operation_data('mergedData.csv')
+    ppv, pwt, pgt, php, pec, pac, pes, phs, pcs = capacities
+    data = np.asarray(operation_list[start:end], dtype=float)
+    ele_price, gas_price = get_prices(start, end)
+    pv_output = cal_solar_output(data[:, 3], data[:, 5], ppv)
+    wt_output = cal_wind_output(data[:, 4], pwt)
+    local_time = pd.Timestamp('2019-01-01') + pd.Timedelta(hours=start)
+    operation_model = OperationModel(local_time, end - start, ele_price.tolist(), gas_price.tolist(),
+                                     data[:, 0], data[:, 1], data[:, 2], wt_output, pv_output,
+                                     pgt, php, pec, pac, pes, phs, pcs, engine, initial_storage)
+    operation_model.optimise()
+    n = commit_end - start
+    flows = operation_model.get_flow_sequences()
+    flow_matrix = np.array([np.asarray(flows[f], dtype=float)[:n] for f in FLOW_LABELS])
+    storage = np.array([content[:n] for content in operation_model.get_storage_content()])
+    result = {
+        "index": index,
+        "start": start,
+        "initial_storage": None if initial_storage is None else np.asarray(initial_storage, dtype=float),
+        "final_storage": storage[:, -1].copy(),
+        "cost": float(ele_price[:n] @ flow_matrix[FLOW_LABELS.index(("grid", "electricity bus"))]
+                      + gas_price[:n] @ flow_matrix[FLOW_LABELS.index(("gas", "gas bus"))]
+                      + SOURCE_COST * flow_matrix[FLOW_LABELS.index(("heat source", "heat bus"))].sum()
+                      + SOURCE_COST * flow_matrix[FLOW_LABELS.index(("cool source", "cool bus"))].sum()),
+        "sum": np.zeros(len(NET_LOAD_FLOWS)),
+        "sum_sq": np.zeros(len(NET_LOAD_FLOWS)),
+    }
+    for k, (source, overflow) in enumerate(NET_LOAD_FLOWS):
+        source_flow = flow_matrix[FLOW_LABELS.index(source)]
+        overflow_flow = flow_matrix[FLOW_LABELS.index(overflow)]
+        net_load = np.where(source_flow >= overflow_flow, source_flow, 0 - overflow_flow)
+        result["sum"][k] = net_load.sum()
+        result["sum_sq"][k] = (net_load ** 2).sum()
+    if output_dir is not None:
+        np.savez(os.path.join(output_dir, "window_%04d.npz" % index), hours=np.arange(start, commit_end),
+                 flows=flow_matrix, storage=storage, labels=np.array(["%s|%s" % f for f in FLOW_LABELS]))
+    return result
+
+
+def map_windows(tasks, num_workers):
+    if num_workers is None or num_workers <= 1:
+        return [solve_window(task) for task in tasks]
+    with ProcessPool(num_workers) as pool:
+        return pool.map(solve_window, tasks)
+
+
+def run_rolling_horizon(capacities, window=168, overlap=24, engine='highs', mode='sequential',
+                        output_dir='rollingResults', num_workers=None, initial_storage=(0.0, 0.0, 0.0)):
+    operation_list = load_operation_data('mergedData.csv')
+    windows = get_windows(operation_list.shape[0], window, overlap)
+    capacities = [float(c) for c in capacities]
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    # 进程池中的窗口各自内存映射逐时数据，不随任务传递
+    shared_data = operation_list if num_workers is None or num_workers <= 1 else None
+    if mode == 'sequential':
+        results = []
+        state = initial_storage
+        for k, w in enumerate(windows):
+            results.append(solve_window((k, w, capacities, state, engine, output_dir, shared_data)))
+            state = results[-1]["final_storage"]
+    elif mode == 'two-pass':
+        # 第一遍：周期平衡，估计各窗口保留部分末时段的储能电量
+        first_pass = map_windows([(k, w, capacities, None, engine, None, shared_data)
+                                  for k, w in enumerate(windows)], num_workers)
+        states = [initial_storage] + [r["final_storage"] for r in first_pass[:-1]]
+        # 第二遍：以估计值为初始电量
+        results = map_windows([(k, w, capacities, states[k], engine, output_dir, shared_data)
+                               for k, w in enumerate(windows)], num_workers)
+    else:
+        raise ValueError("Unknown rolling horizon mode: %s" % mode)
+    return summarize(results, capacities, operation_list.shape[0])
+
+
+# 汇总各窗口：全年运行成本、经济目标、源荷匹配目标（全年逐时净负荷标准差之和）与窗口间储能电量不连续量
+def summarize(results, capacities, n_hours):
+    results = sorted(results, key=lambda r: r["index"])
+    oc = sum(r["cost"] for r in results)
+    mean = sum(r["sum"] for r in results) / n_hours
+    variance = np.maximum(sum(r["sum_sq"] for r in results) / n_hours - mean ** 2, 0)
+    mismatch = [float(np.abs(previous["final_storage"] - current["initial_storage"]).max())
+                for previous, current in zip(results[:-1], results[1:])]
+    return {
+        "windows": len(results),
+        "operating_cost": oc,
+        "economic": float(cal_economic_obj(capacities, oc)),
+        "complementary": float(np.sqrt(variance).sum()),
+        "max_storage_mismatch": max(mismatch) if mismatch else 0.0,
+    }
+
+
+# 按时段顺序逐窗口读取保存的结果
+def iter_window_results(output_dir):
+    for name in sorted(os.listdir(output_dir)):
+        if name.startswith("window_") and name.endswith(".npz"):
+            with np.load(os.path.join(output_dir, name)) as window_result:
+                yield {key: window_result[key] for key in window_result.files}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="全年滚动优化校验设计方案")
+    parser.add_argument("--capacities", default="1710.86,1648.98,2217.91,2.79,5.17,305.72,0.04,2351.50,400.82",
+                        help="逗号分隔的9个设备容量：ppv,pwt,pgt,php,pec,pac,pes,phs,pcs")
+    parser.add_argument("--window", type=int, default=168)
+    parser.add_argument("--overlap", type=int, default=24)
+    parser.add_argument("--engine", default="highs", choices=["oemof", "highs"])
+    parser.add_argument("--mode", default="sequential", choices=["sequential", "two-pass"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default="rollingResults")
+    args = parser.parse_args()
+    summary = run_rolling_horizon([float(c) for c in args.capacities.split(",")], args.window, args.overlap,
+                                  args.engine, args.mode, args.output, args.workers)
+    print("[windows:%d] [operating cost:%f] [economic:%f] [complementary:%f] [max storage mismatch:%f]"
+          % (summary["windows"], summary["operating_cost"], summary["economic"], summary["complementary"],
+             summary["max_storage_mismatch"]))
@@ -0,0 +1,252 @@
+"""
+进程池调度器
+-------------------
+代替multiprocessing.Pool.map_async的评价调度层，接口与Pool.map相同（map / close），用于PoolType = 'Scheduler'：
+- 动态负载均衡：任务按chunk_size分块，工作进程每完成一块再领取下一块（与imap_unordered相同），结果按原顺序返回；
+- 单次评价超时：工作进程每完成一个任务立即回传结果，某个任务运行超过task_timeout秒时，
+  连同其进程组（包括GLPK子进程）一起结束该工作进程并启动新的工作进程，超时任务由on_failure给出结果，块中其余任务重新排队；
+- 工作进程回收：每完成一块后报告常驻内存（RSS），超过max_rss_mb或完成任务数达到max_tasks时退出并由新进程替换，
+  释放Pyomo/oemof对象反复创建造成的内存增长；
+- 统计：每次map的任务耗时中位数/最大值、慢任务（耗时超过中位数straggler_factor倍）数、超时数、异常数、回收数，
+  以及最后一个任务完成前其他工作进程的空闲时间（尾部等待），由pop_stats()取出并清零，随每代的计时统计一起保存。
+"""
+import os
+import time
+import signal
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+
+def get_rss_mb():
+    # 当前进程的常驻内存（MB）；无/proc时用峰值RSS近似，都不可用时返回None
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+def _worker_main(conn, initializer, initargs):
+    # 工作进程自成一个进程组，超时时可连同求解器子进程一起结束
+    if hasattr(os, "setpgid"):
+        os.setpgid(0, 0)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        func, chunk = message
+        for index, item in chunk:
+            try:
+                conn.send(("result", index, func(item)))
+            except Exception as e:
+                conn.send(("error", index, "%s: %s\n%s" % (type(e).__name__, e, traceback.format_exc())))
+        conn.send(("idle", None, get_rss_mb()))
+
+
+class Worker:
+    # 每个工作进程一条独立的管道，结束某个工作进程不会影响其他进程的通信
+    def __init__(self, context, initializer, initargs):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, initializer, initargs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.pid = self.process.pid
+        self.chunk = []  # 当前块中尚未返回结果的任务[(下标, 输入)]
+        self.task_start = None  # 当前任务的开始时间
+        self.tasks_done = 0
+        self.ready = True  # 已报告上一块完成，可以分配新块
+        self.closed = False  # 管道已断开
+
+    def assign(self, func, chunk):
+        self.chunk = list(chunk)
+        self.ready = False
+        self.task_start = time.perf_counter()
+        self.conn.send((func, self.chunk))
+
+    def kill(self):
+        # 结束工作进程及其进程组中的求解器子进程
+        try:
+            if hasattr(os, "killpg"):
+                os.killpg(self.pid, signal.SIGKILL)
+            else:
+                self.process.terminate()
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.kill()
+        self.conn.close()
+
+
+class TaskScheduler:
+    def __init__(self, processes=None, initializer=None, initargs=(), chunk_size=None, task_timeout=None,
+                 max_rss_mb=None, max_tasks=None, straggler_factor=3.0, poll_interval=0.5):
+        self.processes = processes or mp.cpu_count()
+        self.initializer = initializer
+        self.initargs = initargs
+        self.chunk_size = chunk_size  # 每块的任务数，None时取任务数 / (4 * 进程数)
+        self.task_timeout = task_timeout  # 单个任务的超时时间（秒），None表示不限
+        self.max_rss_mb = max_rss_mb  # 工作进程RSS超过该值（MB）后回收，None表示不限
+        self.max_tasks = max_tasks  # 工作进程完成该数目的任务后回收，None表示不限
+        self.straggler_factor = straggler_factor
+        self.poll_interval = poll_interval
+        self.context = mp.get_context()
+        self.workers = dict()
+        for _ in range(self.processes):
+            self.start_worker()
+        self.stats = self.new_stats()
+
+    @staticmethod
+    def new_stats():
+        return {"tasks": 0, "chunks": 0, "timeouts": 0, "errors": 0, "recycled": 0, "crashed": 0,
+                "stragglers": 0, "median_task_time": 0.0, "max_task_time": 0.0, "tail_idle_time": 0.0}
+
+    def start_worker(self):
+        worker = Worker(self.context, self.initializer, self.initargs)
+        self.workers[worker.pid] = worker
+        return worker
+
+    def replace_worker(self, worker, kill=True):
+        del self.workers[worker.pid]
+        worker.kill() if kill else worker.stop()
+        return self.start_worker()
+
+    def map(self, func, iterable, on_failure=None):
+        """
+        按顺序返回func(item)的结果；任务超时、抛出异常或工作进程意外退出时，
+        结果为on_failure(item, reason)，on_failure为None时抛出RuntimeError。
+        """
+        items = list(iterable)
+        n = len(items)
+        results = [None] * n
+        done = [False] * n
+        if n == 0:
+            return results
+        chunk_size = self.chunk_size or max(1, -(-n // (4 * self.processes)))
+        pending = [[(k, items[k]) for k in range(start, min(start + chunk_size, n))]
+                   for start in range(0, n, chunk_size)]
+        pending.reverse()
+        durations = []
+        finished_at = dict()  # 各工作进程最后一次空闲的时刻，用于计算尾部等待
+        remaining = n
+        stats = self.stats
+        stats["chunks"] += len(pending)
+
+        def fail(index, reason):
+            if on_failure is None:
+                raise RuntimeError("task %d failed: %s" % (index, reason))
+            results[index] = on_failure(items[index], reason)
+            done[index] = True
+
+        def dispatch():
+            for worker in list(self.workers.values()):
+                if not pending:
+                    break
+                if worker.ready:
+                    worker.assign(func, pending.pop())
+                    finished_at.pop(worker.pid, None)
+
+        try:
+            dispatch()
+            while remaining:
+                connections = {worker.conn: worker for worker in self.workers.values()}
+                for conn in wait(list(connections), timeout=self.poll_interval):
+                    worker = connections[conn]
+                    try:
+                        kind, index, value = conn.recv()
+                    except (EOFError, OSError):
+                        worker.closed = True  # 工作进程已退出，下面按意外退出处理
+                        continue
+                    now = time.perf_counter()
+                    if kind in ("result", "error"):
+                        durations.append(now - worker.task_start)
+                        worker.task_start = now
+                        worker.chunk = [task for task in worker.chunk if task[0] != index]
+                        worker.tasks_done += 1
+                        if not done[index]:
+                            remaining -= 1
+                            if kind == "result":
+                                results[index] = value
+                                done[index] = True
+                            else:
+                                stats["errors"] += 1
+                                fail(index, value.splitlines()[0])
+                    elif kind == "idle":
+                        worker.ready = True
+                        finished_at[worker.pid] = now
+                        if (self.max_rss_mb is not None and value is not None and value > self.max_rss_mb) or \
+                                (self.max_tasks is not None and worker.tasks_done >= self.max_tasks):
+                            stats["recycled"] += 1
+                            finished_at.pop(worker.pid, None)
+                            self.replace_worker(worker, kill=False)
+                now = time.perf_counter()
+                # 超时与意外退出的工作进程：当前任务记为失败，块中其余任务重新排队
+                for worker in list(self.workers.values()):
+                    timed_out = worker.chunk and self.task_timeout is not None and \
+                        now - worker.task_start > self.task_timeout
+                    crashed = worker.closed or not worker.process.is_alive()
+                    if crashed and not worker.closed and worker.conn.poll():
+                        continue  # 退出前发出的结果尚未读取，下一轮读取后再处理
+                    if timed_out or crashed:
+                        if worker.chunk:
+                            index = worker.chunk[0][0]
+                            if timed_out:
+                                stats["timeouts"] += 1
+                                reason = "timeout after %.0fs" % self.task_timeout
+                            else:
+                                stats["crashed"] += 1
+                                worker.process.join(1)
+                                reason = "worker exited with code %s" % worker.process.exitcode
+                            durations.append(now - worker.task_start)
+                            if not done[index]:
+                                remaining -= 1
+                                fail(index, reason)
+                            if len(worker.chunk) > 1:
+                                pending.append(worker.chunk[1:])
+                        self.replace_worker(worker)
+                dispatch()
+        except BaseException:
+            # 中途抛出异常（包括KeyboardInterrupt）时，正在运行的工作进程的结果不再读取，替换为新进程以免影响下一次map
+            for worker in list(self.workers.values()):
+                if not worker.ready:
+                    self.replace_worker(worker)
+            raise
+        stats["tasks"] += n
+        if durations:
+            durations.sort()
+            median = durations[len(durations) // 2]
+            stats["median_task_time"] = median
+            stats["max_task_time"] = max(stats["max_task_time"], durations[-1])
+            stats["stragglers"] += sum(d > self.straggler_factor * median for d in durations)
+        if finished_at:
+            end = time.perf_counter()
+            stats["tail_idle_time"] += sum(end - t for t in finished_at.values())
+        return results
+
+    # 取出并清零自上次调用以来的统计
+    def pop_stats(self):
+        stats = self.stats
+        self.stats = self.new_stats()
+        return stats
+
+    def close(self):
+        for worker in list(self.workers.values()):
+            worker.stop()
+        self.workers.clear()
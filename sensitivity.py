@@ -0,0 +1,219 @@
+"""
+设计变量的灵敏度分析
+-------------------
+在某个设计方案（通常取自外部非支配存档的前沿）附近的盒子内抽样，评价经济目标与源荷匹配目标对9个容量变量的灵敏度：
+- 'oat'：逐个变量扫描（one-at-a-time），其余变量固定在中心点，每个变量steps个取值；指标为各变量在扫描范围内引起的
+  目标变化幅度（swing）及其相对中心点目标值的比例；
+- 'morris'：Morris初筛法，trajectories条轨迹、levels个网格级别，每条轨迹k+1个设计；指标为基本效应的均值mu、
+  绝对值均值mu_star与标准差sigma（以变量的整个扫描范围为单位）；
+- 'sobol'：Saltelli抽样（scipy.stats.qmc.Sobol）与Jansen估计量，基本样本数取不小于samples的2的幂，共(k+2)·N个设计；
+  指标为一阶指数S1与总效应指数ST，以及bootstrap的95%置信区间半宽。
+盒子为中心点±span倍的变量范围，并截断到变量上下界。使用评价结果缓存时样本取整到缓存的量化网格（cache_resolution），
+同一网格点上的样本首次求解与命中缓存时得到相同的目标函数值。全部样本先去重，再经MyProblem.evaluate_designs一次性交给进程池评价，
+命中评价结果缓存的设计不重新求解；求解失败（目标函数值为inf）的样本所在的轨迹/基本样本不参与指标计算。
+样本生成与指标计算均为NumPy向量运算。用法：
+    python sensitivity.py --method sobol --size 256 --pareto Result/pareto.npz --engine highs --workers 8
+    python sensitivity.py --method oat --capacities 1710.86,1648.98,2217.91,2.79,5.17,305.72,0.04,2351.5,400.82
+"""
+import csv
+import argparse
+import numpy as np
+from gaproblem import MyProblem
+from paretoarchive import ParetoArchive
+
+VARIABLES = ["ppv", "pwt", "pgt", "php", "pec", "pac", "pes", "phs", "pcs"]
+OBJECTIVES = ["economic", "complementary"]
+# 各方法的指标（每个指标为(变量, 目标)数组）
+METRICS = {"oat": ["swing", "relative_swing"], "morris": ["mu", "mu_star", "sigma"],
+           "sobol": ["S1", "S1_conf", "ST", "ST_conf"]}
+
+
+def select_pareto_point(archive):
+    # 前沿的拐点：两个目标按前沿范围归一化后距理想点最近的设计方案
+    ObjV = archive.ObjV
+    if len(ObjV) == 0:
+        raise ValueError("the Pareto archive is empty")
+    scale = np.maximum(ObjV.max(axis=0) - ObjV.min(axis=0), 1e-12)
+    distance = np.sum(((ObjV - ObjV.min(axis=0)) / scale) ** 2, axis=1)
+    return archive.Phen[np.argmin(distance)]
+
+
+def get_bounds(center, span, lb, ub):
+    center = np.asarray(center, dtype=float)
+    width = span * (np.asarray(ub, dtype=float) - np.asarray(lb, dtype=float))
+    return np.maximum(center - width, lb), np.minimum(center + width, ub)
+
+
+def sample_oat(center, lo, hi, steps):
+    # 返回(变量, 取值, 变量)的设计矩阵，第i组只改变第i个变量
+    k = len(center)
+    grid = lo[:, None] + (hi - lo)[:, None] * np.linspace(0, 1, steps)
+    X = np.repeat(np.asarray(center, dtype=float)[None, None, :], k, axis=0).repeat(steps, axis=1)
+    X[np.arange(k), :, np.arange(k)] = grid
+    return X
+
+
+def oat_indices(Y, center_objv):
+    # Y为(变量, 取值, 目标)；失败的取值不参与
+    Y = np.where(np.isfinite(Y), Y, np.nan)
+    swing = np.nanmax(Y, axis=1) - np.nanmin(Y, axis=1)
+    return {"swing": swing, "relative_swing": swing / np.maximum(np.abs(center_objv), 1e-12)}
+
+
+def sample_morris(lo, hi, trajectories, levels=4, seed=None):
+    """
+    返回(轨迹, k+1, 变量)的设计矩阵与各轨迹中变量被改变的次序rank（rank[t, i]为第t条轨迹中第i个变量在第几步改变）。
+    轨迹起点取自levels级网格中使起点+delta不越界的级别，每步把一个变量增加delta，delta = levels / (2(levels - 1))。
+    """
+    rng = np.random.default_rng(seed)
+    k = len(lo)
+    delta = levels / (2 * (levels - 1))
+    base = rng.integers(0, levels // 2, (trajectories, k)) / (levels - 1)
+    rank = np.argsort(rng.random((trajectories, k)), axis=1).argsort(axis=1)
+    unit = base[:, None, :] + delta * (np.arange(k + 1)[None, :, None] > rank[:, None, :])
+    return lo + unit * (hi - lo), rank, delta
+
+
+def morris_indices(Y, rank, delta):
+    # Y为(轨迹, k+1, 目标)；基本效应以变量的整个扫描范围为单位
+    valid = np.all(np.isfinite(Y), axis=(1, 2))
+    Y, rank = Y[valid], rank[valid]
+    effects = np.take_along_axis(np.diff(Y, axis=1) / delta, rank[:, :, None], axis=1)  # (轨迹, 变量, 目标)
+    return {"mu": effects.mean(axis=0), "mu_star": np.abs(effects).mean(axis=0),
+            "sigma": effects.std(axis=0, ddof=1) if len(effects) > 1 else np.full(effects.shape[1:], np.nan),
+            "trajectories": int(valid.sum())}
+
+
+def sample_sobol(lo, hi, samples, seed=None):
+    # 返回A、B与AB_i拼成的((k+2)·N, 变量)设计矩阵及基本样本数N（不小于samples的2的幂）
+    from scipy.stats import qmc
+    k = len(lo)
+    base = qmc.Sobol(2 * k, scramble=True, seed=seed).random_base2(int(np.ceil(np.log2(max(samples, 2)))))
+    n = base.shape[0]
+    A, B = base[:, :k], base[:, k:]
+    AB = np.repeat(A[None], k, axis=0)
+    AB[np.arange(k), :, np.arange(k)] = B.T
+    unit = np.concatenate([A, B, AB.reshape(k * n, k)])
+    return lo + unit * (hi - lo), n
+
+
+def sobol_indices(Y, k, n, resamples=100, seed=None):
+    # Y为((k+2)·N, 目标)，按sample_sobol的顺序；Saltelli (2010)的一阶指数与Jansen总效应估计量
+    fA, fB, fAB = Y[:n], Y[n:2 * n], Y[2 * n:].reshape(k, n, -1)
+    valid = np.all(np.isfinite(fA), axis=1) & np.all(np.isfinite(fB), axis=1) & np.all(np.isfinite(fAB), axis=(0, 2))
+    fA, fB, fAB = fA[valid], fB[valid], fAB[:, valid]
+
+    def estimate(fA, fB, fAB):
+        # 最后两维为(样本, 目标)，其前可有bootstrap维
+        variance = np.var(np.concatenate([fA, fB], axis=-2), axis=-2)
+        S1 = np.mean(fB * (fAB - fA), axis=-2) / variance
+        ST = 0.5 * np.mean((fA - fAB) ** 2, axis=-2) / variance
+        return S1, ST
+
+    S1, ST = estimate(fA, fB, fAB)
+    # bootstrap：对基本样本有放回重抽样，所有重抽样一次计算
+    index = np.random.default_rng(seed).integers(0, len(fA), (resamples, len(fA)))
+    S1_boot, ST_boot = estimate(fA[index], fB[index], fAB[:, index])
+    return {"S1": S1, "ST": ST, "S1_conf": 1.96 * S1_boot.std(axis=1), "ST_conf": 1.96 * ST_boot.std(axis=1),
+            "samples": int(valid.sum())}
+
+
+def snap(problem, X):
+    cache = getattr(problem, "cache", None)
+    return X if cache is None else np.rint(X / cache.resolution) * cache.resolution
+
+
+def evaluate_samples(problem, X):
+    # 去重后一次性评价，返回与X各行对应的目标函数值
+    X = np.asarray(X, dtype=float)
+    unique, inverse = np.unique(X, axis=0, return_inverse=True)
+    return problem.evaluate_designs(unique)[inverse.reshape(-1)]
+
+
+def analyze(problem, center, method, size=None, span=0.1, levels=4, seed=None):
+    """
+    在center附近做method（'oat'、'morris'或'sobol'）灵敏度分析。size为oat每个变量的取值数（默认11）、
+    morris的轨迹数（默认20）或sobol的基本样本数（默认256）。返回各指标（(变量, 目标)数组）及样本与目标函数值。
+    """
+    lo, hi = get_bounds(center, span, problem.ranges[0], problem.ranges[1])
+    k = len(lo)
+    if method == 'oat':
+        center = snap(problem, np.asarray(center, dtype=float))
+        X = snap(problem, sample_oat(center, lo, hi, size or 11))
+        Y = evaluate_samples(problem, np.vstack([X.reshape(-1, k), center]))
+        result = oat_indices(Y[:-1].reshape(k, X.shape[1], -1), Y[-1])
+        X, Y = X.reshape(-1, k), Y[:-1]
+    elif method == 'morris':
+        X, rank, delta = sample_morris(lo, hi, size or 20, levels, seed)
+        X = snap(problem, X)
+        Y = evaluate_samples(problem, X.reshape(-1, k))
+        result = morris_indices(Y.reshape(X.shape[0], k + 1, -1), rank, delta)
+        X = X.reshape(-1, k)
+    elif method == 'sobol':
+        X, n = sample_sobol(lo, hi, size or 256, seed)
+        X = snap(problem, X)
+        Y = evaluate_samples(problem, X)
+        result = sobol_indices(Y, k, n, seed=seed)
+    else:
+        raise ValueError("Unknown sensitivity method: %s" % method)
+    result.update(method=method, center=np.asarray(center, dtype=float), lower=lo, upper=hi, X=X, Y=Y)
+    return result
+
+
+def format_indices(result):
+    lines = ["[method:%s] [samples:%d] " % (result["method"], len(result["X"]))
+             + " ".join("[%s:%.2f]" % item for item in zip(VARIABLES, result["center"]))]
+    metrics = METRICS[result["method"]]
+    for m, objective in enumerate(OBJECTIVES):
+        lines.append("  %-8s " % objective + "".join("%14s" % metric for metric in metrics))
+        for i, name in enumerate(VARIABLES):
+            lines.append("  %-8s " % name + "".join("%14.4g" % result[metric][i, m] for metric in metrics))
+    return "\n".join(lines)
+
+
+def save_indices(result, path):
+    # 每个变量一行，各指标按目标分列
+    metrics = METRICS[result["method"]]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["variable", "center", "lower", "upper"]
+                        + ["%s_%s" % (metric, objective) for objective in OBJECTIVES for metric in metrics])
+        for i, name in enumerate(VARIABLES):
+            writer.writerow([name, result["center"][i], result["lower"][i], result["upper"][i]]
+                            + [result[metric][i, m] for m in range(len(OBJECTIVES)) for metric in metrics])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="设计变量对两个目标的灵敏度分析")
+    parser.add_argument("--method", default="morris", choices=["oat", "morris", "sobol"])
+    parser.add_argument("--capacities", default=None, help="逗号分隔的9个设备容量，不给定时取--pareto前沿的拐点")
+    parser.add_argument("--pareto", default="Result/pareto.npz", help="外部非支配存档（见paretoarchive.py）")
+    parser.add_argument("--index", type=int, default=None, help="取前沿中第几个设计方案（按经济目标升序）")
+    parser.add_argument("--size", type=int, default=None, help="oat每个变量的取值数/morris轨迹数/sobol基本样本数")
+    parser.add_argument("--span", type=float, default=0.1, help="抽样范围：中心点±span倍的变量范围")
+    parser.add_argument("--levels", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--pool", default="Process", choices=["Thread", "Process", "Scheduler", "Service"])
+    parser.add_argument("--engine", default="highs", choices=["oemof", "highs"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--cache", default="evaluationCache.sqlite", help="评价结果缓存，与GA运行共享")
+    parser.add_argument("--storage-threshold", type=float, default=None)
+    parser.add_argument("--typical-days", default="typicalDayData.xlsx")
+    parser.add_argument("--output", default=None, help="各变量指标的csv文件")
+    args = parser.parse_args()
+    if args.capacities is not None:
+        center = np.array([float(c) for c in args.capacities.split(",")])
+    else:
+        archive = ParetoArchive.load(args.pareto)
+        center = archive.Phen[args.index] if args.index is not None else select_pareto_point(archive)
+    problem = MyProblem(args.pool, True, args.engine, args.batch_size, args.cache, num_workers=args.workers,
+                        typical_days_path=args.typical_days, storage_threshold=args.storage_threshold)
+    try:
+        result = analyze(problem, center, args.method, args.size, args.span, args.levels, args.seed)
+    finally:
+        problem.kill_pool()
+    print(format_indices(result))
+    print(problem.profile.summary())
+    if args.output is not None:
+        save_indices(result, args.output)
@@ -0,0 +1,316 @@
+"""
+调度问题的稀疏矩阵LP求解引擎
+-------------------
+与operation.py中oemof模型拓扑完全相同的线性规划，直接以scipy稀疏矩阵形式组装，
+并用HiGHS（scipy.optimize.linprog）在进程内求解，省去oemof -> Pyomo -> LP文件 -> GLPK子进程的开销。
+约束矩阵只与时段数有关，预先生成模板；每次求解只需填写右端项、变量上下界和目标系数。
+变量按流（起点, 终点）分块，每块长度为时段数，标签与oemof节点标签一致。
+"""
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog
+
+# 设备参数，与operation.py保持一致
+GT_ELE_EFFICIENCY = 0.33
+GT_HEAT_EFFICIENCY = 0.5
+AC_COOL_FACTOR = 0.75
+AC_HEAT_FACTOR = 0.983
+AC_ELE_FACTOR = 0.017
+EHP_COP = 4.44
+EC_COP = 2.87
+# 储能参数：(储能标签, 所连母线, 损耗率, 充能效率, 放能效率, 容量/充放功率)
+STORAGES = [
+    ("electricity storage", "electricity bus", 0.000125, 0.95, 0.90, 2),
+    ("heat storage", "heat bus", 0.001, 0.9, 0.9, 4 / 3),
+    ("cool storage", "cool bus", 0.001, 0.9, 0.9, 4 / 3),
+]
+# 外部能源与多余能量出口的容量上限及单价
+GRID_CAPACITY = 10000000
+GAS_CAPACITY = 10000000
+SOURCE_CAPACITY = 1000000
+SOURCE_COST = 10000000
+OVERFLOW_CAPACITY = 100000
+
+# 决策变量（流），顺序即变量块在向量中的顺序
+FLOWS = [
+    ("grid", "electricity bus"),
+    ("gas", "gas bus"),
+    ("heat source", "heat bus"),
+    ("cool source", "cool bus"),
+    ("gas bus", "gas turbine"),
+    ("gas turbine", "electricity bus"),
+    ("gas turbine", "heat bus"),
+    ("heat bus", "absorption chiller"),
+    ("electricity bus", "absorption chiller"),
+    ("absorption chiller", "cool bus"),
+    ("electricity bus", "electricity heat pump"),
+    ("electricity heat pump", "heat bus"),
+    ("electricity bus", "electricity chiller"),
+    ("electricity chiller", "cool bus"),
+    ("electricity bus", "electricity overflow"),
+    ("heat bus", "heat overflow"),
+    ("cool bus", "cool overflow"),
+    ("electricity bus", "electricity storage"),
+    ("electricity storage", "electricity bus"),
+    ("heat bus", "heat storage"),
+    ("heat storage", "heat bus"),
+    ("cool bus", "cool storage"),
+    ("cool storage", "cool bus"),
+]
+# 固定出力/负荷的流，不作为变量，移到母线平衡约束的右端
+FIXED_FLOWS = [
+    ("wind turbine", "electricity bus"),
+    ("photovoltaic", "electricity bus"),
+    ("electricity bus", "electricity demand"),
+    ("heat bus", "heat demand"),
+    ("cool bus", "cool demand"),
+]
+BUSES = ["electricity bus", "heat bus", "cool bus", "gas bus"]
+# get_complementary_results中各符号对应的流
+COMPLEMENTARY_FLOWS = {
+    "grid": ("grid", "electricity bus"),
+    "electricity overflow": ("electricity bus", "electricity overflow"),
+    "heat source": ("heat source", "heat bus"),
+    "heat overflow": ("heat bus", "heat overflow"),
+    "cool source": ("cool source", "cool bus"),
+    "cool overflow": ("cool bus", "cool overflow"),
+}
+
+
+class DispatchResult:
+    # 保存一次求解的目标值与各流的逐时结果，sensitivity为目标值对各运行模型参数的偏导数（见DispatchTemplate.sensitivity）
+    def __init__(self, objective, flows, storage_content, sensitivity=None):
+        self.objective = objective
+        self.flows = flows
+        self.storage_content = storage_content
+        self.sensitivity = sensitivity
+
+    # 源荷匹配目标所需的外部能源与多余能量出口的逐时出力
+    def complementary_results(self):
+        return {symbol: self.flows[flow].tolist() for symbol, flow in COMPLEMENTARY_FLOWS.items()}
+
+    # 与solph.views.node(results, bus)["sequences"]结构相同的母线出入流表
+    def bus_sequences(self, bus_name, date_time_index):
+        import pandas as pd
+        columns = [f for f in self.flows if bus_name in f]
+        data = {(f, "flow"): self.flows[f] for f in columns}
+        return pd.DataFrame(data, index=date_time_index)
+
+
+class DispatchTemplate:
+    # 根据时段数预先组装等式约束矩阵
+    def __init__(self, time_step):
+        self.time_step = time_step
+        T = time_step
+        self.flow_index = {f: k * T for k, f in enumerate(FLOWS)}
+        n_flow_vars = len(FLOWS) * T
+        # 储能电量变量（每时段一个）与初始电量变量（每个储能一个）
+        self.content_index = {s[0]: n_flow_vars + k * T for k, s in enumerate(STORAGES)}
+        self.init_index = {s[0]: n_flow_vars + len(STORAGES) * T + k for k, s in enumerate(STORAGES)}
+        self.n_vars = n_flow_vars + len(STORAGES) * (T + 1)
+        rows, cols, vals = [], [], []
+        self.n_rows = 0
+
+        def add_rows(entries):
+            # entries: [(变量块起点, 系数)]，为每个时段生成一行
+            for t in range(T):
+                for start, coef in entries:
+                    rows.append(self.n_rows + t)
+                    cols.append(start + t)
+                    vals.append(coef)
+            self.n_rows += T
+
+        f = self.flow_index
+        # 母线平衡约束：流入 - 流出 = 固定流的净流出
+        self.bus_rows = dict()
+        for bus in BUSES:
+            self.bus_rows[bus] = self.n_rows
+            add_rows([(f[flow], 1.0) for flow in FLOWS if flow[1] == bus]
+                     + [(f[flow], -1.0) for flow in FLOWS if flow[0] == bus])
+        # 设备转换关系：输入 * 输出系数 = 输出 * 输入系数
+        add_rows([(f[("gas bus", "gas turbine")], GT_ELE_EFFICIENCY),
+                  (f[("gas turbine", "electricity bus")], -1.0)])
+        add_rows([(f[("gas bus", "gas turbine")], GT_HEAT_EFFICIENCY),
+                  (f[("gas turbine", "heat bus")], -1.0)])
+        add_rows([(f[("heat bus", "absorption chiller")], AC_COOL_FACTOR),
+                  (f[("absorption chiller", "cool bus")], -AC_HEAT_FACTOR)])
+        add_rows([(f[("electricity bus", "absorption chiller")], AC_COOL_FACTOR),
+                  (f[("absorption chiller", "cool bus")], -AC_ELE_FACTOR)])
+        add_rows([(f[("electricity bus", "electricity heat pump")], EHP_COP),
+                  (f[("electricity heat pump", "heat bus")], -1.0)])
+        add_rows([(f[("electricity bus", "electricity chiller")], EC_COP),
+                  (f[("electricity chiller", "cool bus")], -1.0)])
+        # 储能电量平衡：E[t] - E[t-1]*(1-损耗) - 充能*充能效率 + 放能/放能效率 = 0，首时段的E[t-1]为初始电量
+        for label, bus, loss_rate, eta_in, eta_out, _ in STORAGES:
+            content = self.content_index[label]
+            for t in range(T):
+                row = self.n_rows + t
+                rows.extend([row, row, row])
+                cols.extend([content + t, f[(bus, label)] + t, f[(label, bus)] + t])
+                vals.extend([1.0, -eta_in, 1.0 / eta_out])
+                rows.append(row)
+                cols.append(content + t - 1 if t > 0 else self.init_index[label])
+                vals.append(-(1 - loss_rate))
+            self.n_rows += T
+        # 周期平衡：末时段电量等于初始电量
+        for label, *_ in STORAGES:
+            rows.extend([self.n_rows, self.n_rows])
+            cols.extend([self.content_index[label] + T - 1, self.init_index[label]])
+            vals.extend([1.0, -1.0])
+            self.n_rows += 1
+        self.A_eq = sp.csr_matrix((vals, (rows, cols)), shape=(self.n_rows, self.n_vars))
+        # 给定初始电量时不要求周期平衡（滚动优化的各窗口），去掉最后的周期平衡约束
+        self.n_open_rows = self.n_rows - len(STORAGES)
+        self.A_eq_open = self.A_eq[:self.n_open_rows]
+        # 无上界的流（设备输入侧）
+        self.base_upper = np.full(self.n_vars, np.inf)
+        for flow, capacity in [(("grid", "electricity bus"), GRID_CAPACITY),
+                               (("gas", "gas bus"), GAS_CAPACITY),
+                               (("heat source", "heat bus"), SOURCE_CAPACITY),
+                               (("cool source", "cool bus"), SOURCE_CAPACITY),
+                               (("electricity bus", "electricity overflow"), OVERFLOW_CAPACITY),
+                               (("heat bus", "heat overflow"), OVERFLOW_CAPACITY),
+                               (("cool bus", "cool overflow"), OVERFLOW_CAPACITY)]:
+            self.set_block(self.base_upper, flow, capacity)
+
+    # 将某个流的变量块赋值
+    def set_block(self, vector, flow, values):
+        start = self.flow_index[flow]
+        vector[start:start + self.time_step] = values
+
+    # 取出某个流的变量块
+    def get_block(self, vector, flow):
+        start = self.flow_index[flow]
+        return vector[start:start + self.time_step]
+
+    # 目标函数系数
+    def objective_coefficients(self, ele_price, gas_price):
+        c = np.zeros(self.n_vars)
+        self.set_block(c, ("grid", "electricity bus"), ele_price)
+        self.set_block(c, ("gas", "gas bus"), gas_price)
+        self.set_block(c, ("heat source", "heat bus"), SOURCE_COST)
+        self.set_block(c, ("cool source", "cool bus"), SOURCE_COST)
+        return c
+
+    # 等式约束右端项
+    def equality_rhs(self, ele_load, heat_demand, cool_demand, wt_output, pv_output):
+        T = self.time_step
+        b = np.zeros(self.n_rows)
+        ele_row = self.bus_rows["electricity bus"]
+        heat_row = self.bus_rows["heat bus"]
+        cool_row = self.bus_rows["cool bus"]
+        b[ele_row:ele_row + T] = (np.asarray(ele_load, dtype=float) - np.asarray(wt_output, dtype=float)
+                                  - np.asarray(pv_output, dtype=float))
+        b[heat_row:heat_row + T] = heat_demand
+        b[cool_row:cool_row + T] = cool_demand
+        return b
+
+    # 变量上界
+    def upper_bounds(self, gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                     ele_storage_io, heat_storage_io, cool_storage_io):
+        T = self.time_step
+        ub = self.base_upper.copy()
+        self.set_block(ub, ("gas turbine", "electricity bus"), gt_capacity)
+        self.set_block(ub, ("gas turbine", "heat bus"), gt_capacity * 1.5)
+        self.set_block(ub, ("absorption chiller", "cool bus"), ac_capacity)
+        self.set_block(ub, ("electricity heat pump", "heat bus"), ehp_capacity)
+        self.set_block(ub, ("electricity chiller", "cool bus"), ec_capacity)
+        for (label, bus, _, _, _, ratio), storage_io in zip(
+                STORAGES, [ele_storage_io, heat_storage_io, cool_storage_io]):
+            self.set_block(ub, (bus, label), storage_io)
+            self.set_block(ub, (label, bus), storage_io)
+            start = self.content_index[label]
+            ub[start:start + T] = storage_io * ratio
+            ub[self.init_index[label]] = storage_io * ratio
+        return ub
+
+    # 求解并返回结果；initial_storage为各储能的初始电量（按STORAGES顺序），None表示周期平衡
+    def solve(self, ele_price, gas_price, ele_load, heat_demand, cool_demand, wt_output, pv_output,
+              gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+              ele_storage_io, heat_storage_io, cool_storage_io, initial_storage=None):
+        c = self.objective_coefficients(ele_price, gas_price)
+        b = self.equality_rhs(ele_load, heat_demand, cool_demand, wt_output, pv_output)
+        ub = self.upper_bounds(gt_capacity, ehp_capacity, ec_capacity, ac_capacity,
+                               ele_storage_io, heat_storage_io, cool_storage_io)
+        lb = np.zeros(self.n_vars)
+        A_eq = self.A_eq
+        if initial_storage is not None:
+            A_eq = self.A_eq_open
+            b = b[:self.n_open_rows]
+            for (label, *_), content in zip(STORAGES, initial_storage):
+                k = self.init_index[label]
+                lb[k] = ub[k] = min(max(content, 0.0), ub[k])
+        res = linprog(c, A_eq=A_eq, b_eq=b, bounds=np.column_stack((lb, ub)), method="highs")
+        if res.status != 0:
+            raise RuntimeError("HiGHS failed to solve the dispatch problem: %s" % res.message)
+        fixed_flows = dict(zip(FIXED_FLOWS, [wt_output, pv_output, ele_load, heat_demand, cool_demand]))
+        result = self.unpack(res.x, res.fun, fixed_flows)
+        result.sensitivity = self.sensitivity(res, initial_storage is None)
+        return result
+
+    def sensitivity(self, res, balanced=True):
+        """
+        由HiGHS的对偶解得到运行成本对各参数的偏导数：
+        - 设备容量与储能充放功率：对应各流（及储能电量）变量上界的对偶值乘以上界对该容量的系数后求和；
+        - 风电、光伏逐时出力：电母线平衡约束右端项为负荷减去风光出力，偏导数为该约束对偶值的相反数。
+        给定初始电量（非周期平衡）时，初始电量变量被固定，不计入储能容量的偏导数。
+        """
+        upper = res.upper.marginals
+        ele_row = self.bus_rows["electricity bus"]
+        ele_duals = res.eqlin.marginals[ele_row:ele_row + self.time_step]
+        sensitivity = {
+            "wt_output": -ele_duals,
+            "pv_output": -ele_duals,
+            "gt_capacity": self.get_block(upper, ("gas turbine", "electricity bus")).sum()
+            + 1.5 * self.get_block(upper, ("gas turbine", "heat bus")).sum(),
+            "ehp_capacity": self.get_block(upper, ("electricity heat pump", "heat bus")).sum(),
+            "ec_capacity": self.get_block(upper, ("electricity chiller", "cool bus")).sum(),
+            "ac_capacity": self.get_block(upper, ("absorption chiller", "cool bus")).sum(),
+        }
+        for (label, bus, _, _, _, ratio), name in zip(STORAGES, ["ele_storage_io", "heat_storage_io",
+                                                                 "cool_storage_io"]):
+            start = self.content_index[label]
+            content = upper[start:start + self.time_step].sum() + (upper[self.init_index[label]] if balanced else 0)
+            sensitivity[name] = (self.get_block(upper, (bus, label)).sum() + self.get_block(upper, (label, bus)).sum()
+                                 + ratio * content)
+        return {name: np.asarray(value, dtype=float) if np.ndim(value) else float(value)
+                for name, value in sensitivity.items()}
+
+    # 将多个相互独立的子问题拼成块对角LP一次求解，problems中每项为solve()的参数元组，按顺序返回各子问题结果
+    def solve_batch(self, problems):
+        n = len(problems)
+        c = np.concatenate([self.objective_coefficients(*p[:2]) for p in problems])
+        b = np.concatenate([self.equality_rhs(*p[2:7]) for p in problems])
+        ub = np.concatenate([self.upper_bounds(*p[7:]) for p in problems])
+        A_eq = sp.block_diag([self.A_eq] * n, format="csr")
+        res = linprog(c, A_eq=A_eq, b_eq=b, bounds=np.column_stack((np.zeros(n * self.n_vars), ub)),
+                      method="highs")
+        if res.status != 0:
+            raise RuntimeError("HiGHS failed to solve the batched dispatch problem: %s" % res.message)
+        results = []
+        for k, p in enumerate(problems):
+            x = res.x[k * self.n_vars:(k + 1) * self.n_vars]
+            fixed_flows = dict(zip(FIXED_FLOWS, [p[5], p[6], p[2], p[3], p[4]]))
+            results.append(self.unpack(x, c[k * self.n_vars:(k + 1) * self.n_vars] @ x, fixed_flows))
+        return results
+
+    # 将解向量拆分成各流的逐时结果，固定流直接并入
+    def unpack(self, x, objective, fixed_flows):
+        T = self.time_step
+        flows = {flow: x[start:start + T] for flow, start in self.flow_index.items()}
+        for flow, values in fixed_flows.items():
+            flows[flow] = np.asarray(values, dtype=float)
+        storage_content = {label: x[start:start + T] for label, start in self.content_index.items()}
+        return DispatchResult(objective, flows, storage_content)
+
+
+_templates = dict()
+
+
+# 每个时段数的模板在进程内只组装一次
+def get_dispatch_template(time_step):
+    template = _templates.get(time_step)
+    if template is None:
+        template = DispatchTemplate(time_step)
+        _templates[time_step] = template
+    return template
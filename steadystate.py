@@ -0,0 +1,134 @@
+"""
+异步稳态NSGA-II算法模板
+-------------------
+分代的NSGA-II每代都要等种群中最慢的个体评价完成才能进行选择，评价耗时差异大（储能容量大或不可行的设计求解慢）时，
+每代末尾都有工作进程空闲。本模板始终保持in_flight个子代同时在评价：
+- 任一评价结果并入后，种群加入该子代并按非支配层级与拥挤距离删去最差的一个个体（reinsertion），随即锦标赛选择两个父代，
+  交叉得到一个子代并变异后提交评价，工作进程始终有任务；
+- ordered=True（默认）时评价结果按提交顺序并入种群：第j个子代只取决于前j - in_flight个评价结果与随机数状态，
+  固定随机数种子且评价结果确定时，进化过程与各评价完成的先后无关，可以复现；先提交的个体求解慢时后提交的结果暂存等待，
+  in_flight是算法参数，不随进程池大小变化，取工作进程数的2倍左右可使工作进程基本不空闲；
+  ordered=False时按完成顺序并入，工作进程利用率最高，但不可复现；
+- 初始种群仍一次性评价；此后每并入NIND个评价结果记为一代，最大代数MAXGEN、日志、外部非支配存档的超体积与提前结束、
+  检查点及各阶段计时均按代进行，评价次数与分代模式相同；
+- 检查点另外保存已提交、尚未并入的子代，恢复后按原顺序重新提交，ordered=True时与不中断的运行一致；
+- 评价结果缓存照常使用（提交前查询，并入时写入）。代理模型预筛选、多保真度评价、提前终止、模因局部搜索与块对角批量求解
+  都以整代为单位，不能与本模板同时使用；PoolType须为'Thread'、'Process'、'Distributed'或'Service'。
+"""
+import os
+import copy
+import time
+import queue
+import numpy as np
+import geatpy as ea
+from checkpoint import moea_NSGA2_checkpoint_templet
+
+
+class moea_NSGA2_steady_templet(moea_NSGA2_checkpoint_templet):
+    def __init__(self, problem, population, checkpoint_path='Result/checkpoint.npz', checkpoint_interval=5,
+                 resume=False, in_flight=16, ordered=True):
+        moea_NSGA2_checkpoint_templet.__init__(self, problem, population, checkpoint_path, checkpoint_interval, resume)
+        for name in ('surrogate', 'fidelity', 'memetic_size', 'batch_size'):
+            if getattr(problem, name, None) is not None:
+                raise ValueError("the steady-state templet does not support %s" % name)
+        if getattr(problem, 'early_stop', False):
+            raise ValueError("the steady-state templet does not support early_stop")
+        if in_flight < 1:
+            raise ValueError("in_flight must be at least 1")
+        # 同时在评价的子代数；属于算法参数，不随工作进程数变化，固定随机数种子时进化过程与进程池大小无关
+        self.in_flight = in_flight
+        if in_flight < problem.worker_count():
+            print("in_flight (%d) is smaller than the number of workers (%d), some workers will be idle"
+                  % (in_flight, problem.worker_count()))
+        self.ordered = ordered
+        self.pending = dict()  # 任务号 -> 已提交、尚未并入种群的子代染色体，按提交顺序
+        self.arrived = dict()  # 任务号 -> 已完成、尚未并入的(容量向量, 目标函数值, 统计)
+        self.done = queue.Queue()  # 进程池回调线程放入完成的评价结果
+        self.next_ticket = 0
+
+    def extra_state(self):
+        Chrom = list(self.pending.values())
+        return {'steady_pending': np.array(Chrom) if Chrom else np.zeros((0, self.population.Lind))}
+
+    def restore_extra_state(self, checkpoint):
+        if 'steady_pending' in checkpoint:
+            self.pending = {-1 - i: Chrom for i, Chrom in enumerate(checkpoint['steady_pending'])}
+
+    def make_offspring(self, population):
+        # 锦标赛选择两个父代，交叉得到一个子代后变异
+        parents = population[ea.selecting(self.selFunc, population.FitnV, 2)]
+        recOper = copy.copy(self.recOper)
+        recOper.Half_N = True
+        Chrom = recOper.do(parents.Chrom)
+        return self.mutOper.do(population.Encoding, Chrom, population.Field)[0]
+
+    def submit(self, Chrom, population):
+        ticket = self.next_ticket
+        self.next_ticket += 1
+        if population.Encoding == 'RI':
+            Chrom = self.problem.repair(Chrom)  # 实数编码的染色体即决策变量，与评价的设计（储能修正后）一致
+        self.pending[ticket] = Chrom
+        Phen = ea.Population(population.Encoding, population.Field, 1, Chrom.reshape(1, -1)).decoding()
+        self.problem.submit_async(ticket, Phen[0], self.done)
+
+    def receive(self):
+        ticket, row, objv, stats = self.done.get()
+        self.arrived[ticket] = (row, objv, stats)
+
+    def evolve_generation(self, population, NIND):
+        # 并入NIND个评价结果（一代），每并入一个即提交一个新子代
+        start_time = time.perf_counter()
+        cache = getattr(self.problem, 'cache', None)
+        cache_hits = cache.hits if cache is not None else 0
+        for _ in range(NIND):
+            while len(self.pending) < self.in_flight:
+                self.submit(self.make_offspring(population), population)
+            if self.ordered:
+                ticket = next(iter(self.pending))
+                while ticket not in self.arrived:
+                    self.receive()
+            else:
+                if not self.arrived:
+                    self.receive()
+                ticket = next(iter(self.arrived))
+            row, objv, stats = self.arrived.pop(ticket)
+            Chrom = self.pending.pop(ticket)
+            objv = self.problem.finish_async(row, objv, stats)
+            offspring = ea.Population(population.Encoding, population.Field, 1, Chrom.reshape(1, -1),
+                                      objv.reshape(1, -1), np.ones((1, 1)), None, row.reshape(1, -1))
+            population = self.reinsertion(population, offspring, NIND)
+            self.evalsNum += 1
+        self.problem.record_generation(time.perf_counter() - start_time, NIND,
+                                       cache.hits - cache_hits if cache is not None else 0)
+        return population
+
+    def run(self, prophetPop=None):  # prophetPop为先知种群（即包含先验知识的种群）
+        # ==========================初始化配置===========================
+        population = self.population
+        NIND = population.sizes
+        self.initialization()  # 初始化算法模板的一些动态参数
+        # ===========================准备进化============================
+        if self.resume and os.path.exists(self.checkpoint_path):
+            population = self.load_checkpoint(population)
+        else:
+            population.initChrom()  # 初始化种群染色体矩阵
+            self.call_aimFunc(population)  # 计算种群的目标函数值
+            # 插入先验知识
+            if prophetPop is not None:
+                population = (prophetPop + population)[:NIND]  # 插入先知种群
+            [levels, criLevel] = self.ndSort(population.ObjV, NIND, None, population.CV,
+                                             self.problem.maxormins)  # 对NIND个个体进行非支配分层
+            population.FitnV = (1 / levels).reshape(-1, 1)  # 直接根据levels来计算初代个体的适应度
+            if self.checkpoint_interval:
+                self.save_checkpoint(population)
+        # 检查点中已提交、尚未并入的子代按原顺序重新提交
+        pending, self.pending = self.pending, dict()
+        for Chrom in pending.values():
+            self.submit(Chrom, population)
+        # ===========================开始进化============================
+        while self.terminated(population) == False:
+            population = self.evolve_generation(population, NIND)
+            # 检查点保存在下一次terminated()之前，恢复后从同一位置继续
+            if self.checkpoint_interval and self.currentGen % self.checkpoint_interval == 0:
+                self.save_checkpoint(population)
+        return self.finishing(population)  # 调用finishing完成后续工作并返回结果
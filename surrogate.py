@@ -0,0 +1,130 @@
+"""
+代理模型预筛选
+-------------------
+每个个体的真实评价需要求解全部典型日的运行优化，而NSGA-II的子代大多在重插入时被淘汰。
+这里用已真实评价过的全部方案（9维容量 → [经济目标, 源荷匹配目标]）拟合径向基函数（RBF）插值模型：
+- 容量按决策变量上界归一化，两个目标分别标准化；核函数为三次径向基 r^3，附加线性多项式项；
+- 不确定度取候选方案到最近训练点的距离（以训练点间平均最近距离为单位），
+  乘以模型的留一交叉验证均方根误差（Rippa公式，无需重复拟合）换算为目标值的误差幅度；
+- 按“乐观预测值”（预测值减去kappa倍不确定度）进行非支配排序，同一层中不确定度大的优先，
+  只把排名靠前的fraction比例交给真实评价，其余个体使用保守预测值（加上kappa倍不确定度）并由MyProblem标记；
+- 每retrain_interval代（或新增真实评价点累计达到retrain_points个）重新拟合一次，训练点最多保留最近的max_points个。
+"""
+import numpy as np
+import geatpy as ea
+
+
+class RBFModel:
+    def __init__(self, smoothing=1e-8):
+        self.smoothing = smoothing
+        self.X = None
+        self.weights = None
+        self.spacing = 1.0
+        self.error = None
+
+    @staticmethod
+    def kernel(distance):
+        return distance ** 3
+
+    @staticmethod
+    def distances(A, B):
+        # A、B之间两两欧氏距离
+        squared = (A ** 2).sum(1)[:, None] + (B ** 2).sum(1)[None, :] - 2 * A @ B.T
+        return np.sqrt(np.maximum(squared, 0))
+
+    def fit(self, X, Y):
+        n, dim = X.shape
+        phi = self.kernel(self.distances(X, X)) + self.smoothing * np.eye(n)
+        P = np.hstack([np.ones((n, 1)), X])
+        A = np.block([[phi, P], [P.T, np.zeros((dim + 1, dim + 1))]])
+        b = np.vstack([Y, np.zeros((dim + 1, Y.shape[1]))])
+        try:
+            A_inv = np.linalg.inv(A)
+        except np.linalg.LinAlgError:
+            A_inv = np.linalg.pinv(A)
+        self.weights = A_inv @ b
+        # 留一误差：去掉第i个训练点后在该点的预测误差为 weights_i / (A^-1)_ii
+        residuals = self.weights[:n] / np.diag(A_inv)[:n, None]
+        self.error = np.sqrt((residuals ** 2).mean(0))
+        self.X = X
+        # 训练点间的平均最近距离，作为不确定度的单位
+        if n > 1:
+            d = self.distances(X, X) + np.diag(np.full(n, np.inf))
+            self.spacing = max(float(d.min(1).mean()), 1e-12)
+
+    def predict(self, X):
+        d = self.distances(X, self.X)
+        P = np.hstack([np.ones((X.shape[0], 1)), X])
+        Y = self.kernel(d) @ self.weights[:self.X.shape[0]] + P @ self.weights[self.X.shape[0]:]
+        return Y, d.min(1) / self.spacing
+
+
+class SurrogateScreen:
+    def __init__(self, lb, ub, maxormins, fraction=0.3, retrain_interval=5, retrain_points=None,
+                 min_points=30, max_points=1000, kappa=1.0):
+        self.lb = np.asarray(lb, dtype=float)
+        self.scale = np.maximum(np.asarray(ub, dtype=float) - self.lb, 1e-12)
+        self.maxormins = np.asarray(maxormins)
+        self.fraction = fraction  # 每代交给真实评价的比例
+        self.retrain_interval = retrain_interval  # 每隔多少代重新拟合
+        self.retrain_points = retrain_points  # 新增多少真实评价点后提前重新拟合，None表示不提前
+        self.min_points = min_points  # 训练点少于该数目时全部真实评价
+        self.max_points = max_points
+        self.kappa = kappa
+        self.archive = dict()  # 真实评价结果，键为容量向量的字节串，按插入顺序保存
+        self.model = None
+        self.screen_count = 0
+        self.new_points = 0
+        self.true_evaluations = 0
+        self.predicted_evaluations = 0
+
+    # 加入真实评价结果，求解失败（非有限值）的不参与拟合
+    def add(self, Vars, ObjV):
+        for x, y in zip(np.asarray(Vars, dtype=float), np.asarray(ObjV, dtype=float)):
+            if np.all(np.isfinite(y)):
+                key = x.tobytes()
+                if key not in self.archive:
+                    self.new_points += 1
+                self.archive.pop(key, None)
+                self.archive[key] = (x, y)
+
+    def fit(self):
+        points = list(self.archive.values())[-self.max_points:]
+        X = (np.array([x for x, _ in points]) - self.lb) / self.scale
+        Y = np.array([y for _, y in points])
+        self.y_mean = Y.mean(0)
+        self.y_std = np.maximum(Y.std(0), 1e-12)
+        self.model = RBFModel()
+        self.model.fit(X, (Y - self.y_mean) / self.y_std)
+        self.new_points = 0
+
+    def predict(self, Vars):
+        Y, uncertainty = self.model.predict((np.asarray(Vars, dtype=float) - self.lb) / self.scale)
+        return Y * self.y_std + self.y_mean, uncertainty
+
+    def needs_retrain(self):
+        return self.model is None or self.screen_count % self.retrain_interval == 0 or \
+            (self.retrain_points is not None and self.new_points >= self.retrain_points)
+
+    # 返回需要真实评价的个体下标，以及其余个体的预测值
+    def screen(self, Vars):
+        n = Vars.shape[0]
+        self.screen_count += 1
+        if len(self.archive) < self.min_points:
+            self.true_evaluations += n
+            return np.arange(n), np.zeros((0, len(self.maxormins)))
+        if self.needs_retrain():
+            self.fit()
+        predicted, uncertainty = self.predict(Vars)
+        # 乐观估计：按优化方向减去kappa倍不确定度
+        margin = self.kappa * uncertainty[:, None] * self.model.error * self.y_std * self.maxormins
+        optimistic = predicted - margin
+        [levels, _] = ea.ndsortESS(optimistic, n, None, None, self.maxormins)
+        order = np.lexsort([-uncertainty, levels])
+        n_true = min(n, max(1, int(np.ceil(self.fraction * n))))
+        selected = np.sort(order[:n_true])
+        rest = np.setdiff1d(np.arange(n), selected)
+        self.true_evaluations += n_true
+        self.predicted_evaluations += len(rest)
+        # 未真实评价的个体取保守估计，避免预测误差使其在重插入中挤掉真实评价过的个体
+        return selected, (predicted + margin)[rest]
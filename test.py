@@ -1,18 +1,11 @@
-import pandas as pd
 import numpy as np
+from dataloader import load_operation_data, load_typical_days
 
-typical_data = pd.read_excel('typicalDayData.xlsx')
-typical_days = dict()
-typical_day_id = typical_data["typicalDayId"]
-days_str = typical_data["days"]
-for i in range(len(typical_day_id)):
-    days_list = list(map(int, days_str[i].split(",")))
-    typical_days[typical_day_id[i]] = days_list
+typical_days = load_typical_days('typicalDayData.xlsx')
 print(typical_days)
 print(typical_days[29])
 
-operation_data = pd.read_csv('mergedData.csv')
-operation_list = np.array(operation_data).tolist()
-a = [operation_list[t][0] for t in range(8760)]
-print([operation_list[t][0] for t in range(8760)])
+operation_list = load_operation_data('mergedData.csv')
+a = operation_list[:, 0].tolist()
+print(a)
 print(np.mean(a))
@@ -0,0 +1,44 @@
+import os
+import numpy as np
+import geatpy as ea
+from checkpoint import moea_NSGA2_checkpoint_templet
+
+
+class ZDT1(ea.Problem):
+    # 评价确定、求解极快的双目标测试问题
+    def __init__(self):
+        ea.Problem.__init__(self, 'ZDT1', 2, [1, 1], 5, [0] * 5, [0] * 5, [1] * 5, [1] * 5, [1] * 5)
+
+    def aimFunc(self, pop):
+        x = pop.Phen
+        g = 1 + 9 * x[:, 1:].mean(axis=1)
+        pop.ObjV = np.column_stack([x[:, 0], g * (1 - np.sqrt(x[:, 0] / g))])
+
+
+def run(path, maxgen, interval, resume=False, seed=3):
+    problem = ZDT1()
+    Field = ea.crtfld('RI', problem.varTypes, problem.ranges, problem.borders)
+    np.random.seed(seed)
+    algorithm = moea_NSGA2_checkpoint_templet(problem, ea.Population('RI', Field, 20), path, interval, resume)
+    algorithm.MAXGEN = maxgen
+    algorithm.verbose = False
+    algorithm.drawing = 0
+    algorithm.logTras = 0
+    _, population = algorithm.run()
+    return population
+
+
+def test_resume_gives_identical_results(tmp_path):
+    path = str(tmp_path / "checkpoint.npz")
+    straight = run(path, 10, 0)
+    run(path, 4, 2, seed=3)
+    # 恢复时的随机数状态取自检查点，与此处的种子无关
+    resumed = run(path, 10, 2, resume=True, seed=99)
+    assert np.array_equal(straight.Chrom, resumed.Chrom)
+    assert np.array_equal(straight.ObjV, resumed.ObjV)
+
+
+def test_zero_interval_writes_no_checkpoint(tmp_path):
+    path = str(tmp_path / "checkpoint.npz")
+    run(path, 3, 0)
+    assert not os.path.exists(path)
@@ -0,0 +1,39 @@
+import itertools
+import numpy as np
+import pytest
+from clustering import pam, clara, pairwise_sq_distances, cluster_typical_days, reconstruction_error
+from dataloader import load_operation_data
+
+
+def test_pam_finds_optimal_medoids_on_small_problem():
+    rng = np.random.RandomState(0)
+    X = np.vstack([rng.normal(center, 0.3, (5, 2)) for center in [(0, 0), (4, 0), (0, 4)]])
+    D = pairwise_sq_distances(X)
+    medoids, labels, cost = pam(D, 3)
+    best = min(D[:, list(c)].min(1).sum() for c in itertools.combinations(range(len(X)), 3))
+    assert cost == pytest.approx(best, rel=1e-12)
+    assert np.array_equal(labels, np.argmin(D[:, medoids], axis=1))
+
+
+def test_clara_cost_matches_labels():
+    rng = np.random.RandomState(1)
+    X = rng.rand(60, 3)
+    medoids, labels, cost = clara(X, 4, sample_size=30)
+    D = pairwise_sq_distances(X, X[medoids])
+    assert cost == pytest.approx(D[np.arange(len(X)), labels].sum(), rel=1e-12)
+
+
+def test_typical_days_partition_the_year():
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = cluster_typical_days(operation_list, 6)
+    assert len(typical_days) == 6
+    assert list(typical_days) == sorted(typical_days)
+    assert sorted(d for days in typical_days.values() for d in days) == list(range(1, 366))
+    assert all(medoid in days for medoid, days in typical_days.items())
+
+
+def test_reconstruction_error_decreases_with_k():
+    operation_list = load_operation_data('mergedData.csv')
+    errors = [reconstruction_error(operation_list, cluster_typical_days(operation_list, k))["nrmse_mean"]
+              for k in (2, 6, 14)]
+    assert errors[0] > errors[1] > errors[2] > 0
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pytest
+from dataloader import atomic_save, cache_paths, load_operation_data, load_typical_days
+
+HEADER = "ele_load(kW),heat_load(kW),cool_load(kW),solarRadiation(W/m-2),windSpeed(m/s),temperature(C)\n"
+
+
+def write_csv(path, rows):
+    path.write_text(HEADER + "".join(",".join("%g" % v for v in row) + "\n" for row in rows))
+
+
+def test_operation_cache_is_rebuilt_when_the_csv_changes(tmp_path):
+    csv_path = tmp_path / "mergedData.csv"
+    write_csv(csv_path, [[1, 2, 3, 4, 5, 6], [7, 8, 9, 10, 11, 12]])
+    assert load_operation_data(str(csv_path)).tolist() == [[1, 2, 3, 4, 5, 6], [7, 8, 9, 10, 11, 12]]
+    data_path, meta_path = cache_paths(str(csv_path), ".npy")
+    assert os.path.exists(data_path) and os.path.exists(meta_path)
+    # 大小相同、内容不同：由修改时间判断缓存已过期
+    write_csv(csv_path, [[9, 2, 3, 4, 5, 6], [7, 8, 9, 10, 11, 12]])
+    stat = os.stat(csv_path)
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_operation_data(str(csv_path))[0, 0] == 9
+    # 大小改变
+    write_csv(csv_path, [[1, 2, 3, 4, 5, 6]])
+    assert load_operation_data(str(csv_path)).shape == (1, 6)
+    # 源文件未变时直接读取缓存，不再解析csv
+    os.remove(data_path)
+    np.save(data_path, np.zeros((1, 6)))
+    assert load_operation_data(str(csv_path)).tolist() == [[0] * 6]
+
+
+def test_typical_day_cache_is_rebuilt_when_the_xlsx_changes(tmp_path):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("openpyxl")
+    xlsx_path = tmp_path / "typicalDayData.xlsx"
+    pd.DataFrame({"typicalDayId": [3, 10], "days": ["1,2,3", "10"]}).to_excel(xlsx_path, index=False)
+    assert load_typical_days(str(xlsx_path)) == {3: [1, 2, 3], 10: [10]}
+    pd.DataFrame({"typicalDayId": [2], "days": ["1,2,3,10"]}).to_excel(xlsx_path, index=False)
+    stat = os.stat(xlsx_path)
+    os.utime(xlsx_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_typical_days(str(xlsx_path)) == {2: [1, 2, 3, 10]}
+
+
+def test_atomic_save_leaves_no_partial_file(tmp_path):
+    path = str(tmp_path / "sub" / "state.npz")
+    atomic_save(path, lambda tmp: np.savez(tmp, x=np.arange(3)))
+    with np.load(path) as state:
+        assert state["x"].tolist() == [0, 1, 2]
+
+    def failing_save(tmp):
+        with open(tmp, "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        atomic_save(path, failing_save)
+    # 原文件保持不变，临时文件已删除
+    assert os.listdir(os.path.dirname(path)) == ["state.npz"]
+    with np.load(path) as state:
+        assert state["x"].tolist() == [0, 1, 2]
@@ -0,0 +1,48 @@
+import time
+import threading
+import pytest
+from functools import partial
+from distributed import DistributedPool
+
+# 客户端断开时multiprocessing.managers的服务线程以SystemExit退出
+pytestmark = pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+
+
+def slow_square(x, offset=0):
+    time.sleep(0.2)
+    return x * x + offset
+
+
+def test_tasks_of_a_lost_worker_are_requeued():
+    pool = DistributedPool(None, (), "127.0.0.1:0", local_workers=2, heartbeat_timeout=1.5, poll_interval=0.1)
+    try:
+        # 运行中途杀死一个本机工作进程，其正在求解的任务在心跳超时后由另一个工作进程重新求解
+        killer = threading.Timer(1.0, pool.local_workers[0].kill)
+        killer.start()
+        assert pool.map(slow_square, range(20)) == [k * k for k in range(20)]
+        killer.join()
+        stats = pool.pop_stats()
+        assert stats["lost_workers"] == 1 and stats["requeued"] >= 1
+    finally:
+        pool.close()
+
+
+def test_each_task_runs_its_own_function():
+    pool = DistributedPool(None, (), "127.0.0.1:0", local_workers=1, poll_interval=0.1)
+    results = dict()
+    done = threading.Event()
+
+    def callback(key, value):
+        results[key] = value
+        if len(results) == 6:
+            done.set()
+
+    try:
+        # 先提交的任务尚未领取时提交使用另一个函数的任务，各任务仍按各自的函数求解
+        for k in range(3):
+            pool.apply_async(slow_square, (k,), callback=partial(callback, ("plain", k)))
+            pool.apply_async(partial(slow_square, offset=100), (k,), callback=partial(callback, ("offset", k)))
+        assert done.wait(30)
+        assert results == {**{("plain", k): k * k for k in range(3)}, **{("offset", k): k * k + 100 for k in range(3)}}
+    finally:
+        pool.close()
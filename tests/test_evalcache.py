@@ -0,0 +1,56 @@
+import numpy as np
+from evalcache import EvaluationCache, data_fingerprint
+
+
+def test_round_trip_with_quantized_keys(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "cache.sqlite"), "hash", resolution=1.0)
+    design = np.array([100.2, 200.0, 0, 0, 0, 0, 0, 0, 0])
+    cache.put(design, [1.5, 2.5])
+    # 量化到同一网格点的设计命中同一条目
+    assert cache.get(design + 0.2) == [1.5, 2.5]
+    assert cache.get(design + 1.0) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_failed_results_are_not_cached(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "cache.sqlite"), "hash")
+    cache.put_many([np.zeros(9), np.ones(9)], [[float("inf"), float("inf")], [1.0, 2.0]])
+    assert cache.get_many([np.zeros(9), np.ones(9)]) == [None, [1.0, 2.0]]
+
+
+def test_data_hash_separates_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    EvaluationCache(path, "old").put(np.zeros(9), [1.0, 2.0])
+    assert EvaluationCache(path, "new").get(np.zeros(9)) is None
+    assert EvaluationCache(path, "old").get(np.zeros(9)) == [1.0, 2.0]
+
+
+def test_data_fingerprint_depends_on_prices_and_extra(tmp_path):
+    data = tmp_path / "data.csv"
+    data.write_text("1,2,3\n")
+    base = data_fingerprint([str(data)], [0.1], [0.2], "highs")
+    assert base == data_fingerprint([str(data)], [0.1], [0.2], "highs")
+    assert base != data_fingerprint([str(data)], [0.2], [0.2], "highs")
+    assert base != data_fingerprint([str(data)], [0.1], [0.2], ("highs", "batch"))
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "cache.sqlite"), "hash", max_entries=10)
+    designs = [np.full(9, float(k)) for k in range(10)]
+    for k, design in enumerate(designs):
+        cache.put(design, [k, k])
+    cache.get(designs[0])  # 最早写入的条目刚被访问过，不应被淘汰
+    cache.put(np.full(9, 10.0), [10, 10])
+    count = cache.connection().execute("SELECT COUNT(*) FROM evaluations").fetchone()[0]
+    assert count == 9  # 超出上限后淘汰到上限的90%
+    assert cache.get(designs[0]) == [0, 0]
+    assert cache.get(designs[1]) is None
+
+
+def test_backup_and_merge(tmp_path):
+    cache = EvaluationCache(str(tmp_path / "cache.sqlite"), "hash")
+    cache.put(np.zeros(9), [1.0, 2.0])
+    cache.backup(str(tmp_path / "backup.sqlite"))
+    other = EvaluationCache(str(tmp_path / "other.sqlite"), "hash")
+    other.merge(str(tmp_path / "backup.sqlite"))
+    assert other.get(np.zeros(9)) == [1.0, 2.0]
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from fastdispatch import dispatch_storage_free, clamp_storage, is_storage_free
+from sparselp import get_dispatch_template
+from dataloader import load_operation_data, load_typical_days
+from gaproblem import subAimFunc, get_typical_day_arrays, cal_renewable_profiles, ELE_PRICE, GAS_PRICE
+
+UPPER = np.array([10000, 10000, 10000, 3000, 1000, 1000, 20000, 6000, 2000], dtype=float)
+
+
+def storage_free_designs(n, seed):
+    designs = np.random.default_rng(seed).uniform(0, 1, (n, 9)) * UPPER
+    designs[:, 6:9] = 0
+    return designs
+
+
+def test_valid_days_match_the_lp():
+    operation_list = load_operation_data('mergedData.csv')
+    medoids, day_data, _ = get_typical_day_arrays(operation_list, load_typical_days('typicalDayData.xlsx'))
+    template = get_dispatch_template(24)
+    designs = storage_free_designs(8, 0)
+    pv_outputs, wt_outputs = cal_renewable_profiles(designs, day_data)
+    checked = 0
+    for n, (ppv, pwt, pgt, php, pec, pac, _, _, _) in enumerate(designs):
+        cost, results, valid, degenerate = dispatch_storage_free(
+            ELE_PRICE, GAS_PRICE, day_data[:, :, 0], day_data[:, :, 1], day_data[:, :, 2],
+            wt_outputs[n], pv_outputs[n], pgt, php, pec, pac)
+        assert not np.any(valid & degenerate)
+        for k in np.flatnonzero(valid):
+            lp = template.solve(ELE_PRICE, GAS_PRICE, day_data[k, :, 0], day_data[k, :, 1], day_data[k, :, 2],
+                                wt_outputs[n, k], pv_outputs[n, k], pgt, php, pec, pac, 0, 0, 0)
+            assert cost[k] == pytest.approx(lp.objective, rel=1e-8)
+            for symbol, flow in lp.complementary_results().items():
+                np.testing.assert_allclose(results[symbol][k], flow, rtol=1e-7, atol=1e-6)
+            checked += 1
+    assert checked > 0
+
+
+def test_subaimfunc_fast_path_matches_lp_objectives():
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    designs = storage_free_designs(6, 1)
+    for i in range(len(designs)):
+        lp = subAimFunc((i, designs, operation_list, typical_days), engine='highs')
+        fast = subAimFunc((i, designs, operation_list, typical_days), engine='highs', storage_threshold=0.0)
+        assert fast == pytest.approx(lp, rel=1e-9)
+
+
+def test_small_storage_is_evaluated_as_storage_free():
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    design = storage_free_designs(1, 2)
+    small = design.copy()
+    small[0, 6:9] = [0.05, 0.08, 0.02]
+    lp = subAimFunc((0, design, operation_list, typical_days), engine='highs')
+    fast = subAimFunc((0, small, operation_list, typical_days), engine='highs', storage_threshold=0.1)
+    assert fast == pytest.approx(lp, rel=1e-9)
+
+
+def test_clamp_storage():
+    Vars = np.array([[1, 2, 3, 4, 5, 6, 0.05, 0.1, 0.0], [1, 2, 3, 4, 5, 6, 0.05, 0.2, 0.0]])
+    clamped = clamp_storage(Vars, 0.1)
+    assert clamped[0, 6:].tolist() == [0, 0, 0]
+    assert clamped[1].tolist() == Vars[1].tolist()
+    assert clamp_storage(Vars[0], 0.1)[6:].tolist() == [0, 0, 0]
+    assert Vars[0, 6] == 0.05  # 不修改输入
+    assert is_storage_free(0.05, 0.1, 0.0, 0.1) and not is_storage_free(0.05, 0.2, 0.0, 0.1)
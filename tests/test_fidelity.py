@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from fidelity import FidelitySchedule, coarsen_typical_days, build_fidelity_levels
+from dataloader import load_operation_data, load_typical_days
+
+
+def test_coarsened_partition_keeps_all_days():
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    coarse = coarsen_typical_days(typical_days, load_operation_data('mergedData.csv'), 4)
+    assert len(coarse) == 4
+    assert set(coarse) <= set(typical_days)
+    assert sorted(d for days in coarse.values() for d in days) == sorted(d for days in typical_days.values()
+                                                                         for d in days)
+
+
+def test_levels_end_with_full_partition():
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    levels = build_fidelity_levels(typical_days, load_operation_data('mergedData.csv'), [4, 2, 100])
+    assert [len(level) for level in levels] == [2, 4, len(typical_days)]
+
+
+def test_scheduled_switches_reach_full_level():
+    schedule = FidelitySchedule([{1: [1]}, {1: [1], 2: [2]}, {1: [1], 2: [2], 3: [3]}], [2, 4], patience=100)
+    front = np.zeros((1, 9))
+    assert [schedule.update(g, front + g) for g in range(6)] == [False, False, True, False, True, False]
+    assert schedule.is_full()
+
+
+def test_stagnation_switches_ahead_of_schedule():
+    schedule = FidelitySchedule([{1: [1]}, {1: [1], 2: [2]}, {1: [1], 2: [2], 3: [3]}], [100, 200], patience=1)
+    front = np.zeros((1, 9))
+    assert [schedule.update(g, front) for g in range(5)] == [False, True, False, True, False]
+    assert schedule.is_full()
+
+
+def test_short_switch_schedule_is_rejected():
+    with pytest.raises(ValueError):
+        FidelitySchedule([{1: [1]}, {1: [1], 2: [2]}, {1: [1], 2: [2], 3: [3]}], [10])
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+from dataloader import load_operation_data, load_typical_days
+from operation import OperationModel
+from gaproblem import cal_solar_output, cal_wind_output, cal_complementary_obj, get_typical_day_arrays, \
+    cal_renewable_profiles, cal_economic_obj, cal_complementary_lower_bound, is_dominated_by, subAimFunc, \
+    DominatedObjective, TIME_STEP, ELE_PRICE, GAS_PRICE
+
+UPPER = np.array([10000, 10000, 10000, 3000, 1000, 1000, 20000, 6000, 2000])
+
+
+# 改为向量化之前的逐时计算
+def baseline_solar_output(solar_radiation_list, temperature_list, ppv):
+    return [ppv * 0.9 * r / 1000 * (1 - 0.0035 * (t - 25)) for r, t in zip(solar_radiation_list, temperature_list)]
+
+
+def baseline_wind_output(wind_speed_list, pwt):
+    ret = [0 for _ in range(len(wind_speed_list))]
+    for i in range(len(wind_speed_list)):
+        w = wind_speed_list[i]
+        if 2.5 <= w < 9:
+            ret[i] = (w ** 3 - 2.5 ** 3) / (9 ** 3 - 2.5 ** 3) * pwt
+        elif 9 <= w < 25:
+            ret[i] = pwt
+    return ret
+
+
+def baseline_net_load(results, typical_days, source, overflow):
+    # 各典型日的逐时结果展开到其代表的日期，未被代表的小时为0
+    net_load = [0 for _ in range(8760)]
+    for medoid, days in typical_days.items():
+        for d in days:
+            for i in range(24):
+                if results[medoid][source][i] >= results[medoid][overflow][i]:
+                    net_load[(d - 1) * 24 + i] = results[medoid][source][i]
+                else:
+                    net_load[(d - 1) * 24 + i] = 0 - results[medoid][overflow][i]
+    return net_load
+
+
+def simple_dispatch(load, supply):
+    # 不经LP的简单平衡：缺额由外部补充，多余部分弃掉
+    return np.maximum(load - supply, 0), np.maximum(supply - load, 0)
+
+
+@pytest.mark.parametrize("day_count", [None, 5])
+def test_vectorized_complementary_obj_matches_hourly_baseline(day_count):
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    if day_count is not None:
+        # 只保留部分典型日，全年有未被代表的小时
+        typical_days = dict(list(typical_days.items())[:day_count])
+    medoids, day_data, weights = get_typical_day_arrays(operation_list, typical_days)
+    rng = np.random.default_rng(6)
+    for ppv, pwt, pgt in rng.uniform(0, 5000, (4, 3)):
+        results = dict()
+        for k, medoid in enumerate(medoids):
+            rows = [operation_list[(medoid - 1) * 24 + t] for t in range(24)]
+            pv = baseline_solar_output([r[3] for r in rows], [r[5] for r in rows], ppv)
+            wt = baseline_wind_output([r[4] for r in rows], pwt)
+            np.testing.assert_allclose(cal_solar_output(day_data[k, :, 3], day_data[k, :, 5], ppv), pv, rtol=1e-12)
+            np.testing.assert_allclose(cal_wind_output(day_data[k, :, 4], pwt), wt, rtol=1e-12)
+            supply = np.array(pv) + np.array(wt)
+            grid, ele_overflow = simple_dispatch(np.array([r[0] for r in rows]), supply + pgt / 2)
+            heat, heat_overflow = simple_dispatch(np.array([r[1] for r in rows]), np.full(24, pgt / 3))
+            cool, cool_overflow = simple_dispatch(np.array([r[2] for r in rows]), np.full(24, pgt / 4))
+            results[medoid] = {"grid": grid, "electricity overflow": ele_overflow, "heat source": heat,
+                               "heat overflow": heat_overflow, "cool source": cool, "cool overflow": cool_overflow}
+        expected = sum(np.std(baseline_net_load(results, typical_days, source, overflow))
+                       for source, overflow in [("grid", "electricity overflow"), ("heat source", "heat overflow"),
+                                                ("cool source", "cool overflow")])
+        stacked = {symbol: np.array([results[m][symbol] for m in medoids]) for symbol in results[medoids[0]]}
+        np.testing.assert_allclose(cal_complementary_obj(stacked, weights), expected, rtol=1e-10)
+
+
+def random_designs(n, seed):
+    return np.random.default_rng(seed).uniform(0, UPPER / 2, (n, 9))
+
+
+def test_lower_bounds_never_exceed_the_full_objectives():
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    medoids, day_data, weights = get_typical_day_arrays(operation_list, typical_days)
+    order = np.argsort(-weights, kind='stable')  # 与提前终止的求解顺序相同
+    for capacities in random_designs(4, 15):
+        economic, complementary = subAimFunc((0, capacities[None], operation_list, typical_days), engine='highs')
+        pv_outputs, wt_outputs = cal_renewable_profiles(capacities[None], day_data)
+        day_oc, day_results = dict(), dict()
+        for k in order[:-1]:
+            model = OperationModel('01/01/2019', TIME_STEP, ELE_PRICE, GAS_PRICE, day_data[k, :, 0],
+                                   day_data[k, :, 1], day_data[k, :, 2], wt_outputs[0, k], pv_outputs[0, k],
+                                   *capacities[2:], engine='highs')
+            model.optimise()
+            day_oc[k], day_results[k] = model.get_objective_value(), model.get_complementary_results()
+            solved = list(day_oc)
+            economic_lb = cal_economic_obj(capacities, 0) + sum(day_oc[j] * weights[j] for j in solved)
+            complementary_lb = cal_complementary_lower_bound([day_results[j] for j in solved], weights[solved],
+                                                             weights.sum())
+            assert economic_lb <= economic * (1 + 1e-9)
+            assert complementary_lb <= complementary * (1 + 1e-9)
+
+
+def test_early_stop_only_skips_dominated_designs():
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    rng = np.random.default_rng(16)
+    stopped = 0
+    for capacities in random_designs(4, 16):
+        args = (0, capacities[None], operation_list, typical_days)
+        full = np.array(subAimFunc(args, engine='highs'))
+        for _ in range(3):
+            # 存档点在真实目标值附近随机分布，可能支配也可能不支配该设计
+            archive = full * rng.uniform(0.9, 1.1, (3, 2))
+            result = subAimFunc(args, engine='highs', archive=archive)
+            if isinstance(result, DominatedObjective):
+                stopped += 1
+                assert is_dominated_by(archive, *full)
+            else:
+                np.testing.assert_allclose(result, full, rtol=1e-9)
+    assert stopped > 0
+
+
+def test_economic_gradient_matches_finite_differences():
+    # 经济目标是容量的凸函数（热/冷储能固定投资的阶跃除外，设计中两者远离0.1），梯度应位于向后与向前差分之间
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days('typicalDayData.xlsx')
+    capacities = np.array([1710.86, 1648.98, 2217.91, 300.0, 200.0, 305.72, 150.0, 2351.50, 400.82])
+
+    def economic(x):
+        return subAimFunc((0, x[None], operation_list, typical_days), engine='highs')[0]
+
+    result = subAimFunc((0, capacities[None], operation_list, typical_days), engine='highs', with_gradient=True)
+    eps = 1.0
+    tolerance = 1e-7 * result[0] / eps
+    for k in range(9):
+        step = np.eye(9)[k] * eps
+        forward = (economic(capacities + step) - result[0]) / eps
+        backward = (result[0] - economic(capacities - step)) / eps
+        assert backward - tolerance <= result.gradient[k] <= forward + tolerance
@@ -0,0 +1,35 @@
+import shutil
+import numpy as np
+import pytest
+from operation import OperationModel
+from dataloader import load_operation_data, load_typical_days
+from gaproblem import cal_renewable_profiles, get_typical_day_arrays, TIME_STEP, ELE_PRICE, GAS_PRICE
+
+DESIGN = [1710.86, 1648.98, 2217.91, 2.79, 5.17, 305.72, 0.04, 2351.50, 400.82]
+# 容量与储能均不同的第二个方案：电储能从几乎为0变大，热储能变小，检验上界能被放宽也能被收紧
+OTHER_DESIGN = [900.0, 2500.0, 1200.0, 800.0, 600.0, 150.0, 500.0, 300.0, 900.0]
+requires_glpk = pytest.mark.skipif(shutil.which("glpsol") is None, reason="GLPK (glpsol) is not installed")
+
+
+@pytest.mark.parametrize("engine", ["highs", pytest.param("oemof", marks=requires_glpk)])
+def test_update_parameters_matches_a_fresh_model(engine):
+    if engine == "oemof":
+        pytest.importorskip("oemof.solph")
+    _, day_data, _ = get_typical_day_arrays(load_operation_data('mergedData.csv'),
+                                            load_typical_days('typicalDayData.xlsx'))
+    designs = np.array([DESIGN, OTHER_DESIGN])
+    pv_outputs, wt_outputs = cal_renewable_profiles(designs, day_data)
+
+    def inputs(d, k):
+        return (day_data[k, :, 0], day_data[k, :, 1], day_data[k, :, 2], wt_outputs[d, k], pv_outputs[d, k],
+                *designs[d, 2:])
+
+    reused = OperationModel('01/01/2019', TIME_STEP, ELE_PRICE, GAS_PRICE, *inputs(0, 0), engine=engine)
+    reused.optimise()
+    # 依次换成另一方案、另一典型日，再换回原方案，每次都与新建模型比较
+    for d, k in [(1, 1), (1, 0), (0, 1), (0, 0)]:
+        reused.update_parameters(*inputs(d, k))
+        reused.optimise()
+        fresh = OperationModel('01/01/2019', TIME_STEP, ELE_PRICE, GAS_PRICE, *inputs(d, k), engine=engine)
+        fresh.optimise()
+        assert reused.get_objective_value() == pytest.approx(fresh.get_objective_value(), rel=1e-9)
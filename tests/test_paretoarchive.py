@@ -0,0 +1,74 @@
+import numpy as np
+from paretoarchive import ParetoArchive
+
+
+def brute_force_front(points):
+    return sorted(p for p in points if not any(q[0] <= p[0] and q[1] <= p[1] and q != p for q in points))
+
+
+def grid_hypervolume(front, reference, step=0.05):
+    # 参考点与前沿之间被支配区域的网格近似
+    xs = np.arange(0, reference[0], step) + step / 2
+    ys = np.arange(0, reference[1], step) + step / 2
+    X, Y = np.meshgrid(xs, ys)
+    dominated = np.zeros(X.shape, dtype=bool)
+    for f1, f2 in front:
+        dominated |= (X >= f1) & (Y >= f2)
+    return dominated.sum() * step * step
+
+
+def test_insert_keeps_sorted_non_dominated_front():
+    rng = np.random.default_rng(0)
+    points = [tuple(p) for p in np.round(rng.uniform(0, 10, (300, 2)), 1)]
+    archive = ParetoArchive()
+    for k, p in enumerate(points):
+        archive.insert(np.full(9, k), p)
+    front = brute_force_front(list(set(points)))
+    assert archive.ObjV.tolist() == [list(p) for p in front]
+    assert np.all(np.diff(archive.economic) > 0) and np.all(np.diff(archive.complementary) < 0)
+    # 前沿中每个点保存的是首次取得该目标值的设计
+    for x, objv in zip(archive.Phen, archive.ObjV):
+        assert tuple(objv) == points[int(x[0])]
+
+
+def test_dominated_duplicate_and_infinite_points_are_rejected():
+    archive = ParetoArchive()
+    assert archive.insert(np.zeros(9), [1.0, 5.0])
+    assert archive.insert(np.zeros(9), [3.0, 2.0])
+    assert not archive.insert(np.ones(9), [3.0, 2.0])
+    assert not archive.insert(np.ones(9), [4.0, 6.0])
+    assert not archive.insert(np.ones(9), [0.5, float("inf")])
+    assert archive.insert(np.ones(9), [0.5, 1.0])  # 支配前沿中全部点
+    assert archive.ObjV.tolist() == [[0.5, 1.0]]
+
+
+def test_hypervolume_matches_grid_estimate():
+    archive = ParetoArchive(reference=[10.0, 10.0])
+    archive.insert_many(np.zeros((4, 9)), [[1.0, 8.0], [3.0, 4.0], [6.0, 2.0], [12.0, 0.5]])
+    assert archive.hypervolume() == (3 - 1) * 2 + (6 - 3) * 6 + (10 - 6) * 8
+    assert abs(archive.hypervolume() - grid_hypervolume(archive.ObjV, [10.0, 10.0])) < 1e-6
+
+
+def test_reference_from_first_generation_and_stagnation():
+    archive = ParetoArchive(patience=2, tolerance=1e-3)
+    archive.insert_many(np.zeros((2, 9)), [[0.0, 10.0], [10.0, 0.0]])
+    archive.end_generation(0)
+    assert np.allclose(archive.reference, [11.0, 11.0])
+    archive.insert(np.zeros(9), [5.0, 5.0])
+    archive.end_generation(1)
+    archive.end_generation(2)
+    assert not archive.is_stagnant()  # 第1代超体积仍有增长
+    archive.end_generation(3)
+    assert archive.is_stagnant()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "pareto.npz")
+    archive = ParetoArchive(path)
+    archive.insert_many(np.arange(18.0).reshape(2, 9), [[1.0, 3.0], [2.0, 1.0]])
+    archive.end_generation(0)
+    loaded = ParetoArchive.load(path)
+    assert np.array_equal(loaded.ObjV, archive.ObjV) and np.array_equal(loaded.Phen, archive.Phen)
+    assert loaded.history == archive.history and loaded.insertions == 2
+    assert np.array_equal(loaded.reference, archive.reference)
+    assert np.array_equal(loaded.worst, archive.worst) and np.array_equal(loaded.best, archive.best)
@@ -0,0 +1,45 @@
+import shutil
+import numpy as np
+import pytest
+import pricescenario
+from operation import OperationModel
+from dataloader import load_operation_data, load_typical_days
+from gaproblem import cal_renewable_profiles, get_typical_day_arrays, TIME_STEP
+
+DESIGN = [1710.86, 1648.98, 2217.91, 2.79, 5.17, 305.72, 0.04, 2351.50, 400.82]
+requires_glpk = pytest.mark.skipif(shutil.which("glpsol") is None, reason="GLPK (glpsol) is not installed")
+
+
+@pytest.mark.parametrize("engine", ["highs", pytest.param("oemof", marks=requires_glpk)])
+def test_update_prices_matches_a_fresh_model(engine):
+    if engine == "oemof":
+        pytest.importorskip("oemof.solph")
+    medoids, day_data, _ = get_typical_day_arrays(load_operation_data('mergedData.csv'),
+                                                  load_typical_days('typicalDayData.xlsx'))
+    pv_outputs, wt_outputs = cal_renewable_profiles(np.array([DESIGN]), day_data)
+    inputs = (day_data[0, :, 0], day_data[0, :, 1], day_data[0, :, 2], wt_outputs[0, 0], pv_outputs[0, 0], *DESIGN[2:])
+    old_prices = ([0.1598] * TIME_STEP, [0.0286] * TIME_STEP)
+    new_prices = (pricescenario.time_of_use_profile(0.3, 0.16, 0.05).tolist(), [0.05] * TIME_STEP)
+    reused = OperationModel('01/01/2019', TIME_STEP, *old_prices, *inputs, engine=engine)
+    reused.optimise()
+    reused.update_prices(*new_prices)
+    reused.optimise()
+    fresh = OperationModel('01/01/2019', TIME_STEP, *new_prices, *inputs, engine=engine)
+    fresh.optimise()
+    assert reused.get_objective_value() == pytest.approx(fresh.get_objective_value(), rel=1e-9)
+
+
+def test_chunk_with_only_failed_solves(monkeypatch):
+    optimise = OperationModel.optimise
+
+    def failing_optimise(self):
+        # 电价高于1的情景全部求解失败
+        if self.ele_price[0] > 1:
+            raise RuntimeError("solver failed")
+        return optimise(self)
+
+    monkeypatch.setattr(OperationModel, "optimise", failing_optimise)
+    result = pricescenario.evaluate_price_scenarios(DESIGN, [0.1598, 5.0, 0.2], 0.0286, chunk_size=1)
+    assert np.isfinite(result["economic"][[0, 2]]).all() and np.isfinite(result["complementary"][[0, 2]]).all()
+    assert np.isnan(result["economic"][1]) and np.isnan(result["complementary"][1])
+    assert np.isnan(result["day_cost"][1]).all()
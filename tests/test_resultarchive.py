@@ -0,0 +1,77 @@
+import os
+import glob
+import numpy as np
+from resultarchive import LABELS, INDEX_DTYPE, ResultArchive, ResultArchiveWriter
+
+TIME_STEP = 4
+
+
+def write_designs(directory, n_designs, seed=0, dtype="float32"):
+    # 每个设计方案3个典型日的随机逐时结果，返回{设计方案下标: (容量向量, 按中心日排列的记录)}
+    rng = np.random.default_rng(seed)
+    writer = ResultArchiveWriter(directory, TIME_STEP, dtype)
+    written = dict()
+    for n in range(n_designs):
+        capacities = rng.uniform(0, 1000, 9)
+        records = [(medoid, weight, rng.uniform(-100, 100, (len(LABELS), TIME_STEP)).astype(dtype))
+                   for medoid, weight in [(40, 10.0), (7, 20.0), (200, 5.0)]]
+        writer.append(capacities, records)
+        written[n] = (capacities, sorted(records, key=lambda record: record[0]))
+    writer.close()
+    return written
+
+
+def assert_round_trip(archive, written):
+    for capacities, records in written.values():
+        medoids, weights, series = archive.get(capacities)
+        assert medoids.tolist() == [medoid for medoid, _, _ in records]
+        assert weights.tolist() == [weight for _, weight, _ in records]
+        for k, (_, _, record) in enumerate(records):
+            for column, label in enumerate(LABELS):
+                assert np.array_equal(series[label][k], record[column].astype(float))
+            assert np.array_equal(archive.record(archive.find(capacities)[k]), record)
+
+
+def test_records_round_trip_bit_identical(tmp_path):
+    directory = str(tmp_path / "dispatch")
+    written = write_designs(directory, 4)
+    archive = ResultArchive(directory)
+    assert len(archive) == 12 and len(archive.designs()) == 4
+    assert_round_trip(archive, written)
+
+
+def test_half_written_tail_record_is_ignored(tmp_path):
+    directory = str(tmp_path / "dispatch")
+    written = write_designs(directory, 3)
+    data_path, = glob.glob(os.path.join(directory, "data_*.bin"))
+    index_path, = glob.glob(os.path.join(directory, "index_*.bin"))
+    record_size = len(LABELS) * TIME_STEP * 4
+    # 中断时数据只写了半条记录，索引只写了一条记录的前几个字节
+    with open(data_path, "ab") as f:
+        f.write(b"\1" * (record_size // 2))
+    with open(index_path, "ab") as f:
+        f.write(b"\1" * (INDEX_DTYPE.itemsize // 3))
+    archive = ResultArchive(directory)
+    assert len(archive) == 9
+    assert_round_trip(archive, written)
+    # 索引完整、数据不完整的记录同样不使用
+    entry = np.zeros(1, dtype=INDEX_DTYPE)
+    entry["row"] = 9
+    with open(index_path, "r+b") as f:
+        f.truncate(9 * INDEX_DTYPE.itemsize)
+        f.seek(0, os.SEEK_END)
+        f.write(entry.tobytes())
+    assert len(ResultArchive(directory)) == 9
+
+
+def test_writer_reopening_a_truncated_file_keeps_rows_aligned(tmp_path):
+    directory = str(tmp_path / "dispatch")
+    written = write_designs(directory, 2)
+    data_path, = glob.glob(os.path.join(directory, "data_*.bin"))
+    with open(data_path, "ab") as f:
+        f.write(b"\1" * 100)
+    # 同一进程再次打开（如进程号重用），追加的记录从完整的行之后开始
+    more = write_designs(directory, 2, seed=1)
+    archive = ResultArchive(directory)
+    assert len(archive) == 12
+    assert_round_trip(archive, {**written, **{n + 2: design for n, design in more.items()}})
@@ -0,0 +1,43 @@
+import time
+from scheduler import TaskScheduler
+
+OFFSET = 0
+
+
+def set_offset(offset):
+    global OFFSET
+    OFFSET = offset
+
+
+def shifted_square(x):
+    if x == "sleep":
+        time.sleep(30)
+    if x == "raise":
+        raise ValueError("bad input")
+    return x * x + OFFSET
+
+
+def failed(item, reason):
+    return (item, reason)
+
+
+def test_map_keeps_order_and_runs_initializer():
+    scheduler = TaskScheduler(2, initializer=set_offset, initargs=(100,), chunk_size=3)
+    try:
+        assert scheduler.map(shifted_square, range(10)) == [k * k + 100 for k in range(10)]
+        assert scheduler.pop_stats()["tasks"] == 10
+    finally:
+        scheduler.close()
+
+
+def test_timeout_and_error_go_through_on_failure():
+    scheduler = TaskScheduler(2, chunk_size=1, task_timeout=1, poll_interval=0.1)
+    try:
+        results = scheduler.map(shifted_square, [1, "sleep", "raise", 3], on_failure=failed)
+        assert results == [1, ("sleep", "timeout after 1s"), ("raise", "ValueError: bad input"), 9]
+        stats = scheduler.pop_stats()
+        assert (stats["timeouts"], stats["errors"]) == (1, 1)
+        # 超时的工作进程已被替换，调度器仍可继续使用
+        assert scheduler.map(shifted_square, [2, 4]) == [4, 16]
+    finally:
+        scheduler.close()
@@ -0,0 +1,45 @@
+import numpy as np
+from paretoarchive import ParetoArchive
+from sensitivity import analyze, select_pareto_point
+
+COEFFICIENTS = np.array([1.0, 2.0, 3.0, 0.0, 0.5, 1.0, 0.0, 4.0, 1.0])
+
+
+class LinearProblem:
+    # 经济目标为容量的线性函数，源荷匹配目标只取决于第3个变量（pgt）
+    ranges = np.array([np.zeros(9), np.full(9, 100.0)])
+    cache = None
+
+    def evaluate_designs(self, Vars):
+        return np.column_stack([Vars @ COEFFICIENTS, (Vars[:, 2] - 30.0) ** 2])
+
+
+def test_oat_swing_of_linear_objective():
+    result = analyze(LinearProblem(), np.full(9, 50.0), 'oat', size=5, span=0.1)
+    # 盒子为50±10，线性目标的变化幅度为系数×20
+    assert np.allclose(result["swing"][:, 0], 20 * COEFFICIENTS)
+    assert np.allclose(result["swing"][:, 1], np.eye(9)[2] * (30 ** 2 - 10 ** 2))
+
+
+def test_morris_elementary_effects_of_linear_objective():
+    result = analyze(LinearProblem(), np.full(9, 50.0), 'morris', size=10, span=0.1, seed=0)
+    # 以整个扫描范围为单位，线性目标的基本效应恒为系数×20
+    assert np.allclose(result["mu"][:, 0], 20 * COEFFICIENTS)
+    assert np.allclose(result["sigma"][:, 0], 0, atol=1e-9)
+    assert result["trajectories"] == 10
+
+
+def test_sobol_indices_of_additive_objective():
+    result = analyze(LinearProblem(), np.full(9, 50.0), 'sobol', size=1024, span=0.1, seed=0)
+    # 均匀分布、宽度相同时线性函数的一阶指数与总效应指数均为系数平方的占比
+    expected = COEFFICIENTS ** 2 / np.sum(COEFFICIENTS ** 2)
+    assert np.allclose(result["S1"][:, 0], expected, atol=0.05)
+    assert np.allclose(result["ST"][:, 0], expected, atol=0.05)
+    assert np.allclose(result["ST"][:, 1], np.eye(9)[2], atol=0.05)
+    assert np.all(result["ST_conf"] >= 0)
+
+
+def test_select_pareto_point_takes_the_knee():
+    archive = ParetoArchive()
+    archive.insert_many(np.arange(3)[:, None] * np.ones((3, 9)), [[0.0, 10.0], [2.0, 2.0], [10.0, 0.0]])
+    assert np.array_equal(select_pareto_point(archive), np.ones(9))
@@ -0,0 +1,247 @@
+"""
+稀疏矩阵+HiGHS调度引擎（sparselp.py）的测试
+-------------------
+1. DispatchTemplate.solve与按设备方程逐行手写的稠密linprog模型给出相同的最优值，其最优解满足手写模型的全部约束；
+2. 与oemof引擎对比（需要GLPK，没有glpsol时跳过）：operationRunable.py的设计方案下各典型日的运行成本一致，
+   oemof的最优解代入稀疏矩阵模型后满足全部约束且成本相同；储能可以无成本地在多余热/冷出口之间转移能量，
+   该设计的最优解不唯一，因此各流逐元素的比较在去掉储能的同一设计上进行，此时两种引擎的
+   get_complementary_results逐时一致；
+3. 由对偶值得到的运行成本对容量与风光出力的偏导数与有限差分一致：运行成本是这些参数的凸函数，
+   偏导数应位于向后差分与向前差分之间（不在折点上时三者相等）。
+"""
+import shutil
+import numpy as np
+import pytest
+from scipy.optimize import linprog
+from sparselp import (DispatchTemplate, FLOWS, STORAGES, GT_ELE_EFFICIENCY, GT_HEAT_EFFICIENCY, AC_COOL_FACTOR,
+                      AC_HEAT_FACTOR, AC_ELE_FACTOR, EHP_COP, EC_COP, GRID_CAPACITY, GAS_CAPACITY, SOURCE_CAPACITY,
+                      SOURCE_COST, OVERFLOW_CAPACITY)
+
+# operationRunable.py中的设计方案：ppv, pwt, pgt, php, pec, pac, pes, phs, pcs
+DESIGN = [1710.86, 1648.98, 2217.91, 2.79, 5.17, 305.72, 0.04, 2351.50, 400.82]
+TIME_STEP = 24
+ELE_PRICE = [0.1598] * TIME_STEP
+GAS_PRICE = [0.0286] * TIME_STEP
+
+
+def dense_dispatch_lp(T, ele_price, gas_price, ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                      pgt, php, pec, pac, storage_io):
+    # 按设备方程逐行写出的稠密LP，变量为{名称: 下标}，不使用DispatchTemplate的组装逻辑
+    names = [(flow, t) for flow in FLOWS for t in range(T)]
+    names += [(label, t) for label, *_ in STORAGES for t in range(T)] + [(label, "init") for label, *_ in STORAGES]
+    index = {name: k for k, name in enumerate(names)}
+    rows, rhs = [], []
+
+    def equation(coefficients, value):
+        row = np.zeros(len(names))
+        for name, coefficient in coefficients:
+            row[index[name]] += coefficient
+        rows.append(row)
+        rhs.append(value)
+
+    for t in range(T):
+        equation([((("grid", "electricity bus"), t), 1), ((("gas turbine", "electricity bus"), t), 1),
+                  ((("electricity storage", "electricity bus"), t), 1),
+                  ((("electricity bus", "absorption chiller"), t), -1),
+                  ((("electricity bus", "electricity heat pump"), t), -1),
+                  ((("electricity bus", "electricity chiller"), t), -1),
+                  ((("electricity bus", "electricity overflow"), t), -1),
+                  ((("electricity bus", "electricity storage"), t), -1)],
+                 ele_load[t] - wt_output[t] - pv_output[t])
+        equation([((("heat source", "heat bus"), t), 1), ((("gas turbine", "heat bus"), t), 1),
+                  ((("electricity heat pump", "heat bus"), t), 1), ((("heat storage", "heat bus"), t), 1),
+                  ((("heat bus", "absorption chiller"), t), -1), ((("heat bus", "heat overflow"), t), -1),
+                  ((("heat bus", "heat storage"), t), -1)], heat_demand[t])
+        equation([((("cool source", "cool bus"), t), 1), ((("absorption chiller", "cool bus"), t), 1),
+                  ((("electricity chiller", "cool bus"), t), 1), ((("cool storage", "cool bus"), t), 1),
+                  ((("cool bus", "cool overflow"), t), -1), ((("cool bus", "cool storage"), t), -1)], cool_demand[t])
+        equation([((("gas", "gas bus"), t), 1), ((("gas bus", "gas turbine"), t), -1)], 0)
+        # 燃气轮机：发电 = 0.33 * 耗气，产热 = 0.5 * 耗气
+        equation([((("gas turbine", "electricity bus"), t), 1),
+                  ((("gas bus", "gas turbine"), t), -GT_ELE_EFFICIENCY)], 0)
+        equation([((("gas turbine", "heat bus"), t), 1), ((("gas bus", "gas turbine"), t), -GT_HEAT_EFFICIENCY)], 0)
+        # 吸收式制冷：耗热、耗电与制冷量成比例
+        equation([((("heat bus", "absorption chiller"), t), 1),
+                  ((("absorption chiller", "cool bus"), t), -AC_HEAT_FACTOR / AC_COOL_FACTOR)], 0)
+        equation([((("electricity bus", "absorption chiller"), t), 1),
+                  ((("absorption chiller", "cool bus"), t), -AC_ELE_FACTOR / AC_COOL_FACTOR)], 0)
+        # 电热泵与电制冷：耗电 = 出力 / COP
+        equation([((("electricity bus", "electricity heat pump"), t), 1),
+                  ((("electricity heat pump", "heat bus"), t), -1 / EHP_COP)], 0)
+        equation([((("electricity bus", "electricity chiller"), t), 1),
+                  ((("electricity chiller", "cool bus"), t), -1 / EC_COP)], 0)
+        for label, bus, loss_rate, eta_in, eta_out, _ in STORAGES:
+            previous = (label, t - 1) if t > 0 else (label, "init")
+            equation([((label, t), 1), (previous, -(1 - loss_rate)), (((bus, label), t), -eta_in),
+                      (((label, bus), t), 1 / eta_out)], 0)
+    for label, *_ in STORAGES:
+        equation([((label, T - 1), 1), ((label, "init"), -1)], 0)
+
+    upper = dict()
+    upper.update({("grid", "electricity bus"): GRID_CAPACITY, ("gas", "gas bus"): GAS_CAPACITY,
+                  ("heat source", "heat bus"): SOURCE_CAPACITY, ("cool source", "cool bus"): SOURCE_CAPACITY,
+                  ("electricity bus", "electricity overflow"): OVERFLOW_CAPACITY,
+                  ("heat bus", "heat overflow"): OVERFLOW_CAPACITY, ("cool bus", "cool overflow"): OVERFLOW_CAPACITY,
+                  ("gas turbine", "electricity bus"): pgt, ("gas turbine", "heat bus"): 1.5 * pgt,
+                  ("electricity heat pump", "heat bus"): php, ("electricity chiller", "cool bus"): pec,
+                  ("absorption chiller", "cool bus"): pac})
+    bounds = []
+    for name in names:
+        key, t = name
+        storage = [s for s in STORAGES if s[0] == key or (s[1], s[0]) == key or (s[0], s[1]) == key]
+        if storage:
+            label, bus, _, _, _, ratio = storage[0]
+            io = storage_io[[s[0] for s in STORAGES].index(label)]
+            bounds.append((0, io * ratio if key == label else io))
+        else:
+            bounds.append((0, upper.get(key)))
+    cost = np.zeros(len(names))
+    for t in range(T):
+        cost[index[(("grid", "electricity bus"), t)]] = ele_price[t]
+        cost[index[(("gas", "gas bus"), t)]] = gas_price[t]
+        cost[index[(("heat source", "heat bus"), t)]] = SOURCE_COST
+        cost[index[(("cool source", "cool bus"), t)]] = SOURCE_COST
+    return cost, np.array(rows), np.array(rhs), bounds, index
+
+
+def test_solve_matches_hand_built_linprog():
+    rng = np.random.default_rng(0)
+    T = 6
+    ele_price = rng.uniform(0.05, 0.3, T)
+    gas_price = rng.uniform(0.02, 0.05, T)
+    ele_load = rng.uniform(200, 900, T)
+    heat_demand = rng.uniform(100, 700, T)
+    cool_demand = rng.uniform(50, 500, T)
+    wt_output = rng.uniform(0, 600, T)
+    pv_output = rng.uniform(0, 400, T)
+    capacities = (600.0, 150.0, 120.0, 300.0)
+    storage_io = (80.0, 150.0, 60.0)
+
+    template = DispatchTemplate(T)
+    result = template.solve(ele_price, gas_price, ele_load, heat_demand, cool_demand, wt_output, pv_output,
+                            *capacities, *storage_io)
+    cost, A_eq, b_eq, bounds, index = dense_dispatch_lp(T, ele_price, gas_price, ele_load, heat_demand, cool_demand,
+                                                        wt_output, pv_output, *capacities, storage_io)
+    reference = linprog(cost, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method="highs")
+    assert reference.status == 0
+    assert result.objective == pytest.approx(reference.fun, rel=1e-9)
+
+    # 稀疏矩阵模型的最优解代入手写模型：满足全部约束与上下界，且成本相同
+    x = np.zeros(len(index))
+    for (key, t), k in index.items():
+        if key in result.flows:
+            x[k] = result.flows[key][t]
+        elif t == "init":
+            x[k] = result.storage_content[key][-1]
+        else:
+            x[k] = result.storage_content[key][t]
+    assert np.abs(A_eq @ x - b_eq).max() <= 1e-6 * max(1.0, np.abs(b_eq).max())
+    upper = np.array([np.inf if ub is None else ub for _, ub in bounds])
+    assert x.min() >= -1e-7 and np.all(x <= upper + 1e-7)
+    assert cost @ x == pytest.approx(reference.fun, rel=1e-9)
+
+
+def test_solve_batch_objectives_match_individual_solves():
+    rng = np.random.default_rng(1)
+    T = 4
+    template = DispatchTemplate(T)
+    problems = []
+    for _ in range(3):
+        problems.append(([0.1598] * T, [0.0286] * T, rng.uniform(200, 900, T), rng.uniform(100, 700, T),
+                         rng.uniform(50, 500, T), rng.uniform(0, 600, T), rng.uniform(0, 400, T),
+                         600.0, 150.0, 120.0, 300.0, 80.0, 150.0, 60.0))
+    batch = template.solve_batch(problems)
+    for problem, result in zip(problems, batch):
+        assert result.objective == pytest.approx(template.solve(*problem).objective, rel=1e-9)
+
+
+def assert_between_differences(solve, value, derivative, eps=1.0):
+    # 凸函数的次梯度位于向后差分与向前差分之间，容差按目标值的相对精度换算
+    base = solve(value)
+    forward = (solve(value + eps) - base) / eps
+    backward = (base - solve(value - eps)) / eps
+    tolerance = 1e-7 * max(1.0, abs(base)) / eps
+    assert backward - tolerance <= derivative <= forward + tolerance
+
+
+def test_sensitivity_matches_finite_differences():
+    template = DispatchTemplate(TIME_STEP)
+    names = ["gt_capacity", "ehp_capacity", "ec_capacity", "ac_capacity", "ele_storage_io", "heat_storage_io",
+             "cool_storage_io"]
+    rng = np.random.default_rng(2)
+    for _, ele_load, heat_load, cool_load, wt_output, pv_output in list(typical_day_inputs())[:3]:
+        loads = (ele_load, heat_load, cool_load)
+        design = list(DESIGN[2:6]) + [200.0, 500.0, 150.0]  # 储能功率取非零值，使其约束起作用
+        sensitivity = template.solve(ELE_PRICE, GAS_PRICE, *loads, wt_output, pv_output, *design).sensitivity
+        for k, name in enumerate(names):
+            def solve(value):
+                capacities = design[:k] + [value] + design[k + 1:]
+                return template.solve(ELE_PRICE, GAS_PRICE, *loads, wt_output, pv_output, *capacities).objective
+            assert_between_differences(solve, design[k], sensitivity[name])
+        for t in rng.choice(TIME_STEP, 4, replace=False):
+            def solve(value):
+                wt = list(wt_output)
+                wt[t] = value
+                return template.solve(ELE_PRICE, GAS_PRICE, *loads, wt, pv_output, *design).objective
+            assert_between_differences(solve, wt_output[t], sensitivity["wt_output"][t])
+            assert sensitivity["pv_output"][t] == sensitivity["wt_output"][t]
+
+
+def typical_day_inputs():
+    from dataloader import load_operation_data, load_typical_days
+    from gaproblem import cal_solar_output, cal_wind_output
+    operation_list = load_operation_data('mergedData.csv')
+    for medoid in load_typical_days('typicalDayData.xlsx'):
+        day_data = np.array(operation_list[(medoid - 1) * 24:(medoid - 1) * 24 + TIME_STEP])
+        yield (medoid, day_data[:, 0].tolist(), day_data[:, 1].tolist(), day_data[:, 2].tolist(),
+               cal_wind_output(day_data[:, 4], DESIGN[1]), cal_solar_output(day_data[:, 3], day_data[:, 5], DESIGN[0]))
+
+
+def solve_both_engines(ele_load, heat_load, cool_load, wt_output, pv_output, design):
+    from operation import OperationModel
+    models = dict()
+    for engine in ["oemof", "highs"]:
+        models[engine] = OperationModel('01/01/2019', TIME_STEP, ELE_PRICE, GAS_PRICE, ele_load, heat_load, cool_load,
+                                        wt_output, pv_output, *design[2:], engine=engine)
+        models[engine].optimise()
+    return models
+
+
+requires_glpk = pytest.mark.skipif(shutil.which("glpsol") is None, reason="GLPK (glpsol) is not installed")
+
+
+@requires_glpk
+def test_highs_matches_oemof_objective():
+    pytest.importorskip("oemof.solph")
+    for medoid, ele_load, heat_load, cool_load, wt_output, pv_output in typical_day_inputs():
+        models = solve_both_engines(ele_load, heat_load, cool_load, wt_output, pv_output, DESIGN)
+        oemof_obj = models["oemof"].get_objective_value()
+        assert models["highs"].get_objective_value() == pytest.approx(oemof_obj, rel=1e-6), medoid
+        # oemof的最优解映射到稀疏矩阵模型的变量向量：满足全部约束且成本相同，即两者为同一线性规划
+        template = models["highs"].template
+        x = np.zeros(template.n_vars)
+        for (o, i), result in models["oemof"].energy_system.results["main"].items():
+            if i is None:
+                start = template.content_index[o.label]
+                x[start:start + TIME_STEP] = result["sequences"]["storage_content"]
+                x[template.init_index[o.label]] = result["sequences"]["storage_content"].iloc[-1]
+            elif (o.label, i.label) in template.flow_index:
+                template.set_block(x, (o.label, i.label), result["sequences"]["flow"])
+        b = template.equality_rhs(ele_load, heat_load, cool_load, wt_output, pv_output)
+        ub = template.upper_bounds(*DESIGN[2:])
+        assert np.abs(template.A_eq @ x - b).max() <= 1e-6 * max(1.0, np.abs(b).max()), medoid
+        assert (x - ub).max() <= 1e-6 and x.min() >= -1e-6, medoid
+        assert template.objective_coefficients(ELE_PRICE, GAS_PRICE) @ x == pytest.approx(oemof_obj, rel=1e-6)
+
+
+@requires_glpk
+def test_highs_matches_oemof_flows_without_storage():
+    pytest.importorskip("oemof.solph")
+    design = DESIGN[:6] + [0, 0, 0]
+    for medoid, ele_load, heat_load, cool_load, wt_output, pv_output in typical_day_inputs():
+        models = solve_both_engines(ele_load, heat_load, cool_load, wt_output, pv_output, design)
+        oemof_results = models["oemof"].get_complementary_results()
+        highs_results = models["highs"].get_complementary_results()
+        for symbol in oemof_results:
+            np.testing.assert_allclose(highs_results[symbol], oemof_results[symbol], rtol=1e-6, atol=1e-6,
+                                       err_msg="%s on typical day %d" % (symbol, medoid))
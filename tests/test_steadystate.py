@@ -0,0 +1,27 @@
+import numpy as np
+import geatpy as ea
+from gaproblem import MyProblem
+from steadystate import moea_NSGA2_steady_templet
+
+
+def run(num_workers, in_flight=4, seed=5):
+    problem = MyProblem('Thread', False, 'highs', num_workers=num_workers)
+    Field = ea.crtfld('RI', problem.varTypes, problem.ranges, problem.borders)
+    np.random.seed(seed)
+    algorithm = moea_NSGA2_steady_templet(problem, ea.Population('RI', Field, 6), None, 0, False, in_flight)
+    algorithm.MAXGEN = 3
+    algorithm.verbose = False
+    algorithm.drawing = 0
+    algorithm.logTras = 0
+    try:
+        _, population = algorithm.run()
+    finally:
+        problem.kill_pool()
+    return population
+
+
+def test_ordered_run_does_not_depend_on_pool_size():
+    # 按提交顺序并入时，固定种子的进化过程只取决于in_flight，与工作线程数及各评价完成的先后无关
+    one, three = run(1), run(3)
+    assert np.array_equal(one.Chrom, three.Chrom)
+    assert np.array_equal(one.ObjV, three.ObjV)
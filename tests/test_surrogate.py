@@ -0,0 +1,85 @@
+import numpy as np
+import geatpy as ea
+from surrogate import RBFModel, SurrogateScreen
+
+LB, UB = np.zeros(3), np.full(3, 10.0)
+
+
+def objectives(X):
+    # 光滑的双目标测试函数：到两个不同中心的距离平方，帕累托解集为两中心间的线段
+    X = np.atleast_2d(X) / UB
+    return np.column_stack([((X - 0.2) ** 2).sum(1), ((X - 0.8) ** 2).sum(1)])
+
+
+def trained_screen(n_points, **kwargs):
+    screen = SurrogateScreen(LB, UB, [1, 1], **kwargs)
+    X = np.random.default_rng(0).uniform(LB, UB, (n_points, 3))
+    screen.add(X, objectives(X))
+    return screen
+
+
+def test_rbf_interpolates_training_points_and_linear_functions():
+    rng = np.random.default_rng(1)
+    X = rng.uniform(0, 1, (30, 3))
+    Y = np.column_stack([X @ [1.0, -2.0, 0.5] + 3, np.sin(3 * X).sum(1)])
+    model = RBFModel()
+    model.fit(X, Y)
+    predicted, uncertainty = model.predict(X)
+    np.testing.assert_allclose(predicted, Y, atol=1e-5)
+    assert np.allclose(uncertainty, 0)
+    # 附加的线性多项式项使线性函数在训练点之外也被精确重现
+    X_new = rng.uniform(0, 1, (10, 3))
+    np.testing.assert_allclose(model.predict(X_new)[0][:, 0], X_new @ [1.0, -2.0, 0.5] + 3, atol=1e-5)
+
+
+def test_too_few_points_fall_back_to_true_evaluation():
+    screen = trained_screen(10, min_points=30)
+    selected, predicted = screen.screen(np.random.default_rng(2).uniform(LB, UB, (8, 3)))
+    assert selected.tolist() == list(range(8)) and predicted.shape == (0, 2)
+    assert screen.model is None and (screen.true_evaluations, screen.predicted_evaluations) == (8, 0)
+    # 失败的评价不计入训练点
+    screen.add(np.ones((1, 3)), [[np.inf, 1.0]])
+    assert len(screen.archive) == 10
+
+
+def test_leave_one_out_error_matches_refitting():
+    rng = np.random.default_rng(5)
+    X = rng.uniform(0, 1, (25, 3))
+    Y = objectives(X * UB)
+    model = RBFModel()
+    model.fit(X, Y)
+    residuals = []
+    for i in range(25):
+        reduced = RBFModel()
+        reduced.fit(np.delete(X, i, 0), np.delete(Y, i, 0))
+        residuals.append(reduced.predict(X[i:i + 1])[0][0] - Y[i])
+    np.testing.assert_allclose(model.error, np.sqrt(np.mean(np.square(residuals), 0)), rtol=1e-4)
+
+
+def test_screening_keeps_truly_non_dominated_offspring():
+    screen = trained_screen(300, fraction=0.3, min_points=30)
+    for seed in range(10):
+        offspring = np.random.default_rng(10 + seed).uniform(LB, UB, (40, 3))
+        selected, predicted = screen.screen(offspring)
+        assert len(selected) == 12 and predicted.shape == (28, 2)
+        [levels, _] = ea.ndsortESS(objectives(offspring), 40, 1, None, np.array([1, 1]))
+        front = set(np.flatnonzero(levels == 1))
+        # 真实前沿中的个体优先交给真实评价，前沿个体多于名额时名额全部给前沿
+        assert len(front & set(selected.tolist())) == min(len(front), 12)
+        # 其余个体取保守预测值，不优于其预测值
+        rest = np.setdiff1d(np.arange(40), selected)
+        assert np.all(predicted >= screen.predict(offspring[rest])[0])
+        np.testing.assert_allclose(predicted, objectives(offspring[rest]), atol=0.05)
+
+
+def test_retrain_schedule():
+    screen = trained_screen(40, retrain_interval=3, retrain_points=5)
+    offspring = np.random.default_rng(3).uniform(LB, UB, (10, 3))
+    screen.screen(offspring)
+    model = screen.model
+    screen.screen(offspring)
+    assert screen.model is model  # 未到重新拟合的代数
+    X = np.random.default_rng(4).uniform(LB, UB, (5, 3))
+    screen.add(X, objectives(X))
+    screen.screen(offspring)
+    assert screen.model is not model  # 新增点数达到retrain_points后提前重新拟合
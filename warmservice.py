@@ -0,0 +1,186 @@
+"""
+常驻的本机评价服务
+-------------------
+每次运行gasolution.py都要重新启动工作进程，导入geatpy、scipy、oemof/Pyomo并第一次建立、求解运行模型需要数秒。本服务启动一次后常驻，
+之后的各次GA运行与脚本连接它评价设计方案：
+- 服务进程先导入评价所需的模块，并按--engines的每种引擎求解一个典型日完成预热，再fork出工作进程，
+  工作进程沿用已导入、已预热的状态（spawn方式启动的平台上工作进程自行导入与预热）；退出的工作进程由新进程替换；
+- 任务队列与distributed.py相同（TaskBroker），MyProblem以PoolType = 'Service'连接，每次运行以set_job提交自己的
+  初始化参数（典型日划分、引擎、保真度级别等），工作进程在参数变化时重新执行init_worker；
+  持久化运行模型（Persistent = True）在同一工作进程中跨运行保留；
+- 同一时间只有一个客户端使用服务：连接时取得租约，运行结束（kill_pool）时释放，超过lease_timeout秒没有活动的租约自动失效；
+- 服务进程的导入与预热耗时、各工作进程从启动到可以领取任务的耗时在启动时打印，并随ServicePool交给客户端的ProfileRecorder；
+- 脚本（如operationRunable.py --service）以evaluate_remote评价单个设计方案，不在本进程建立、求解运行模型。
+用法：
+    python warmservice.py --address 127.0.0.1:50000 --authkey <口令> --processes 8 --engines highs,oemof
+    python warmservice.py --address 127.0.0.1:50000 --authkey <口令> --status   # 各工作进程的启动耗时
+    python warmservice.py --address 127.0.0.1:50000 --authkey <口令> --stop
+"""
+import os
+import time
+import socket
+import argparse
+import threading
+import numpy as np
+import multiprocessing as mp
+import profiling
+from distributed import BrokerManager, TaskBroker, AsyncSubmitter, parse_address, get_data_hash, worker_main, map_tasks
+
+# 各引擎在gaproblem之外另需导入的模块（operation.py中按需导入）
+ENGINE_MODULES = {"oemof": ["pandas", "pyomo.environ", "oemof.solph"], "highs": []}
+# 预热求解的设计方案（与operationRunable.py相同）
+WARMUP_CAPACITIES = [1710.86, 1648.98, 2217.91, 2.79, 5.17, 305.72, 0.04, 2351.50, 400.82]
+# 本进程已预热的引擎，fork出的工作进程沿用
+_warm_engines = set()
+
+
+def preload(engines):
+    # gaproblem最先导入，其耗时包含geatpy、scipy、operation等依赖
+    profiling.import_modules(["gaproblem"] + [module for engine in engines for module in ENGINE_MODULES[engine]])
+
+
+def warm_up(engines, typical_days_path='typicalDayData.xlsx'):
+    # 各引擎求解一个典型日，返回本进程的启动耗时（导入与预热）
+    from gaproblem import subAimFunc
+    from dataloader import load_operation_data, load_typical_days
+    operation_list = load_operation_data('mergedData.csv')
+    typical_days = load_typical_days(typical_days_path)
+    medoid = next(iter(typical_days))
+    for engine in engines:
+        if engine in _warm_engines:
+            continue
+        start = time.perf_counter()
+        subAimFunc((0, np.array([WARMUP_CAPACITIES]), operation_list, {medoid: typical_days[medoid]}), engine=engine)
+        profiling.record_startup("warmup " + engine, time.perf_counter() - start)
+        _warm_engines.add(engine)
+    # 预热求解的阶段计时不计入第一个任务的统计
+    stats = profiling.collect()
+    for message in stats["errors"]:
+        print("[service] warm-up failed: %s" % message)
+    return stats.get("startup", dict())
+
+
+def service_worker(address, authkey, engines, typical_days_path, created):
+    preload(engines)
+    startup = warm_up(engines, typical_days_path)
+    startup["ready"] = time.time() - created  # 从fork到可以领取任务
+    worker_main(address, authkey, startup=startup)
+
+
+def serve(address, authkey, processes, engines, typical_days_path='typicalDayData.xlsx',
+          heartbeat_timeout=60.0, lease_timeout=600.0, poll_interval=1.0):
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+    start = time.perf_counter()
+    preload(engines)
+    startup = warm_up(engines, typical_days_path)
+    print("[service] imported and warmed up in %.2fs " % (time.perf_counter() - start)
+          + " ".join("[%s:%.3fs]" % item for item in startup.items()))
+    broker = TaskBroker(None, None, heartbeat_timeout, lease_timeout=lease_timeout)
+    broker.startup["service"] = startup
+    BrokerManager.register("broker", callable=lambda: broker)
+    manager = BrokerManager(address=parse_address(address), authkey=authkey)
+    server = manager.get_server()
+    local_address = "127.0.0.1:%d" % server.address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print("[service] listening on %s:%d with %d workers" % (server.address[0], server.address[1], processes))
+    workers = []
+    try:
+        while not broker.closed:
+            workers = [process for process in workers if process.is_alive()]
+            for _ in range(processes - len(workers)):
+                process = mp.Process(target=service_worker, daemon=True,
+                                     args=(local_address, authkey, engines, typical_days_path, time.time()))
+                process.start()
+                workers.append(process)
+            broker.requeue_lost()
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        pass
+    broker.close()
+    for process in workers:
+        process.join(poll_interval * 5)
+        if process.is_alive():
+            process.terminate()
+    server.stop_event.set()
+
+
+def connect(address, authkey):
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+    BrokerManager.register("broker")
+    manager = BrokerManager(address=parse_address(address), authkey=authkey)
+    manager.connect()
+    return manager.broker()
+
+
+class ServicePool:
+    # 连接常驻服务的任务池，接口与DistributedPool相同；close()只释放租约，服务与其工作进程继续运行
+    def __init__(self, initializer, initargs, address="127.0.0.1:50000", authkey=b"ies_optimization",
+                 lease_wait=None, poll_interval=1.0):
+        self.broker = connect(address, authkey)
+        self.client = "%s/%d" % (socket.gethostname(), os.getpid())
+        self.poll_interval = poll_interval
+        self.submitter = None
+        if not self.broker.acquire(self.client, lease_wait):
+            raise RuntimeError("evaluation service at %s is in use by another client" % address)
+        if self.broker.get_data_hash() != get_data_hash():
+            self.broker.release(self.client)
+            raise ValueError("mergedData.csv differs from the one used by the evaluation service at %s" % address)
+        self.broker.set_job(self.client, initializer, initargs)
+        # 服务进程与当前各工作进程的启动耗时
+        self.startup = self.broker.get_startup()
+
+    def map(self, func, iterable, on_failure=None):
+        return map_tasks(self.broker, func, iterable, on_failure, self.poll_interval, self.client)
+
+    def apply_async(self, func, args, callback=None, error_callback=None):
+        if self.submitter is None:
+            self.submitter = AsyncSubmitter(self.broker, self.poll_interval, self.client)
+        self.submitter.submit(func, *args, callback=callback, error_callback=error_callback)
+
+    def worker_count(self):
+        return self.broker.get_worker_count()
+
+    def pop_stats(self):
+        return self.broker.pop_stats()
+
+    def close(self):
+        if self.submitter is not None:
+            self.submitter.close()
+        self.broker.release(self.client)
+
+
+def evaluate_remote(design, address="127.0.0.1:50000", authkey=b"ies_optimization", engine="highs",
+                    typical_days_path='typicalDayData.xlsx', lease_wait=None):
+    # 在常驻服务上评价设计方案，返回[经济目标, 源荷匹配目标]；design为(n, 9)矩阵时返回n个结果的列表
+    from gaproblem import init_worker, workerAimFunc
+    from dataloader import load_typical_days
+    Vars = np.atleast_2d(np.asarray(design, dtype=float))
+    pool = ServicePool(init_worker, (None, load_typical_days(typical_days_path), False, engine),
+                       address, authkey, lease_wait)
+    try:
+        results = pool.map(workerAimFunc, list(Vars))
+    finally:
+        pool.close()
+    objvs = [[float(f) for f in objv] for objv, _ in results]
+    return objvs[0] if np.ndim(design) == 1 else objvs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="常驻的本机评价服务")
+    parser.add_argument("--address", default="127.0.0.1:50000")
+    parser.add_argument("--authkey", default="ies_optimization")
+    parser.add_argument("--processes", type=int, default=mp.cpu_count())
+    parser.add_argument("--engines", default="highs", help="逗号分隔的预热引擎：highs,oemof")
+    parser.add_argument("--typical-days", default="typicalDayData.xlsx")
+    parser.add_argument("--lease-timeout", type=float, default=600.0, help="客户端无活动多少秒后租约失效")
+    parser.add_argument("--status", action="store_true", help="打印正在运行的服务的各工作进程启动耗时")
+    parser.add_argument("--stop", action="store_true", help="停止正在运行的服务")
+    args = parser.parse_args()
+    if args.status:
+        for name, startup in sorted(connect(args.address, args.authkey).get_startup().items()):
+            print("[%s] " % name + " ".join("[%s:%.3fs]" % item for item in startup.items()))
+    elif args.stop:
+        connect(args.address, args.authkey).close()
+    else:
+        serve(args.address, args.authkey, args.processes, args.engines.split(","), args.typical_days,
+              lease_timeout=args.lease_timeout)